@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Recall vs latency of the approximate vector indexes against the flat index.
+
+Usage: python benchmark_ann.py [--vectors 200000] [--dim 384] [--queries 500]
+       python benchmark_ann.py --store ./vector_db   (use the vectors of an existing store)
+"""
+import os
+import time
+import argparse
+import numpy as np
+import faiss
+from services import ann_index
+from services.chunk_store import ChunkStore
+from services.vector_file import VectorFile
+
+def load_store_vectors(path: str) -> np.ndarray:
+    chunks = ChunkStore(os.path.join(path, ChunkStore.FILE_NAME))
+    meta = chunks.get_meta()
+    positions = chunks.live_positions()
+    chunks.close()
+    return VectorFile(os.path.join(path, meta["vectors_file"]), meta["dim"]).take(positions)
+
+def synthetic_vectors(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered, normalized vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(count // 500, 16), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.35 * rng.normal(size=(count, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def timed_search(index, queries: np.ndarray, k: int, params=None):
+    start = time.perf_counter()
+    for i in range(len(queries)):
+        if params is not None:
+            _, labels = index.search(queries[i:i + 1], k, params=params)
+        else:
+            _, labels = index.search(queries[i:i + 1], k)
+        yield labels[0]
+    timed_search.elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+def recall(found, truth) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ANN index options against exact search")
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--store", help="Benchmark on the vectors of a saved vector store instead")
+    args = parser.parse_args()
+
+    vectors = load_store_vectors(args.store) if args.store else synthetic_vectors(args.vectors + args.queries, args.dim)
+    if args.store:
+        queries = vectors[np.random.default_rng(1).choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+        queries = queries + 0.05 * np.random.default_rng(2).normal(size=queries.shape).astype(np.float32)
+    else:
+        vectors, queries = vectors[:args.vectors], vectors[args.vectors:]
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    print(f"📊 {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}")
+
+    flat = ann_index.build_index(vectors, "flat")
+    truth = list(timed_search(flat, queries, args.k))
+    print(f"{'index':<10} {'param':<14} {'build s':>8} {'MB':>8} {'recall':>7} {'ms/query':>9}")
+    print(f"{'flat':<10} {'-':<14} {'-':>8} {flat.ntotal * flat.d * 4 / 2**20:>8.1f} {1.0:>7.3f} {timed_search.elapsed_ms:>9.3f}")
+
+    sweeps = {
+        "ivf_flat": [("nprobe", n) for n in (1, 4, 16, 64)],
+        "hnsw": [("efSearch", n) for n in (16, 32, 64, 128)],
+        "ivf_pq": [("nprobe", n) for n in (4, 16, 64)],
+    }
+    for index_type, settings_sweep in sweeps.items():
+        start = time.perf_counter()
+        index = ann_index.build_index(vectors, index_type)
+        build_seconds = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / 2**20
+        for name, value in settings_sweep:
+            params = ann_index.search_parameters(
+                index,
+                nprobe=value if name == "nprobe" else None,
+                ef_search=value if name == "efSearch" else None
+            )
+            found = list(timed_search(index, queries, args.k, params))
+            print(f"{index_type:<10} {f'{name}={value}':<14} {build_seconds:>8.1f} {size_mb:>8.1f} {recall(found, truth):>7.3f} {timed_search.elapsed_ms:>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -14,19 +14,132 @@ class Settings(BaseSettings):
     LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "groq")  # "openai" or "groq"
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
+    LLM_BASE_URL: str = ""  # e.g. a local fake provider; empty = the provider's API
+    
+    # LLM Provider Calls (requests/tokens per minute: 0 = no client-side limit)
+    LLM_REQUESTS_PER_MINUTE: int = 0
+    LLM_TOKENS_PER_MINUTE: int = 0
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_MAX_CONNECTIONS: int = 32
+    LLM_TIMEOUT_SECONDS: float = 60
+    LLM_MAX_RETRIES: int = 4
+    LLM_BACKOFF_BASE_SECONDS: float = 0.5
+    LLM_BACKOFF_MAX_SECONDS: float = 30
     
     # File Upload Settings
     MAX_FILE_SIZE_MB: int = 50
+    UPLOAD_SPOOL_MEMORY_MB: int = 8
     ALLOWED_ORIGINS: List[str] = ["*"]
     
     # RAG Configuration
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
     TOP_K_RESULTS: int = 5
+    VECTOR_STORE_MAX_DELTA_CHUNKS: int = 5000
+    
+    # Context Assembly (candidates are re-ranked with MMR, merged and packed into the token budget)
+    CONTEXT_CANDIDATES: int = 15
+    CONTEXT_MAX_TOKENS: int = 3000
+    CONTEXT_MMR_LAMBDA: float = 0.7
+    CONTEXT_DUPLICATE_SIMILARITY: float = 0.95
+    TOKENIZER_ENCODING: str = "cl100k_base"
+    
+    # Answer Generation (ask for follow-ups in the answer itself; a separate call is only the fallback)
+    FOLLOWUPS_IN_ANSWER: bool = True
+    # Answers are generated in the requested language; translate only those that came back in another one
+    TRANSLATION_FALLBACK: bool = True
+    TRANSLATION_CACHE_MAX_ENTRIES: int = 2000
+    
+    # Reranking (local cross-encoder over the candidates; vector order is kept past the latency budget)
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 50
+    RERANK_TIMEOUT_MS: int = 300
+    RERANK_MAX_LENGTH: int = 256
+    RERANK_BATCH_SIZE: int = 32
+    
+    # Dense Index ("flat", "ivf_flat", "hnsw", "ivf_pq" or "auto": flat below the threshold, IVF-Flat above)
+    # IVF lists are memory-mapped and shared between workers; an HNSW graph is loaded into each worker's RAM
+    VECTOR_INDEX_TYPE: str = "auto"
+    VECTOR_INDEX_AUTO_THRESHOLD: int = 50000
+    VECTOR_INDEX_RETRAIN_GROWTH: float = 2.0
+    IVF_NLIST: int = 0
+    IVF_NPROBE: int = 16
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    PQ_M: int = 16
+    PQ_NBITS: int = 8
+    
+    # Hybrid Retrieval (BM25 + dense, merged with reciprocal rank fusion)
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_CANDIDATES: int = 20
+    RRF_K: int = 60
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+    
+    # PDF Ingestion (0 workers = size to the machine's cores)
+    PDF_WORKERS: int = 0
+    PDF_PAGES_PER_TASK: int = 8
+    PDF_PARALLEL_MIN_PAGES: int = 32
+    INGEST_BATCH_CHUNKS: int = 256
+    
+    # Ingestion Job Queue
+    INGEST_WORKERS: int = 2
+    INGEST_QUEUE_SIZE: int = 16
+    INGEST_JOB_HISTORY: int = 500
+    INGEST_RETRY_AFTER_SECONDS: int = 5
+    
+    # Local Embedding Engine (0 = size to the machine's cores)
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_WORKERS: int = 0
+    EMBEDDING_THREADS_PER_WORKER: int = 0
+    
+    # Website Crawler
+    CRAWL_MAX_PAGES: int = 50
+    CRAWL_MAX_DEPTH: int = 2
+    CRAWL_CONCURRENCY: int = 8
+    CRAWL_PER_HOST_CONCURRENCY: int = 4
+    CRAWL_TIMEOUT_SECONDS: float = 30
+    CRAWL_MAX_RETRIES: int = 3
+    
+    # Collections (one index per site/bot; idle ones are closed LRU beyond these limits)
+    COLLECTION_MEMORY_BUDGET_MB: int = 1024
+    MAX_OPEN_COLLECTIONS: int = 64
+    
+    # Batch Queries
+    BATCH_QUERY_MAX_QUESTIONS: int = 5000
+    BATCH_QUERY_CONCURRENCY: int = 8
+    
+    # Document Summaries
+    SUMMARY_CONCURRENCY: int = 2
+    
+    # Embedding Cache
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000
+    
+    # Answer Cache
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY: float = 0.95
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    
+    # Analytics Event Log
+    ANALYTICS_FLUSH_INTERVAL_SECONDS: float = 1.0
+    ANALYTICS_FLUSH_BATCH: int = 100
+    ANALYTICS_MAX_FILE_MB: int = 10
+    ANALYTICS_BACKUP_COUNT: int = 5
+    
+    # Tracing (per-stage latency histograms, exposed on /metrics)
+    TRACING_ENABLED: bool = True
     
     # Storage Paths
     VECTOR_STORE_PATH: str = "./vector_db"
-    ANALYTICS_FILE: str = "./analytics.json"
+    EMBEDDING_CACHE_PATH: str = "./embedding_cache"
+    ANALYTICS_FILE: str = "./analytics.jsonl"
+    URL_STATE_PATH: str = "./url_state.sqlite"
+    SUMMARY_STORE_PATH: str = "./summaries.sqlite"
+    COLLECTIONS_PATH: str = "./collections"
     UPLOAD_DIR: str = "./uploads"
     
     # Computed Properties
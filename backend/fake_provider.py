@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI / Groq chat completions API, for load and retry testing.
+
+Serves /v1/chat/completions (OpenAI) and /openai/v1/chat/completions (Groq),
+streaming or not, with a configurable latency, a requests-per-minute limit
+enforced with 429 + Retry-After, and a share of random 503s.
+
+Usage: python fake_provider.py [--port 9000] [--latency 0.5] [--rpm 60] [--error-rate 0.05]
+       then start the backend with LLM_BASE_URL=http://localhost:9000 (Groq)
+       or LLM_BASE_URL=http://localhost:9000/v1 (OpenAI)
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from collections import deque
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Fake LLM provider")
+options = argparse.Namespace(latency=0.5, rpm=0, error_rate=0.0)
+recent_requests = deque()
+
+def completion_text(messages: list) -> str:
+    system = messages[0]["content"] if messages else ""
+    questions = "What are the main components?\nHow is it configured?\nWhat are the alternatives?\nWhere is it used in practice?"
+    if "follow-up questions" in system:
+        return questions
+    if "translator" in system:
+        return messages[-1]["content"]
+    answer = "This is a canned answer from the fake provider. " * 8
+    if "[[FOLLOWUPS]]" in system:
+        return f"{answer.strip()}\n[[FOLLOWUPS]]\n{questions}"
+    return answer
+
+def rate_limited() -> float:
+    """Seconds until a request fits in the sliding one-minute window, 0 if it fits now"""
+    now = time.monotonic()
+    while recent_requests and now - recent_requests[0] > 60:
+        recent_requests.popleft()
+    if options.rpm and len(recent_requests) >= options.rpm:
+        return 60 - (now - recent_requests[0])
+    recent_requests.append(now)
+    return 0.0
+
+@app.post("/v1/chat/completions")
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    wait = rate_limited()
+    if wait:
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"retry-after": f"{wait:.2f}"}
+        )
+    if random.random() < options.error_rate:
+        return JSONResponse({"error": {"message": "Service unavailable", "type": "server_error"}}, status_code=503)
+    await asyncio.sleep(options.latency)
+    text = completion_text(body.get("messages", []))
+    prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    if body.get("stream"):
+        async def events():
+            for word in text.split(" "):
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(0.01)
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+    completion_tokens = len(text) // 4
+    return {
+        "id": completion_id, "object": "chat.completion", "created": created, "model": body["model"],
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake chat completions provider")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before each response starts")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before answering 429 (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 503")
+    args = parser.parse_args()
+    options.latency, options.rpm, options.error_rate = args.latency, args.rpm, args.error_rate
+    print(f"🧪 Fake provider on :{args.port} (latency {args.latency}s, rpm {args.rpm or 'unlimited'}, error rate {args.error_rate})")
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
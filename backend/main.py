@@ -1,17 +1,34 @@
 import os
+import json
+import asyncio
+import functools
+import contextlib
 import time
 import uuid
-from typing import Optional
+from typing import List, Optional
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 
 from config import settings
-from models import QueryRequest, QueryResponse, UploadResponse, HealthResponse, AnalyticsResponse
+from models import (
+    QueryRequest, BatchQueryRequest, QueryResponse, UploadResponse, CrawlRequest, CrawlResponse,
+    RefreshRequest, RefreshResponse, JobStatusResponse, SummaryResponse, HealthResponse, AnalyticsResponse
+)
 from services.document_processor import document_processor
-from services.vector_store import vector_store_service
+from services.crawler import web_crawler
+from services.url_state import content_hash
+from services.ingestion_jobs import IngestionJob, ingestion_queue
+from services.summaries import summary_service
+from services.embeddings import embedding_service
+from services.collection_manager import Collection, collection_manager, DEFAULT_COLLECTION
+from services.context_builder import context_builder
+from services.reranker import reranker
 from services.llm_service import llm_service
+from services.provider_scheduler import PRIORITY_BACKGROUND
 from services.analytics import analytics_service
+from services.tracing import tracer, round_timings
 
 startup_time = time.time()
 
@@ -34,20 +51,40 @@ async def startup_event():
     print(f"🚀 Starting {settings.APP_NAME} v{settings.VERSION}")
     print(f"📊 LLM Provider: {settings.LLM_PROVIDER}")
     print(f"🔑 LLM Configured: {settings.is_llm_configured}")
-    print(f"📁 Vector Store: {settings.VECTOR_STORE_PATH}")
-    print(f"📄 Document Count: {vector_store_service.get_document_count()}")
+    print(f"📁 Vector Store: {settings.VECTOR_STORE_PATH} (collections under {settings.COLLECTIONS_PATH})")
+    print(f"🗂️ Collections: {len(collection_manager.list_collections())}")
+    
+    if settings.RERANK_ENABLED:
+        reranker.warm_up()
     
     if not settings.is_llm_configured:
         print(f"⚠️  Warning: {settings.LLM_PROVIDER} API key not configured. Please set {settings.LLM_PROVIDER.upper()}_API_KEY in .env file")
 
-async def validate_file_size(file: UploadFile = File(...)):
-    """Validate uploaded file size"""
-    if file.size and file.size > settings.max_file_size_bytes:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File size exceeds maximum allowed size of {settings.MAX_FILE_SIZE_MB}MB"
-        )
-    return file
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ingestion_queue.close()
+    await summary_service.close()
+    collection_manager.close()
+    embedding_service.close()
+    reranker.close()
+    document_processor.close()
+    await web_crawler.close()
+    await llm_service.aclose()
+    analytics_service.close()
+
+@contextlib.asynccontextmanager
+async def open_collection(collection_id: str, create: bool = False):
+    """Keep a collection open (and safe from eviction) for the duration of a request or job"""
+    try:
+        collection = await run_in_threadpool(collection_manager.acquire, collection_id, create)
+    except KeyError:
+        raise HTTPException(404, f"Collection not found: {collection_id}")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    try:
+        yield collection
+    finally:
+        collection_manager.release(collection)
 
 @app.get("/")
 async def root():
@@ -57,100 +94,500 @@ async def root():
         "version": settings.VERSION,
         "status": "running",
         "endpoints": {
-            "upload": "POST /upload - Upload PDF files or process URLs/text",
+            "upload": "POST /upload - Queue a PDF file, URL or text for ingestion",
+            "jobs": "GET /jobs/{id} - Ingestion job stage, progress and result",
+            "crawl": "POST /crawl - Crawl a website from a seed URL and ingest its pages",
+            "refresh": "POST /refresh - Re-check ingested URLs and re-embed only the pages that changed",
             "query": "POST /query - Ask questions about uploaded documents",
+            "query_stream": "POST /query/stream - Ask a question and stream the answer as server-sent events",
+            "query_batch": "POST /query/batch - Answer many questions at once, streamed as they complete",
+            "documents": "GET /documents - List ingested documents, DELETE /documents/{id} - Remove one",
+            "collections": "GET /collections - List collections, DELETE /collections/{id} - Delete one",
+            "summary": "GET /documents/{id}/summary - Document summary, generated in the background",
             "health": "GET /health - Check system health",
             "analytics": "GET /analytics - Get usage analytics",
+            "metrics": "GET /metrics - Per-stage latency histograms in Prometheus text format",
             "docs": "/docs - API documentation"
         }
     }
 
-@app.post("/upload", response_model=UploadResponse)
+UPLOAD_READ_CHUNK_BYTES = 1024 * 1024
+
+async def _spool_upload(file: UploadFile):
+    """Copy an upload into a spool chunk by chunk, enforcing the size limit as it arrives"""
+    spool = document_processor.open_upload_spool(file.filename)
+    try:
+        while True:
+            data = await file.read(UPLOAD_READ_CHUNK_BYTES)
+            if not data:
+                break
+            if spool.size + len(data) > settings.max_file_size_bytes:
+                raise HTTPException(413, f"File size exceeds maximum allowed size of {settings.MAX_FILE_SIZE_MB}MB")
+            spool.write(data)
+    except Exception:
+        spool.close()
+        raise
+    return spool
+
+def _keep_first_chunks(batches, kept: list, limit: int = 3):
+    """Pass chunk batches through, keeping the first few for the summary"""
+    for batch in batches:
+        if len(kept) < limit:
+            kept.extend(batch[:limit - len(kept)])
+        yield batch
+
+@app.post("/upload", response_model=UploadResponse, status_code=202)
 async def upload_document(
     file: Optional[UploadFile] = File(None),
     url: Optional[str] = Form(None),
-    text: Optional[str] = Form(None)
+    text: Optional[str] = Form(None),
+    document_id: Optional[str] = Form(None),
+    replace_existing: bool = Form(False),
+    collection_id: str = Form(DEFAULT_COLLECTION),
+    include_timings: bool = Form(False)
 ):
     """
     Upload and process documents from multiple sources:
     - PDF files (multipart/form-data)
     - Website URLs 
     - Raw text content
+
+    The upload is validated and queued, and a job id is returned right away;
+    poll GET /jobs/{job_id} for progress and the final result. Documents are
+    added to the collection's corpus (created on first upload). Pass an
+    existing document_id to replace that document's chunks, or
+    replace_existing=true to wipe the collection first. With
+    include_timings=true the job result breaks down the time spent fetching,
+    parsing, splitting, embedding and saving.
     """
     session_id = str(uuid.uuid4())
+    try:
+        collection_manager.validate_id(collection_id)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     
+    sources_provided = sum([bool(file), bool(url), bool(text)])
+    if sources_provided == 0:
+        raise HTTPException(400, "No source provided. Please provide a file, URL, or text content.")
+    elif sources_provided > 1:
+        raise HTTPException(400, "Multiple sources provided. Please provide only one source.")
+
+    spool = None
+    if file:
+        if not file.filename or not file.filename.lower().endswith('.pdf'):
+            raise HTTPException(400, "Only PDF files are supported for file uploads")
+        
+        if file.size and file.size > settings.max_file_size_bytes:
+            raise HTTPException(413, f"File size exceeds maximum allowed size of {settings.MAX_FILE_SIZE_MB}MB")
+        
+        # The request body has to be read before responding; the spool keeps it until a worker picks the job up
+        spool = await _spool_upload(file)
+        source_info = f"PDF: {file.filename}"
+    elif url:
+        url = url.strip()
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+        source_info = f"URL: {url}"
+    else:
+        source_info = f"Text: {len(text)} characters"
+
+    job = IngestionJob(source_info, document_id or session_id, collection_id)
+    runner = functools.partial(
+        _run_upload_job,
+        session_id=session_id,
+        spool=spool,
+        filename=file.filename if file else None,
+        url=url,
+        text=text,
+        document_id_given=bool(document_id),
+        replace_existing=replace_existing,
+        include_timings=include_timings
+    )
     try:
-        sources_provided = sum([bool(file), bool(url), bool(text)])
-        if sources_provided == 0:
-            raise HTTPException(400, "No source provided. Please provide a file, URL, or text content.")
-        elif sources_provided > 1:
-            raise HTTPException(400, "Multiple sources provided. Please provide only one source.")
-
-        documents = []
-        source_info = ""
-        file_size = 0
-
-        if file:
-            if not file.filename or not file.filename.lower().endswith('.pdf'):
-                raise HTTPException(400, "Only PDF files are supported for file uploads")
-            
-            if file.size and file.size > settings.max_file_size_bytes:
-                raise HTTPException(413, f"File size exceeds maximum allowed size of {settings.MAX_FILE_SIZE_MB}MB")
-            
-            file_content = await file.read()
-            file_size = len(file_content)
-            file_path = document_processor.save_uploaded_file(file_content, file.filename)
-            
+        ingestion_queue.submit(job, runner)
+    except asyncio.QueueFull:
+        if spool:
+            spool.close()
+        raise HTTPException(
+            503,
+            "Too many uploads are being processed. Please retry shortly.",
+            headers={"Retry-After": str(settings.INGEST_RETRY_AFTER_SECONDS)}
+        )
+
+    return UploadResponse(
+        status="queued",
+        message="Upload accepted and queued for processing",
+        document_id=job.document_id,
+        job_id=job.id,
+        collection_id=collection_id
+    )
+
+async def _run_upload_job(job: IngestionJob, **options) -> dict:
+    """Run one queued upload, holding its collection open until the job is done"""
+    async with open_collection(job.collection_id, create=True) as collection:
+        return await _ingest_upload(collection, job, **options)
+
+async def _ingest_upload(
+    collection: Collection,
+    job: IngestionJob,
+    session_id: str,
+    spool=None,
+    filename: Optional[str] = None,
+    url: Optional[str] = None,
+    text: Optional[str] = None,
+    document_id_given: bool = False,
+    replace_existing: bool = False,
+    include_timings: bool = False
+) -> dict:
+    """Parse, embed and summarize one queued upload, reporting progress on the job"""
+    timings = tracer.start_request()
+    start_time = time.perf_counter()
+    documents = []
+    file_size = 0
+    chunks_created = 0
+
+    try:
+        if spool:
+            file_size = spool.size
+            pdf_stream = spool.open()
+            job.update(stage="embedding")
+
+            def track_progress(pages_scanned: int, page_count: int):
+                job.update(progress=0.9 * pages_scanned / page_count)
+
+            def count_chunks(batches):
+                total = 0
+                for batch in batches:
+                    total += len(batch)
+                    job.update(chunks_created=total)
+                    yield batch
+
             try:
-                documents = document_processor.process_pdf(file_path)
-                source_info = f"PDF: {file.filename}"
+                # Parsed straight from the spool; large uploads are on disk so pages can be extracted in parallel
+                chunks_created = await run_in_threadpool(
+                    collection.store.add_document_stream,
+                    count_chunks(_keep_first_chunks(
+                        document_processor.iter_pdf_chunks(
+                            spool.path or pdf_stream, source_name=filename, on_progress=track_progress
+                        ),
+                        documents
+                    )),
+                    replace_existing=replace_existing,
+                    document_id=job.document_id
+                )
             finally:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-        
+                spool.close()
+
         elif url:
-            normalized_url = url.strip()
-            if not normalized_url.startswith(('http://', 'https://')):
-                normalized_url = 'https://' + normalized_url
-            
-            documents = document_processor.process_url(normalized_url)
-            source_info = f"URL: {normalized_url}"
-            file_size = len(normalized_url.encode())
-        
+            job.update(stage="fetching")
+            response = await run_in_threadpool(document_processor.fetch_url, url)
+            file_size = len(response.content)
+            if not document_id_given:
+                # Re-uploading a known URL updates its document instead of adding a duplicate
+                state = collection.url_state.get(url)
+                if state:
+                    job.document_id = state["document_id"]
+            job.update(stage="embedding", progress=0.3)
+            documents, _ = await _ingest_web_page(
+                collection,
+                url,
+                response.content,
+                response.headers.get('etag'),
+                response.headers.get('last-modified'),
+                job.document_id,
+                replace_existing
+            )
+            chunks_created = len(documents)
+
         elif text:
-            documents = document_processor.process_text(text, f"text_input_{session_id}")
-            source_info = f"Text: {len(text)} characters"
+            job.update(stage="parsing")
+            documents = await run_in_threadpool(document_processor.process_text, text, f"text_input_{session_id}")
             file_size = len(text.encode())
+            job.update(stage="embedding", progress=0.3)
+            chunks_created = await run_in_threadpool(
+                collection.store.add_documents,
+                documents,
+                replace_existing,
+                job.document_id
+            )
 
         if not documents:
-            raise HTTPException(400, "Failed to extract content from the provided source")
-
-        chunks_created = vector_store_service.add_documents(documents, replace_existing=True)
+            raise ValueError("Failed to extract content from the provided source")
 
-        summary = llm_service.generate_summary(documents)
+        job.update(chunks_created=chunks_created)
+        # Summaries are generated in the background; fetch them from /documents/{id}/summary
+        summary = summary_service.schedule(collection.id, job.document_id, documents)
 
-        filename = file.filename if file else (url if url else "text_input")
-        analytics_service.log_upload(filename, file_size, chunks_created, session_id)
+        analytics_service.log_upload(filename or url or "text_input", file_size, chunks_created, session_id)
 
-        print(f"✅ Successfully processed {source_info} -> {chunks_created} chunks")
+        tracer.observe("upload", time.perf_counter() - start_time)
+        print(f"✅ Successfully processed {job.source} -> {chunks_created} chunks")
 
         return UploadResponse(
             status="success",
             message="Document processed successfully",
-            document_id=session_id,
+            document_id=job.document_id,
             chunks_created=chunks_created,
-            summary=summary
-        )
+            summary=summary,
+            job_id=job.id,
+            collection_id=collection.id,
+            timings=round_timings(timings) if include_timings else None
+        ).dict()
 
-    except HTTPException:
-        raise
     except Exception as e:
-        error_msg = f"Processing failed: {str(e)}"
         print(f"❌ Error processing upload: {e}")
-        
-        analytics_service.log_error("upload_error", str(e), {"source_info": source_info}, session_id)
-        
-        raise HTTPException(500, error_msg)
+        analytics_service.log_error("upload_error", str(e), {"source_info": job.source}, session_id)
+        raise ValueError(f"Processing failed: {str(e)}")
+
+@app.get("/jobs", response_model=List[JobStatusResponse])
+async def list_jobs():
+    """List recent ingestion jobs, oldest first"""
+    return [job.to_dict() for job in ingestion_queue.list_jobs()]
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """Report an ingestion job's stage, progress and chunk count; the upload result once completed"""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job not found: {job_id}")
+    return job.to_dict()
+
+async def _ingest_web_page(
+    collection: Collection,
+    url: str,
+    content: bytes,
+    etag: Optional[str],
+    last_modified: Optional[str],
+    document_id: str,
+    replace_existing: bool = False,
+    documents=None
+):
+    """Split a fetched page and embed it unless its content is unchanged.
+
+    Returns (documents, changed). Pages whose extracted text hashes the same
+    as last time keep their existing chunks; only the validators are saved.
+    """
+    if documents is None:
+        documents = await run_in_threadpool(document_processor.process_html, url, content)
+    digest = content_hash(documents)
+    state = collection.url_state.get(url)
+    unchanged = (
+        not replace_existing
+        and state is not None
+        and state["content_hash"] == digest
+        and state["document_id"] == document_id
+        and collection.store.has_document(document_id)
+    )
+    if unchanged:
+        print(f"⏭️ Unchanged, keeping existing chunks: {url}")
+    else:
+        await run_in_threadpool(collection.store.add_documents, documents, replace_existing, document_id)
+    if replace_existing:
+        collection.url_state.clear()
+    collection.url_state.record(url, document_id, etag, last_modified, digest)
+    return documents, not unchanged
+
+def crawl_document_id(url: str, collection_id: str = DEFAULT_COLLECTION) -> str:
+    """Stable document id per page URL (and collection), so re-crawling a page replaces its chunks"""
+    if collection_id == DEFAULT_COLLECTION:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, url))
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{collection_id}:{url}"))
+
+@app.post("/crawl", response_model=CrawlResponse)
+async def crawl_website(request: CrawlRequest):
+    """
+    Crawl a website and ingest every page as its own document.
+
+    Pages of the seed's site (found through links up to max_depth hops and
+    its sitemap.xml) are fetched concurrently and cleaned, split and
+    embedded as they arrive, while the remaining pages are still being
+    fetched. Each page is stored under an id derived from its URL.
+    """
+    session_id = str(uuid.uuid4())
+    seed_url = request.url.strip()
+    if not seed_url.startswith(('http://', 'https://')):
+        seed_url = 'https://' + seed_url
+    if not document_processor._is_valid_url(seed_url):
+        raise HTTPException(400, "Invalid URL format. Please use a complete URL like https://example.com")
+
+    max_pages = min(request.max_pages or settings.CRAWL_MAX_PAGES, settings.CRAWL_MAX_PAGES)
+    max_depth = request.max_depth if request.max_depth is not None else settings.CRAWL_MAX_DEPTH
+    document_ids = []
+    pages_skipped = 0
+    pages_unchanged = 0
+    chunks_created = 0
+    total_bytes = 0
+
+    async with open_collection(request.collection_id, create=True) as collection:
+        try:
+            print(f"🕸️ Crawling {seed_url} (max {max_pages} pages, depth {max_depth})")
+            async for page in web_crawler.crawl(seed_url, max_pages, max_depth, request.use_sitemap):
+                try:
+                    documents = await run_in_threadpool(document_processor.process_html, page.url, page.content)
+                except ValueError as e:
+                    print(f"⚠️ Skipping {page.url}: {e}")
+                    pages_skipped += 1
+                    continue
+                document_id = crawl_document_id(page.url, collection.id)
+                chunks, changed = await _ingest_web_page(
+                    collection, page.url, page.content, page.etag, page.last_modified, document_id, documents=documents
+                )
+                if changed:
+                    chunks_created += len(chunks)
+                else:
+                    pages_unchanged += 1
+                document_ids.append(document_id)
+                total_bytes += len(page.content)
+
+            if not document_ids:
+                raise HTTPException(400, "No pages with extractable content were found")
+
+            analytics_service.log_upload(seed_url, total_bytes, chunks_created, session_id)
+            print(f"✅ Crawled {seed_url}: {len(document_ids)} pages -> {chunks_created} chunks")
+
+            return CrawlResponse(
+                status="success",
+                message=f"Crawled {len(document_ids)} pages",
+                pages_ingested=len(document_ids),
+                pages_skipped=pages_skipped,
+                pages_unchanged=pages_unchanged,
+                chunks_created=chunks_created,
+                document_ids=document_ids
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"❌ Error crawling website: {e}")
+            analytics_service.log_error("crawl_error", str(e), {"url": seed_url}, session_id)
+            raise HTTPException(500, f"Crawl failed: {str(e)}")
+
+@app.post("/refresh", response_model=RefreshResponse)
+async def refresh_urls(request: RefreshRequest = RefreshRequest()):
+    """
+    Re-check ingested web pages and update only the ones that changed.
+
+    Every tracked URL (or just the given ones) is fetched concurrently with
+    If-None-Match / If-Modified-Since. A 304, or a page whose extracted text
+    hashes the same as before, is left alone; changed pages have their
+    chunks replaced and pages that are gone (404/410) are removed.
+    """
+    async with open_collection(request.collection_id) as collection:
+        return await _refresh_collection(collection, request)
+
+async def _refresh_collection(collection: Collection, request: RefreshRequest) -> RefreshResponse:
+    session_id = str(uuid.uuid4())
+    start_time = time.time()
+    live_documents = collection.store.list_documents()
+    tracked = []
+    for state in collection.url_state.list(request.urls):
+        if state["document_id"] in live_documents:
+            tracked.append(state)
+        else:
+            collection.url_state.remove(state["url"])
+
+    counts = {"unchanged": 0, "updated": 0, "removed": 0, "failed": 0}
+    chunks_created = 0
+
+    async def check(state):
+        return state, await web_crawler.fetch_conditional(state["url"], state["etag"], state["last_modified"])
+
+    tasks = [asyncio.create_task(check(state)) for state in tracked]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            state, response = await next_result
+            url = state["url"]
+            if response is None:
+                counts["failed"] += 1
+            elif response.status_code == 304:
+                collection.url_state.touch(url)
+                counts["unchanged"] += 1
+            elif response.status_code in (404, 410):
+                await run_in_threadpool(collection.store.delete_document, state["document_id"])
+                collection.url_state.remove(url)
+                print(f"🗑️ Removed page that no longer exists: {url}")
+                counts["removed"] += 1
+            else:
+                try:
+                    document_processor.check_web_content_type(response.headers.get('content-type', ''))
+                    documents, changed = await _ingest_web_page(
+                        collection,
+                        url,
+                        response.content,
+                        response.headers.get('etag'),
+                        response.headers.get('last-modified'),
+                        state["document_id"]
+                    )
+                except ValueError as e:
+                    print(f"⚠️ Could not refresh {url}: {e}")
+                    counts["failed"] += 1
+                    continue
+                if changed:
+                    if summary_service.get(collection.id, state["document_id"])["status"] != "missing":
+                        summary_service.schedule(collection.id, state["document_id"], documents)
+                    chunks_created += len(documents)
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
+
+        print(f"🔄 Refreshed {len(tracked)} URLs: {counts}")
+        if counts["updated"]:
+            analytics_service.log_upload("refresh", 0, chunks_created, session_id)
+
+        return RefreshResponse(
+            status="success",
+            checked=len(tracked),
+            chunks_created=chunks_created,
+            processing_time_ms=int((time.time() - start_time) * 1000),
+            **counts
+        )
+
+    except Exception as e:
+        print(f"❌ Error refreshing URLs: {e}")
+        analytics_service.log_error("refresh_error", str(e), {"urls": len(tracked)}, session_id)
+        raise HTTPException(500, f"Refresh failed: {str(e)}")
+    finally:
+        # A failure part way through stops the fetches that are still pending
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def _retrieve_contexts(collection: Collection, questions: List[str], query_embeddings, nprobe=None, ef_search=None) -> list:
+    """Search, rerank if enabled, and assemble each question's deduplicated, token-budgeted prompt context"""
+    candidates = settings.RERANK_CANDIDATES if settings.RERANK_ENABLED else settings.CONTEXT_CANDIDATES
+    with tracer.stage("search"):
+        hits = collection.store.search_hits(questions, query_embeddings, candidates, nprobe, ef_search)
+    contexts = []
+    for question, question_hits in zip(questions, hits):
+        if settings.RERANK_ENABLED:
+            with tracer.stage("rerank"):
+                # Reranked hits carry the cross-encoder score, so confidence is computed from it
+                question_hits = reranker.rerank(question, question_hits, settings.CONTEXT_CANDIDATES) or question_hits[:settings.CONTEXT_CANDIDATES]
+        with tracer.stage("context_build"):
+            contexts.append(context_builder.build(question_hits))
+    return contexts
+
+def _lookup_cached_answer(
+    collection: Collection, request: QueryRequest, query_embedding, corpus_version: int, include_followups: bool = True
+) -> Optional[QueryResponse]:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    with tracer.stage("cache_lookup"):
+        cached = collection.answer_cache.lookup(
+            query_embedding, request.mode, request.language, request.short_answer, corpus_version, require_followups=include_followups
+        )
+    if cached is not None:
+        print(f"⚡ Answer cache hit for: {request.question[:50]}...")
+        # Served without calling the provider
+        cached.prompt_tokens = 0
+        if not include_followups:
+            cached.followup_questions = None
+    return cached
+
+def _store_cached_answer(collection: Collection, request: QueryRequest, query_embedding, corpus_version: int, response: QueryResponse):
+    # Only cache grounded answers; errors and "nothing found" replies come back without sources
+    if settings.ANSWER_CACHE_ENABLED and response.sources:
+        collection.answer_cache.store(query_embedding, request.mode, request.language, request.short_answer, corpus_version, response)
 
 @app.post("/query", response_model=QueryResponse)
 async def query_documents(request: QueryRequest):
@@ -162,34 +599,51 @@ async def query_documents(request: QueryRequest):
     - Short/full answer toggle
     - Confidence scoring
     - Source attribution
+    - Per-stage timing breakdown (include_timings)
     """
+    async with open_collection(request.collection_id) as collection:
+        return await _answer_query(collection, request)
+
+async def _answer_query(collection: Collection, request: QueryRequest) -> QueryResponse:
     session_id = str(uuid.uuid4())
     
     try:
         if not settings.is_llm_configured:
             raise HTTPException(503, f"{settings.LLM_PROVIDER} API key not configured. Please check your environment variables.")
         
-        if vector_store_service.get_document_count() == 0:
+        if collection.store.get_document_count() == 0:
             raise HTTPException(400, "No documents available. Please upload documents first using the /upload endpoint.")
 
         print(f"🔍 Processing query: {request.question[:50]}... (language: {request.language})")
 
-        context_docs = vector_store_service.similarity_search(request.question)
+        start_time = time.time()
+        timings = tracer.start_request()
+        corpus_version = collection.store.corpus_version
+        # Vector search and query embedding are blocking; keep them off the event loop
+        with tracer.stage("embed_query"):
+            query_embedding = await run_in_threadpool(embedding_service.embed_query, request.question)
+        response = _lookup_cached_answer(collection, request, query_embedding, corpus_version)
 
-        response = llm_service.generate_answer(
-            question=request.question,
-            context_docs=context_docs,
-            mode=request.mode,
-            language=request.language,
-            short_answer=request.short_answer
-        )
+        if response is not None:
+            response.processing_time_ms = int((time.time() - start_time) * 1000)
+        else:
+            context_docs = (await run_in_threadpool(
+                _retrieve_contexts, collection, [request.question], [query_embedding], request.nprobe, request.ef_search
+            ))[0]
 
-        followup_questions = llm_service.generate_followup_questions(
-            question=request.question,
-            answer=response.answer
-        )
-        
-        response.followup_questions = followup_questions
+            response = await llm_service.agenerate_answer(
+                question=request.question,
+                context_docs=context_docs,
+                mode=request.mode,
+                language=request.language,
+                short_answer=request.short_answer,
+                include_followups=True
+            )
+            _store_cached_answer(collection, request, query_embedding, corpus_version, response)
+
+        tracer.observe("query", time.time() - start_time)
+        if request.include_timings:
+            response.timings = round_timings(timings)
 
         analytics_service.log_query(
             question=request.question,
@@ -197,7 +651,8 @@ async def query_documents(request: QueryRequest):
             confidence_score=response.confidence_score or 0.0,
             processing_time_ms=response.processing_time_ms or 0,
             language=request.language,
-            session_id=session_id
+            session_id=session_id,
+            prompt_tokens=response.prompt_tokens
         )
 
         print(f"✅ Query processed in {response.processing_time_ms}ms (confidence: {response.confidence_score})")
@@ -213,6 +668,244 @@ async def query_documents(request: QueryRequest):
         
         raise HTTPException(500, error_msg)
 
+def _sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/query/stream")
+async def query_documents_stream(request: QueryRequest):
+    """
+    Streaming variant of /query using server-sent events.
+
+    Events, in order:
+    - sources: retrieved chunks and context preview
+    - token: answer text deltas as the provider emits them
+    - followups: suggested follow-up questions
+    - done: final answer, confidence score, prompt tokens and processing time,
+      plus the per-stage timing breakdown with include_timings
+    If generation fails mid-stream, an error event ends the stream in place of
+    followups and done.
+    """
+    session_id = str(uuid.uuid4())
+
+    if not settings.is_llm_configured:
+        raise HTTPException(503, f"{settings.LLM_PROVIDER} API key not configured. Please check your environment variables.")
+
+    # Retrieval happens up front; the collection is released before the answer streams
+    async with open_collection(request.collection_id) as collection:
+        if collection.store.get_document_count() == 0:
+            raise HTTPException(400, "No documents available. Please upload documents first using the /upload endpoint.")
+
+        print(f"🔍 Streaming query: {request.question[:50]}... (language: {request.language})")
+
+        start_time = time.time()
+        timings = tracer.start_request()
+        corpus_version = collection.store.corpus_version
+        context_docs = []
+        try:
+            with tracer.stage("embed_query"):
+                query_embedding = await run_in_threadpool(embedding_service.embed_query, request.question)
+            cached = _lookup_cached_answer(collection, request, query_embedding, corpus_version)
+            if cached is None:
+                context_docs = (await run_in_threadpool(
+                    _retrieve_contexts, collection, [request.question], [query_embedding], request.nprobe, request.ef_search
+                ))[0]
+        except Exception as e:
+            print(f"❌ Error processing query: {e}")
+            analytics_service.log_error("query_error", str(e), {"question": request.question}, session_id)
+            raise HTTPException(500, f"Query processing failed: {str(e)}")
+
+    async def replay_cached():
+        yield {"event": "sources", "sources": [source.dict() for source in cached.sources], "context": cached.context}
+        yield {"event": "token", "text": cached.answer}
+        yield {"event": "followups", "followup_questions": cached.followup_questions or []}
+        yield {
+            "event": "done",
+            "answer": cached.answer,
+            "language": cached.language,
+            "confidence_score": cached.confidence_score,
+            "prompt_tokens": 0,
+            "processing_time_ms": int((time.time() - start_time) * 1000)
+        }
+
+    async def event_stream():
+        collected = {}
+        try:
+            events = replay_cached() if cached is not None else llm_service.astream_answer(
+                question=request.question,
+                context_docs=context_docs,
+                mode=request.mode,
+                language=request.language,
+                short_answer=request.short_answer
+            )
+            async for event in events:
+                name = event.pop("event")
+                collected[name] = event
+                if name == "done":
+                    tracer.observe("query_stream", time.time() - start_time)
+                    if request.include_timings:
+                        event["timings"] = round_timings(timings)
+                yield _sse_event(name, event)
+                if name == "error":
+                    analytics_service.log_error("query_error", event["detail"], {"question": request.question}, session_id)
+                if name == "done":
+                    if cached is None:
+                        _store_cached_answer(collection, request, query_embedding, corpus_version, QueryResponse(
+                            answer=event["answer"],
+                            context=collected["sources"]["context"],
+                            sources=collected["sources"]["sources"],
+                            language=event["language"],
+                            processing_time_ms=event["processing_time_ms"],
+                            confidence_score=event["confidence_score"],
+                            prompt_tokens=event.get("prompt_tokens"),
+                            followup_questions=collected["followups"]["followup_questions"]
+                        ))
+                    analytics_service.log_query(
+                        question=request.question,
+                        answer_length=len(event["answer"]),
+                        confidence_score=event["confidence_score"] or 0.0,
+                        processing_time_ms=event["processing_time_ms"] or 0,
+                        language=request.language,
+                        session_id=session_id,
+                        prompt_tokens=event.get("prompt_tokens")
+                    )
+                    print(f"✅ Streamed query in {event['processing_time_ms']}ms (confidence: {event['confidence_score']})")
+        except Exception as e:
+            print(f"❌ Error streaming query: {e}")
+            analytics_service.log_error("query_error", str(e), {"question": request.question}, session_id)
+            yield _sse_event("error", {"detail": f"Query processing failed: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/batch")
+async def query_documents_batch(request: BatchQueryRequest):
+    """
+    Answer many questions in one request, for evaluation runs and FAQ generation.
+
+    All questions are embedded in one batched call and searched with one
+    vectorized index lookup; answers are then generated concurrently (up to
+    `concurrency` at a time, behind interactive queries) and streamed as
+    server-sent events as they finish:
+    - result: one per question, with its index in the request and the answer
+    - done: totals, prompt tokens sent and overall processing time
+    With include_timings, each result carries the timing breakdown of its
+    own answer and the done event that of the shared embedding and search.
+    """
+    if not settings.is_llm_configured:
+        raise HTTPException(503, f"{settings.LLM_PROVIDER} API key not configured. Please check your environment variables.")
+    if not request.questions:
+        raise HTTPException(400, "No questions provided")
+    if len(request.questions) > settings.BATCH_QUERY_MAX_QUESTIONS:
+        raise HTTPException(400, f"Too many questions (max {settings.BATCH_QUERY_MAX_QUESTIONS})")
+
+    session_id = str(uuid.uuid4())
+    questions = [
+        QueryRequest(question=question, **request.dict(include={"mode", "language", "short_answer", "collection_id", "nprobe", "ef_search"}))
+        for question in request.questions
+    ]
+
+    async with open_collection(request.collection_id) as collection:
+        if collection.store.get_document_count() == 0:
+            raise HTTPException(400, "No documents available. Please upload documents first using the /upload endpoint.")
+
+        print(f"🔍 Processing batch of {len(questions)} questions (language: {request.language})")
+
+        start_time = time.time()
+        timings = tracer.start_request()
+        corpus_version = collection.store.corpus_version
+        try:
+            with tracer.stage("embed_query"):
+                query_embeddings = await run_in_threadpool(embedding_service.embed_queries, request.questions)
+            cached = [
+                _lookup_cached_answer(collection, question, embedding, corpus_version, request.include_followups)
+                for question, embedding in zip(questions, query_embeddings)
+            ]
+            pending = [i for i, response in enumerate(cached) if response is None]
+            contexts = dict(zip(pending, await run_in_threadpool(
+                _retrieve_contexts, collection,
+                [request.questions[i] for i in pending], [query_embeddings[i] for i in pending],
+                request.nprobe, request.ef_search
+            )))
+        except Exception as e:
+            print(f"❌ Error processing batch query: {e}")
+            analytics_service.log_error("query_error", str(e), {"questions": len(questions)}, session_id)
+            raise HTTPException(500, f"Batch query processing failed: {str(e)}")
+
+    concurrency = max(1, min(request.concurrency or settings.BATCH_QUERY_CONCURRENCY, settings.BATCH_QUERY_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(i: int) -> tuple:
+        if cached[i] is not None:
+            return i, cached[i], True
+        # Each question's task collects its own breakdown
+        question_timings = tracer.start_request()
+        async with semaphore:
+            # Queued behind interactive traffic; rate limits are retried by the provider scheduler
+            response = await llm_service.agenerate_answer(
+                question=questions[i].question,
+                context_docs=contexts[i],
+                mode=request.mode,
+                language=request.language,
+                short_answer=request.short_answer,
+                include_followups=request.include_followups,
+                priority=PRIORITY_BACKGROUND
+            )
+        _store_cached_answer(collection, questions[i], query_embeddings[i], corpus_version, response)
+        if request.include_timings:
+            response.timings = round_timings(question_timings)
+        return i, response, False
+
+    async def event_stream():
+        tasks = [asyncio.ensure_future(answer(i)) for i in range(len(questions))]
+        answered = from_cache = prompt_tokens = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                i, response, was_cached = await next_done
+                answered += 1
+                from_cache += was_cached
+                prompt_tokens += response.prompt_tokens or 0
+                analytics_service.log_query(
+                    question=questions[i].question,
+                    answer_length=len(response.answer),
+                    confidence_score=response.confidence_score or 0.0,
+                    processing_time_ms=response.processing_time_ms or 0,
+                    language=request.language,
+                    session_id=session_id,
+                    prompt_tokens=response.prompt_tokens
+                )
+                yield _sse_event("result", {"index": i, "question": questions[i].question, "cached": was_cached, **response.dict()})
+            tracer.observe("query_batch", time.time() - start_time)
+            processing_time = int((time.time() - start_time) * 1000)
+            print(f"✅ Batch of {answered} questions processed in {processing_time}ms ({from_cache} from cache)")
+            done = {
+                "questions": len(questions),
+                "answered": answered,
+                "cached": from_cache,
+                "prompt_tokens": prompt_tokens,
+                "processing_time_ms": processing_time
+            }
+            if request.include_timings:
+                done["timings"] = round_timings(timings)
+            yield _sse_event("done", done)
+        except Exception as e:
+            print(f"❌ Error processing batch query: {e}")
+            analytics_service.log_error("query_error", str(e), {"questions": len(questions)}, session_id)
+            yield _sse_event("error", {"detail": f"Batch query processing failed: {str(e)}"})
+        finally:
+            # The client went away or a question failed: stop the remaining provider calls
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """
@@ -226,8 +919,9 @@ async def health_check():
     """
     try:
         uptime_seconds = time.time() - startup_time
-        doc_count = vector_store_service.get_document_count()
-        vector_status = vector_store_service.get_status()
+        async with open_collection(DEFAULT_COLLECTION) as collection:
+            doc_count = collection.store.get_document_count()
+            vector_status = collection.store.get_status()
         
         is_healthy = settings.is_llm_configured and vector_status != "error"
         
@@ -261,13 +955,23 @@ async def get_analytics():
         raise HTTPException(500, f"Failed to get analytics: {str(e)}")
 
 @app.get("/stats")
-async def get_system_stats():
-    """Get detailed system statistics"""
+async def get_system_stats(collection_id: str = DEFAULT_COLLECTION):
+    """Get detailed system statistics, with index and cache figures for one collection"""
+    async with open_collection(collection_id) as collection:
+        collection_stats = collection.get_stats()
     return {
-        "total_documents": vector_store_service.get_document_count(),
-        "vector_store_status": vector_store_service.get_status(),
+        **collection_stats,
+        "collections": collection_manager.get_stats(),
+        "embedding_cache": embedding_service.get_cache_stats(),
+        "embedding_engine": embedding_service.get_engine_stats(),
+        "ingestion_queue": ingestion_queue.get_stats(),
+        "summaries": summary_service.get_stats(),
         "llm_configured": settings.is_llm_configured,
         "llm_provider": settings.LLM_PROVIDER,
+        "llm_scheduler": llm_service.get_scheduler_stats(),
+        "translation": llm_service.get_translation_stats(),
+        "reranker": reranker.get_stats() if settings.RERANK_ENABLED else None,
+        "stages": tracer.get_stats(),
         "chunk_size": settings.CHUNK_SIZE,
         "chunk_overlap": settings.CHUNK_OVERLAP,
         "top_k_results": settings.TOP_K_RESULTS,
@@ -275,21 +979,90 @@ async def get_system_stats():
         "uptime_seconds": round(time.time() - startup_time, 2)
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Per-stage latency histograms in the Prometheus text exposition format"""
+    return PlainTextResponse(tracer.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/documents")
+async def list_documents(collection_id: str = DEFAULT_COLLECTION):
+    """List a collection's ingested documents with their chunk counts"""
+    async with open_collection(collection_id) as collection:
+        documents = await run_in_threadpool(collection.store.list_documents)
+    return {
+        "collection_id": collection_id,
+        "total_documents": len(documents),
+        "documents": [
+            {"document_id": document_id, "chunks": chunks}
+            for document_id, chunks in documents.items()
+        ]
+    }
+
+@app.get("/documents/{document_id}/summary", response_model=SummaryResponse)
+async def get_document_summary(document_id: str, collection_id: str = DEFAULT_COLLECTION):
+    """Fetch a document's summary; status is pending until the background generation finishes"""
+    result = summary_service.get(collection_id, document_id)
+    if result["status"] == "missing":
+        raise HTTPException(404, f"No summary for document: {document_id}")
+    return result
+
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str, collection_id: str = DEFAULT_COLLECTION):
+    """Remove a single document's chunks from a collection"""
+    async with open_collection(collection_id) as collection:
+        if not collection.store.has_document(document_id):
+            raise HTTPException(404, f"Document not found: {document_id}")
+        try:
+            removed = await run_in_threadpool(collection.store.delete_document, document_id)
+            collection.url_state.remove_document(document_id)
+            summary_service.remove_document(collection.id, document_id)
+            return {"message": "Document deleted successfully", "document_id": document_id, "chunks_removed": removed}
+        except Exception as e:
+            raise HTTPException(500, f"Failed to delete document: {str(e)}")
+
 @app.delete("/clear")
-async def clear_database():
-    """Clear all documents and analytics (use with caution)"""
+async def clear_database(collection_id: str = DEFAULT_COLLECTION):
+    """Clear all documents of a collection, and analytics (use with caution)"""
+    async with open_collection(collection_id) as collection:
+        try:
+            summary_service.remove_collection(collection.id)
+            await run_in_threadpool(collection.store.clear_store)
+            collection.url_state.clear()
+            analytics_service.clear_analytics()
+            return {"message": "Database and analytics cleared successfully"}
+        except Exception as e:
+            raise HTTPException(500, f"Failed to clear database: {str(e)}")
+
+@app.get("/collections")
+async def list_collections():
+    """List collections; open ones include their index, cache and memory figures"""
+    open_stats = collection_manager.get_open_stats()
+    return {
+        "collections": [
+            open_stats.get(collection_id, {"collection_id": collection_id, "open": False})
+            for collection_id in collection_manager.list_collections()
+        ],
+        "manager": collection_manager.get_stats()
+    }
+
+@app.delete("/collections/{collection_id}")
+async def delete_collection(collection_id: str):
+    """Delete a collection and all of its files (the default collection is only emptied)"""
     try:
-        vector_store_service.clear_store()
-        analytics_service.clear_analytics()
-        return {"message": "Database and analytics cleared successfully"}
-    except Exception as e:
-        raise HTTPException(500, f"Failed to clear database: {str(e)}")
+        await run_in_threadpool(collection_manager.delete, collection_id)
+        summary_service.remove_collection(collection_id)
+        return {"message": "Collection deleted successfully", "collection_id": collection_id}
+    except KeyError:
+        raise HTTPException(404, f"Collection not found: {collection_id}")
+    except ValueError as e:
+        raise HTTPException(409, str(e))
 
 @app.get("/export")
 async def export_analytics():
-    """Export all analytics data"""
+    """Export all analytics data, streamed from the event log"""
     try:
-        return analytics_service.export_analytics()
+        export = await run_in_threadpool(analytics_service.export_analytics)
+        return StreamingResponse(export, media_type="application/json")
     except Exception as e:
         raise HTTPException(500, f"Failed to export analytics: {str(e)}")
 
@@ -7,6 +7,22 @@ class QueryRequest(BaseModel):
     mode: Optional[str] = "human"
     language: Optional[str] = "en"
     short_answer: Optional[bool] = False
+    collection_id: str = "default"
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    include_timings: bool = False
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    mode: Optional[str] = "human"
+    language: Optional[str] = "en"
+    short_answer: Optional[bool] = False
+    include_followups: bool = False
+    collection_id: str = "default"
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    concurrency: Optional[int] = None
+    include_timings: bool = False
 
 class UploadResponse(BaseModel):
     status: str
@@ -14,6 +30,60 @@ class UploadResponse(BaseModel):
     document_id: Optional[str] = None
     chunks_created: Optional[int] = None
     summary: Optional[str] = None
+    job_id: Optional[str] = None
+    collection_id: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None
+
+class SummaryResponse(BaseModel):
+    document_id: str
+    collection_id: str = "default"
+    status: str
+    summary: Optional[str] = None
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    stage: str
+    progress: float
+    chunks_created: int
+    document_id: str
+    collection_id: str
+    source: str
+    error: Optional[str] = None
+    result: Optional[UploadResponse] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class CrawlRequest(BaseModel):
+    url: str
+    max_pages: Optional[int] = None
+    max_depth: Optional[int] = None
+    use_sitemap: bool = True
+    collection_id: str = "default"
+
+class CrawlResponse(BaseModel):
+    status: str
+    message: str
+    pages_ingested: int
+    pages_skipped: int
+    pages_unchanged: int = 0
+    chunks_created: int
+    document_ids: List[str] = []
+
+class RefreshRequest(BaseModel):
+    urls: Optional[List[str]] = None
+    collection_id: str = "default"
+
+class RefreshResponse(BaseModel):
+    status: str
+    checked: int
+    unchanged: int
+    updated: int
+    removed: int
+    failed: int
+    chunks_created: int
+    processing_time_ms: Optional[int] = None
 
 class Source(BaseModel):
     document: str
@@ -27,7 +97,9 @@ class QueryResponse(BaseModel):
     language: str = "en"
     processing_time_ms: Optional[int] = None
     confidence_score: Optional[float] = None
+    prompt_tokens: Optional[int] = None
     followup_questions: Optional[List[str]] = None
+    timings: Optional[Dict[str, float]] = None
 
 class HealthResponse(BaseModel):
     status: str
@@ -43,8 +115,17 @@ class AnalyticsEntry(BaseModel):
     data: Dict[str, Any]
     session_id: Optional[str] = None
 
+class AnalyticsWindow(BaseModel):
+    queries: int = 0
+    uploads: int = 0
+    errors: int = 0
+    latency_percentiles: Dict[str, Optional[float]] = {}
+
 class AnalyticsResponse(BaseModel):
     total_queries: int
     total_uploads: int
+    total_errors: int = 0
     most_asked_topics: List[str]
-    recent_activity: List[AnalyticsEntry]
\ No newline at end of file
+    recent_activity: List[AnalyticsEntry]
+    latency_percentiles: Dict[str, Optional[float]] = {}
+    windows: Dict[str, AnalyticsWindow] = {}
\ No newline at end of file
@@ -1,18 +1,143 @@
 import json
 import os
+import math
+import time
+import atexit
+import bisect
+import threading
+from collections import Counter, deque
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from collections import Counter
-from models import AnalyticsEntry, AnalyticsResponse
+from typing import List, Dict, Any, Optional, Iterator
+from models import AnalyticsEntry, AnalyticsResponse, AnalyticsWindow
 from config import settings
+try:
+    import fcntl
+except ImportError:  # Windows: appends are still single writes, just not cross-process locked
+    fcntl = None
+TOPIC_STOPWORDS = {'what', 'how', 'why', 'when', 'where', 'which', 'this', 'that', 'with', 'from', 'they', 'have', 'been', 'were', 'said', 'each', 'their'}
+# Latency bucket upper bounds in ms, ~10% apart from 1ms to ~3 minutes
+LATENCY_BUCKETS = [round(1.1 ** i, 1) for i in range(0, 128)]
+WINDOWS = {"last_hour": 3600, "last_day": 86400}
+class AnalyticsAggregates:
+    """Running analytics totals, updated per event so reads are O(1).
+
+    Besides lifetime counters and the topic counter, events are bucketed by
+    minute for the last day so hourly and daily views (including latency
+    percentiles) only sum a bounded number of buckets.
+    """
+    def __init__(self):
+        self.total_queries = 0
+        self.total_uploads = 0
+        self.total_errors = 0
+        self.topic_counter = Counter()
+        self.latency_histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.recent_activity = deque(maxlen=20)
+        self.minute_buckets = deque()
+    def add(self, entry: AnalyticsEntry):
+        if entry.type == 'query':
+            self.total_queries += 1
+            question = entry.data.get('question', '')
+            if question:
+                self.topic_counter.update(word.lower() for word in question.split()
+                                          if len(word) > 3 and word.lower() not in TOPIC_STOPWORDS)
+        elif entry.type == 'upload':
+            self.total_uploads += 1
+        elif entry.type == 'error':
+            self.total_errors += 1
+        latency_bucket = None
+        if entry.type == 'query' and entry.data.get('processing_time_ms') is not None:
+            latency_bucket = bisect.bisect_left(LATENCY_BUCKETS, entry.data['processing_time_ms'])
+            self.latency_histogram[latency_bucket] += 1
+        self.recent_activity.append(entry)
+        self._add_to_minute(entry, latency_bucket)
+    def percentiles(self, histogram: List[int]) -> Dict[str, Optional[float]]:
+        total = sum(histogram)
+        result = {}
+        for name, quantile in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            if not total:
+                result[name] = None
+                continue
+            target = math.ceil(quantile * total)
+            cumulative = 0
+            for index, count in enumerate(histogram):
+                cumulative += count
+                if cumulative >= target:
+                    result[name] = LATENCY_BUCKETS[min(index, len(LATENCY_BUCKETS) - 1)]
+                    break
+        return result
+    def window(self, seconds: int, now: float) -> AnalyticsWindow:
+        cutoff = int(now // 60) - seconds // 60
+        counts = Counter()
+        histogram = [0] * len(self.latency_histogram)
+        for minute, bucket_counts, bucket_latencies in self.minute_buckets:
+            if minute <= cutoff:
+                continue
+            counts.update(bucket_counts)
+            for index, count in bucket_latencies.items():
+                histogram[index] += count
+        return AnalyticsWindow(
+            queries=counts['query'],
+            uploads=counts['upload'],
+            errors=counts['error'],
+            latency_percentiles=self.percentiles(histogram)
+        )
+    def _add_to_minute(self, entry: AnalyticsEntry, latency_bucket: Optional[int]):
+        minute = int(entry.timestamp.timestamp() // 60)
+        if not self.minute_buckets or self.minute_buckets[-1][0] < minute:
+            self.minute_buckets.append((minute, Counter(), Counter()))
+        elif self.minute_buckets[-1][0] > minute:
+            # Out-of-order (older) event, e.g. from a legacy import; too old to matter for windows
+            return
+        _, bucket_counts, bucket_latencies = self.minute_buckets[-1]
+        bucket_counts[entry.type] += 1
+        if latency_bucket is not None:
+            bucket_latencies[latency_bucket] += 1
+        oldest_kept = minute - max(WINDOWS.values()) // 60
+        while self.minute_buckets and self.minute_buckets[0][0] <= oldest_kept:
+            self.minute_buckets.popleft()
 class AnalyticsService:
+    """Append-only JSON Lines event log.
+
+    log_interaction only appends to an in-memory buffer; a background
+    thread writes buffered events in one append every
+    ANALYTICS_FLUSH_INTERVAL_SECONDS (or sooner once ANALYTICS_FLUSH_BATCH
+    events are waiting). The log rotates to .1, .2, ... once it grows past
+    ANALYTICS_MAX_FILE_MB, keeping ANALYTICS_BACKUP_COUNT old files.
+
+    Summaries come from AnalyticsAggregates, rebuilt from the log once at
+    startup and then updated as events are logged. With several workers
+    each process only sees events logged since its own startup.
+    """
     def __init__(self):
         self.analytics_file = settings.ANALYTICS_FILE
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffer_lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._aggregates_lock = threading.Lock()
         self._ensure_analytics_file()
+        self._rebuild_aggregates()
+        self._flusher = threading.Thread(target=self._flush_loop, name="analytics-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
     def _ensure_analytics_file(self):
-        """Ensure analytics file exists"""
-        if not os.path.exists(self.analytics_file):
-            self._save_analytics([])
+        """Ensure analytics file exists, importing a legacy JSON array log once"""
+        directory = os.path.dirname(self.analytics_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.analytics_file):
+            return
+        legacy_file = os.path.splitext(self.analytics_file)[0] + ".json"
+        entries = []
+        if legacy_file != self.analytics_file and os.path.exists(legacy_file):
+            try:
+                with open(legacy_file, 'r') as f:
+                    entries = json.load(f)
+                print(f"📊 Imported {len(entries)} entries from {legacy_file}")
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ Could not import legacy analytics file: {e}")
+        self._append_lines(entries)
     def log_interaction(self, interaction_type: str, data: Dict[str, Any], session_id: Optional[str] = None):
         """Log user interaction"""
         try:
@@ -22,43 +147,31 @@ class AnalyticsService:
                 data=data,
                 session_id=session_id
             )
-            analytics = self._load_analytics()
-            analytics.append(entry.dict())
-            if len(analytics) > 1000:
-                analytics = analytics[-1000:]
-            self._save_analytics(analytics)
-            print(f"📊 Logged {interaction_type} interaction")
         except Exception as e:
             print(f"❌ Error logging interaction: {e}")
+            return
+        with self._aggregates_lock:
+            self.aggregates.add(entry)
+        with self._buffer_lock:
+            self._buffer.append(entry.dict())
+            should_flush = len(self._buffer) >= settings.ANALYTICS_FLUSH_BATCH
+        if should_flush:
+            self._wakeup.set()
     def get_analytics(self) -> AnalyticsResponse:
         """Get analytics summary"""
         try:
-            analytics = self._load_analytics()
-            queries = [entry for entry in analytics if entry.get('type') == 'query']
-            uploads = [entry for entry in analytics if entry.get('type') == 'upload']
-            topics = []
-            for query in queries:
-                question = query.get('data', {}).get('question', '')
-                if question:
-                    words = [word.lower() for word in question.split() 
-                            if len(word) > 3 and word.lower() not in ['what', 'how', 'why', 'when', 'where', 'which', 'this', 'that', 'with', 'from', 'they', 'have', 'been', 'were', 'said', 'each', 'their']]
-                    topics.extend(words)
-            topic_counter = Counter(topics)
-            most_asked_topics = [topic for topic, count in topic_counter.most_common(10)]
-            recent_entries = []
-            for entry_dict in analytics[-20:]:
-                try:
-                    entry = AnalyticsEntry(**entry_dict)
-                    recent_entries.append(entry)
-                except Exception as e:
-                    print(f"⚠️ Error parsing analytics entry: {e}")
-                    continue
-            return AnalyticsResponse(
-                total_queries=len(queries),
-                total_uploads=len(uploads),
-                most_asked_topics=most_asked_topics,
-                recent_activity=recent_entries
-            )
+            now = time.time()
+            with self._aggregates_lock:
+                aggregates = self.aggregates
+                return AnalyticsResponse(
+                    total_queries=aggregates.total_queries,
+                    total_uploads=aggregates.total_uploads,
+                    total_errors=aggregates.total_errors,
+                    most_asked_topics=[topic for topic, count in aggregates.topic_counter.most_common(10)],
+                    recent_activity=list(aggregates.recent_activity),
+                    latency_percentiles=aggregates.percentiles(aggregates.latency_histogram),
+                    windows={name: aggregates.window(seconds, now) for name, seconds in WINDOWS.items()}
+                )
         except Exception as e:
             print(f"❌ Error getting analytics: {e}")
             return AnalyticsResponse(
@@ -67,6 +180,16 @@ class AnalyticsService:
                 most_asked_topics=[],
                 recent_activity=[]
             )
+    def _rebuild_aggregates(self):
+        """Replay the event log once to seed the running aggregates"""
+        aggregates = AnalyticsAggregates()
+        for entry_dict in self._iter_entries():
+            try:
+                aggregates.add(AnalyticsEntry(**entry_dict))
+            except Exception as e:
+                print(f"⚠️ Error parsing analytics entry: {e}")
+        with self._aggregates_lock:
+            self.aggregates = aggregates
     def log_upload(self, filename: str, file_size: int, chunks_created: int, session_id: Optional[str] = None):
         """Log document upload"""
         self.log_interaction(
@@ -79,8 +202,9 @@ class AnalyticsService:
             },
             session_id
         )
-    def log_query(self, question: str, answer_length: int, confidence_score: float, 
-                  processing_time_ms: int, language: str = "en", session_id: Optional[str] = None):
+    def log_query(self, question: str, answer_length: int, confidence_score: float,
+                  processing_time_ms: int, language: str = "en", session_id: Optional[str] = None,
+                  prompt_tokens: Optional[int] = None):
         """Log user query"""
         self.log_interaction(
             "query",
@@ -89,12 +213,13 @@ class AnalyticsService:
                 "answer_length": answer_length,
                 "confidence_score": confidence_score,
                 "processing_time_ms": processing_time_ms,
+                "prompt_tokens": prompt_tokens,
                 "language": language,
                 "success": True
             },
             session_id
         )
-    def log_error(self, error_type: str, error_message: str, context: Dict[str, Any] = None, 
+    def log_error(self, error_type: str, error_message: str, context: Dict[str, Any] = None,
                   session_id: Optional[str] = None):
         """Log error occurrence"""
         self.log_interaction(
@@ -107,39 +232,118 @@ class AnalyticsService:
             },
             session_id
         )
-    def _load_analytics(self) -> List[Dict[str, Any]]:
-        """Load analytics from file"""
-        try:
-            with open(self.analytics_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-    def _save_analytics(self, analytics: List[Dict[str, Any]]):
-        """Save analytics to file"""
-        try:
-            os.makedirs(os.path.dirname(self.analytics_file), exist_ok=True)
-            with open(self.analytics_file, 'w') as f:
-                json.dump(analytics, f, indent=2, default=str)
-        except Exception as e:
-            print(f"❌ Error saving analytics: {e}")
+    def flush(self):
+        """Write buffered events to the log"""
+        with self._buffer_lock:
+            entries, self._buffer = self._buffer, []
+        if entries:
+            self._append_lines(entries)
+            print(f"📊 Flushed {len(entries)} analytics events")
+    def close(self):
+        """Stop the background flusher and write anything still buffered"""
+        if not self._stopped:
+            self._stopped = True
+            self._wakeup.set()
+            self._flusher.join(timeout=5)
+        self.flush()
+    def _flush_loop(self):
+        while not self._stopped:
+            self._wakeup.wait(settings.ANALYTICS_FLUSH_INTERVAL_SECONDS)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Error flushing analytics: {e}")
+    def _append_lines(self, entries: List[Dict[str, Any]]):
+        """Append events as JSON lines in a single write, rotating if the log is too big"""
+        payload = "".join(json.dumps(entry, default=str) + "\n" for entry in entries)
+        with self._file_lock:
+            with open(self.analytics_file, 'a') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.write(payload)
+                    f.flush()
+                    size = f.tell()
+                finally:
+                    if fcntl:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+            if size > settings.ANALYTICS_MAX_FILE_MB * 1024 * 1024:
+                self._rotate()
+    def _rotate(self):
+        backup_count = settings.ANALYTICS_BACKUP_COUNT
+        oldest = f"{self.analytics_file}.{backup_count}"
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for index in range(backup_count - 1, 0, -1):
+            source = f"{self.analytics_file}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.analytics_file}.{index + 1}")
+        if backup_count > 0:
+            os.replace(self.analytics_file, f"{self.analytics_file}.1")
+        else:
+            os.remove(self.analytics_file)
+        open(self.analytics_file, 'a').close()
+        print(f"🔄 Rotated analytics log {self.analytics_file}")
+    def _log_files(self) -> List[str]:
+        """Rotated files oldest first, then the live log"""
+        files = [f"{self.analytics_file}.{index}" for index in range(settings.ANALYTICS_BACKUP_COUNT, 0, -1)]
+        files.append(self.analytics_file)
+        return [path for path in files if os.path.exists(path)]
+    def _iter_entries(self) -> Iterator[Dict[str, Any]]:
+        """Stream events from the log files without loading them all"""
+        for path in self._log_files():
+            try:
+                with open(path, 'r') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            # A partially written last line from a crashed worker
+                            continue
+            except FileNotFoundError:
+                continue
     def clear_analytics(self):
         """Clear all analytics data"""
         try:
-            self._save_analytics([])
+            with self._buffer_lock:
+                self._buffer = []
+            with self._aggregates_lock:
+                self.aggregates = AnalyticsAggregates()
+            with self._file_lock:
+                for path in self._log_files():
+                    os.remove(path)
+                open(self.analytics_file, 'a').close()
             print("🗑️ Analytics data cleared")
         except Exception as e:
             print(f"❌ Error clearing analytics: {e}")
-    def export_analytics(self) -> Dict[str, Any]:
-        """Export all analytics data"""
+    def export_analytics(self) -> Iterator[str]:
+        """Export all analytics data as a streamed JSON document.
+
+        The log is flushed and the summary computed before this returns, so
+        those failures surface to the caller; only the raw events are read
+        lazily as the result is iterated.
+        """
+        self.flush()
+        summary = self.get_analytics()
+        header = json.dumps({
+            "export_timestamp": datetime.now().isoformat(),
+            "summary": summary.dict()
+        }, default=str)[:-1]
+        return self._stream_export(header)
+    def _stream_export(self, header: str) -> Iterator[str]:
+        yield header
+        yield ', "raw_data": ['
+        separator = ""
         try:
-            analytics = self._load_analytics()
-            summary = self.get_analytics()
-            return {
-                "export_timestamp": datetime.now().isoformat(),
-                "summary": summary.dict(),
-                "raw_data": analytics
-            }
+            for entry in self._iter_entries():
+                yield separator + json.dumps(entry, default=str)
+                separator = ", "
         except Exception as e:
-            print(f"❌ Error exporting analytics: {e}")
-            return {}
+            # The response has already started, so the stream can only be cut short
+            print(f"❌ Error streaming analytics export: {e}")
+            raise
+        yield "]}"
 analytics_service = AnalyticsService()
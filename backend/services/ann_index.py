@@ -0,0 +1,109 @@
+import math
+from typing import Optional, Dict, Any
+import numpy as np
+import faiss
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+# Read with IO_FLAG_MMAP, only IVF inverted lists are mapped; an HNSW graph is read fully into memory
+MAPPED_INDEX_TYPES = ("ivf_flat", "ivf_pq")
+MIN_POINTS_PER_CENTROID = 39
+PQ_MIN_TRAINING_POINTS = 256 * MIN_POINTS_PER_CENTROID
+def choose_index_type(configured: str, count: int, auto_threshold: int) -> str:
+    """Resolve "auto" by corpus size and fall back to flat when there is too little data to train.
+
+    "auto" picks IVF-Flat for large corpora because its lists stay memory-mapped,
+    so open cost and per-process memory do not grow with the corpus.
+    """
+    if configured == "auto":
+        configured = "ivf_flat" if count >= auto_threshold else "flat"
+    if configured not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type: {configured}")
+    if configured in ("ivf_flat", "ivf_pq") and count < 4 * MIN_POINTS_PER_CENTROID:
+        return "flat"
+    if configured == "ivf_pq" and count < PQ_MIN_TRAINING_POINTS:
+        return "ivf_flat"
+    return configured
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+def default_nlist(count: int) -> int:
+    return max(1, min(int(4 * math.sqrt(count)), count // MIN_POINTS_PER_CENTROID))
+def build_index(
+    vectors: np.ndarray,
+    index_type: str,
+    metric: int = faiss.METRIC_L2,
+    nlist: int = 0,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+    pq_m: int = 16,
+    pq_nbits: int = 8,
+    max_training_points: int = 256
+) -> faiss.Index:
+    """Build and fill an index of the given type; IVF variants are trained on a sample first"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dim) if metric == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, metric)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        nlist = nlist or default_nlist(count)
+        quantizer = faiss.IndexFlatIP(dim) if metric == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dim)
+        if index_type == "ivf_pq":
+            pq_m = _largest_divisor(dim, pq_m)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_nbits, metric)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        sample_size = min(count, nlist * max_training_points)
+        if index_type == "ivf_pq":
+            sample_size = max(sample_size, min(count, PQ_MIN_TRAINING_POINTS))
+        sample = vectors[np.random.default_rng(0).choice(count, sample_size, replace=False)] if sample_size < count else vectors
+        index.train(sample)
+    index.add(vectors)
+    return index
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """All stored vectors in label order (approximate for PQ)"""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Per-query search parameters, leaving the index's defaults untouched"""
+    index_type = index_type_of(index)
+    if index_type in ("ivf_flat", "ivf_pq") and nprobe:
+        return faiss.SearchParametersIVF(nprobe=min(nprobe, index.nlist))
+    if index_type == "hnsw" and ef_search:
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    return None
+def configure_defaults(index: faiss.Index, nprobe: int, ef_search: int):
+    index_type = index_type_of(index)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        index.nprobe = min(nprobe, index.nlist)
+    elif index_type == "hnsw":
+        index.hnsw.efSearch = ef_search
+def describe(index: Optional[faiss.Index]) -> Dict[str, Any]:
+    if index is None:
+        return {"type": None, "vectors": 0}
+    index_type = index_type_of(index)
+    info: Dict[str, Any] = {
+        "type": index_type,
+        "vectors": index.ntotal,
+        "dimension": index.d,
+        "memory_mapped": index_type in MAPPED_INDEX_TYPES
+    }
+    if isinstance(index, faiss.IndexIVF):
+        info.update(nlist=index.nlist, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        info.update(ef_search=index.hnsw.efSearch)
+    return info
+def _largest_divisor(dim: int, upper: int) -> int:
+    for m in range(min(upper, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
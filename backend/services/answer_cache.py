@@ -0,0 +1,109 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any
+import numpy as np
+from models import QueryResponse
+class AnswerCache:
+    """Semantic cache of query responses.
+
+    Entries are matched by cosine similarity of the question embedding,
+    restricted to the same (mode, language, short_answer) key, and expire
+    after a TTL. The least recently used entry is dropped when full. Every
+    entry is tied to the vector store's corpus version, so any change to
+    the corpus empties the cache. Answers cached without follow-up
+    questions (batch runs) are only served to lookups that do not need them.
+    """
+    def __init__(self, similarity_threshold: float = 0.95, ttl_seconds: int = 3600, max_entries: int = 1000):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._corpus_version: Optional[int] = None
+        self._lock = threading.Lock()
+    def lookup(
+        self,
+        embedding: List[float],
+        mode: str,
+        language: str,
+        short_answer: bool,
+        corpus_version: int,
+        require_followups: bool = False
+    ) -> Optional[QueryResponse]:
+        """Return a cached response for a sufficiently similar question, if any"""
+        key = (mode, language, bool(short_answer))
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._check_version(corpus_version)
+            best_id, best_score = None, self.similarity_threshold
+            expired = []
+            for entry_id, entry in self._entries.items():
+                if now - entry["created_at"] > self.ttl_seconds:
+                    expired.append(entry_id)
+                    continue
+                if entry["key"] != key:
+                    continue
+                if require_followups and entry["response"].followup_questions is None:
+                    continue
+                score = float(np.dot(vector, entry["vector"]))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            for entry_id in expired:
+                del self._entries[entry_id]
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id]["response"].copy(deep=True)
+    def store(
+        self,
+        embedding: List[float],
+        mode: str,
+        language: str,
+        short_answer: bool,
+        corpus_version: int,
+        response: QueryResponse
+    ):
+        with self._lock:
+            if self._corpus_version is not None and corpus_version < self._corpus_version:
+                # The corpus changed while this answer was being generated
+                return
+            self._check_version(corpus_version)
+            self._entries[self._next_id] = {
+                "key": (mode, language, bool(short_answer)),
+                "vector": self._normalize(embedding),
+                "response": response.copy(deep=True),
+                "created_at": time.time()
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations
+        }
+    def _check_version(self, corpus_version: int):
+        if self._corpus_version != corpus_version:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+            self._corpus_version = corpus_version
+    def _normalize(self, embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,170 @@
+import json
+import sqlite3
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from langchain.schema import Document
+# Rows of a document still being ingested are stored under a staged id until it is complete
+STAGED_PREFIX = "staged:"
+class ChunkStore:
+    """Chunk text and metadata in SQLite, keyed by the chunk's row (position)
+    in the vector file.
+
+    Nothing is loaded up front: search hits are fetched by position, and
+    document listings are answered from an index on document_id. Deleted
+    chunks keep their row (flagged) until compaction renumbers the table,
+    so positions stay aligned with the vector and BM25 files in between.
+    The meta table holds small store-wide values as JSON, including a
+    revision bumped by every change, so other processes sharing the
+    store can tell cheaply whether they need to catch up.
+    """
+    FILE_NAME = "chunks.sqlite"
+    def __init__(self, db_path: str):
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (position INTEGER PRIMARY KEY, document_id TEXT NOT NULL, "
+            "text TEXT NOT NULL, metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_live_document ON chunks (document_id) WHERE deleted = 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_deleted ON chunks (position) WHERE deleted = 1")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('live_count', '0')")
+        self._db.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('revision', '0')")
+        self._db.commit()
+    def get_meta(self) -> Dict[str, Any]:
+        return {name: json.loads(value) for name, value in self._db.execute("SELECT name, value FROM meta")}
+    def set_meta(self, **values):
+        """Set meta values, all or none"""
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                [(name, json.dumps(value)) for name, value in values.items()]
+            )
+            self._db.commit()
+        except Exception:
+            self._db.rollback()
+            raise
+    def get_state(self) -> Tuple[int, int]:
+        """(generation, revision): changes when chunks are compacted, added or deleted"""
+        values = dict(self._db.execute("SELECT name, value FROM meta WHERE name IN ('generation', 'revision')"))
+        return int(values.get("generation", 0)), int(values.get("revision", 0))
+    def next_position(self) -> int:
+        return self._db.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM chunks").fetchone()[0]
+    def live_count(self) -> int:
+        return int(self._db.execute("SELECT value FROM meta WHERE name = 'live_count'").fetchone()[0])
+    def add(self, start: int, document_id: str, documents: List[Document]):
+        self._db.executemany(
+            "INSERT INTO chunks (position, document_id, text, metadata) VALUES (?, ?, ?, ?)",
+            [
+                (start + i, document_id, doc.page_content, json.dumps(doc.metadata))
+                for i, doc in enumerate(documents)
+            ]
+        )
+        self._record_change(len(documents))
+        self._db.commit()
+    def get(self, positions: List[int], generation: Optional[int] = None) -> Optional[Dict[int, Document]]:
+        """Fetch chunks by position.
+
+        With generation, the rows are read in one snapshot that is still at
+        that generation; None means the positions were renumbered since.
+        """
+        found: Dict[int, Document] = {}
+        self._db.execute("BEGIN")
+        try:
+            if generation is not None and self.get_state()[0] != generation:
+                return None
+            for i in range(0, len(positions), 500):
+                batch = [int(position) for position in positions[i:i + 500]]
+                placeholders = ",".join("?" * len(batch))
+                for position, text, metadata in self._db.execute(
+                    f"SELECT position, text, metadata FROM chunks WHERE position IN ({placeholders})", batch
+                ):
+                    found[position] = Document(page_content=text, metadata=json.loads(metadata))
+        finally:
+            self._db.commit()
+        return found
+    def has_document(self, document_id: str) -> bool:
+        row = self._db.execute("SELECT 1 FROM chunks WHERE document_id = ? AND deleted = 0 LIMIT 1", (document_id,)).fetchone()
+        return row is not None
+    def document_counts(self) -> Dict[str, int]:
+        return dict(self._db.execute(
+            "SELECT document_id, COUNT(*) FROM chunks WHERE deleted = 0 AND document_id NOT LIKE ? GROUP BY document_id",
+            (STAGED_PREFIX + "%",)
+        ))
+    def delete_document(self, document_id: str) -> List[int]:
+        """Flag a document's chunks deleted and return their positions"""
+        positions = [
+            position for (position,) in
+            self._db.execute("SELECT position FROM chunks WHERE document_id = ? AND deleted = 0", (document_id,))
+        ]
+        self._db.execute("UPDATE chunks SET deleted = 1 WHERE document_id = ? AND deleted = 0", (document_id,))
+        self._record_change(-len(positions))
+        self._db.commit()
+        return positions
+    def publish_staged(self, staged_id: str, document_id: str, replace_all: bool = False) -> List[int]:
+        """Give staged chunks their document id, flagging the document's previous chunks
+        (or every other chunk, with replace_all) deleted in the same transaction.
+        Returns the positions flagged."""
+        condition = "document_id != ?" if replace_all else "document_id = ?"
+        target = staged_id if replace_all else document_id
+        positions = [
+            position for (position,) in
+            self._db.execute(f"SELECT position FROM chunks WHERE {condition} AND deleted = 0", (target,))
+        ]
+        try:
+            self._db.execute(f"UPDATE chunks SET deleted = 1 WHERE {condition} AND deleted = 0", (target,))
+            self._db.execute("UPDATE chunks SET document_id = ? WHERE document_id = ? AND deleted = 0", (document_id, staged_id))
+            self._record_change(-len(positions))
+            self._db.commit()
+        except Exception:
+            self._db.rollback()
+            raise
+        return positions
+    def deleted_positions(self) -> List[int]:
+        return [position for (position,) in self._db.execute("SELECT position FROM chunks WHERE deleted = 1")]
+    def live_positions(self) -> np.ndarray:
+        rows = self._db.execute("SELECT position FROM chunks WHERE deleted = 0 ORDER BY position").fetchall()
+        return np.array([position for (position,) in rows], dtype=np.int64)
+    def iter_texts(self, start: int = 0, batch_size: int = 1000) -> Iterator[List[Tuple[int, str, bool]]]:
+        """(position, text, deleted) rows from start onwards, in batches"""
+        cursor = self._db.execute(
+            "SELECT position, text, deleted FROM chunks WHERE position >= ? ORDER BY position", (start,)
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [(position, text, bool(deleted)) for position, text, deleted in rows]
+    def renumber(self, **meta):
+        """Drop deleted rows and close the gaps, in one transaction with the new meta values"""
+        assignments = "".join(
+            f"INSERT OR REPLACE INTO meta (name, value) VALUES ({_quote(name)}, {_quote(json.dumps(value))});"
+            for name, value in meta.items()
+        )
+        self._db.commit()
+        try:
+            self._db.executescript(
+                "BEGIN;"
+                "CREATE TABLE chunks_renumbered (position INTEGER PRIMARY KEY, document_id TEXT NOT NULL, "
+                "text TEXT NOT NULL, metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0);"
+                "INSERT INTO chunks_renumbered (position, document_id, text, metadata) "
+                "SELECT ROW_NUMBER() OVER (ORDER BY position) - 1, document_id, text, metadata FROM chunks WHERE deleted = 0;"
+                "DROP TABLE chunks;"
+                "ALTER TABLE chunks_renumbered RENAME TO chunks;"
+                "CREATE INDEX chunks_live_document ON chunks (document_id) WHERE deleted = 0;"
+                "CREATE INDEX chunks_deleted ON chunks (position) WHERE deleted = 1;"
+                + assignments +
+                "COMMIT;"
+            )
+        except Exception:
+            # executescript leaves a failed script's transaction open
+            if self._db.in_transaction:
+                self._db.rollback()
+            raise
+    def close(self):
+        self._db.close()
+    def _record_change(self, live_delta: int):
+        self._db.execute("UPDATE meta SET value = CAST(value AS INTEGER) + ? WHERE name = 'live_count'", (live_delta,))
+        self._db.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE name = 'revision'")
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
@@ -0,0 +1,161 @@
+import os
+import re
+import time
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+from config import settings
+from services.embeddings import embedding_service
+from services.vector_store import VectorStoreService
+from services.url_state import UrlStateStore
+from services.answer_cache import AnswerCache
+DEFAULT_COLLECTION = "default"
+COLLECTION_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_\-]{0,63}$")
+class Collection:
+    """One tenant's corpus: its vector store, URL fetch state and answer cache"""
+    def __init__(self, collection_id: str, store_path: str, url_state_path: str):
+        self.id = collection_id
+        self.store = VectorStoreService(store_path, embedding_service.embeddings)
+        self.url_state = UrlStateStore(url_state_path)
+        self.answer_cache = AnswerCache(
+            similarity_threshold=settings.ANSWER_CACHE_SIMILARITY,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES
+        )
+        self.active = 0
+        self.last_used = time.time()
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "collection_id": self.id,
+            "total_documents": self.store.get_document_count(),
+            "vector_store_status": self.store.get_status(),
+            "vector_index": self.store.get_index_stats(),
+            "answer_cache": self.answer_cache.get_stats(),
+            "memory_mb": round(self.store.get_memory_estimate() / 2**20, 2),
+            "active_requests": self.active
+        }
+    def close(self):
+        self.store.close()
+        self.url_state.close()
+class CollectionManager:
+    """Named collections, opened on first use and closed again when idle.
+
+    Each collection has its own directory under root holding its vector
+    store and URL state ("default" keeps the original top-level paths), and
+    its own answer cache. Collections in use are pinned by acquire() /
+    release(); when the open collections' estimated memory exceeds the
+    budget, or more than max_open are open, the least recently used idle
+    ones are closed. Opening a store only maps its files, so bringing an
+    evicted collection back is cheap.
+    """
+    def __init__(self, root: str, memory_budget_mb: int = 1024, max_open: int = 64):
+        self.root = root
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.max_open = max_open
+        self.opened = 0
+        self.evicted = 0
+        self._open: "OrderedDict[str, Collection]" = OrderedDict()
+        self._lock = threading.Lock()
+    def validate_id(self, collection_id: str) -> str:
+        if not COLLECTION_ID_PATTERN.match(collection_id or ""):
+            raise ValueError("Collection id must be 1-64 letters, digits, '-' or '_', starting with a letter or digit")
+        return collection_id
+    def exists(self, collection_id: str) -> bool:
+        return collection_id == DEFAULT_COLLECTION or collection_id in self._open or os.path.isdir(self._path(collection_id))
+    def acquire(self, collection_id: str, create: bool = False) -> Collection:
+        """Open (or reuse) a collection and pin it until release().
+
+        Raises KeyError for an unknown collection unless create is set.
+        """
+        self.validate_id(collection_id)
+        with self._lock:
+            collection = self._open.get(collection_id)
+            if collection is None:
+                if not create and not self.exists(collection_id):
+                    raise KeyError(collection_id)
+                collection = self._load(collection_id)
+            self._open.move_to_end(collection_id)
+            collection.active += 1
+            collection.last_used = time.time()
+            self._evict()
+            return collection
+    def release(self, collection: Collection):
+        with self._lock:
+            collection.active -= 1
+            collection.last_used = time.time()
+            self._evict()
+    def list_collections(self) -> List[str]:
+        names = {DEFAULT_COLLECTION, *self._open}
+        if os.path.isdir(self.root):
+            names.update(name for name in os.listdir(self.root) if os.path.isdir(self._path(name)))
+        return sorted(names)
+    def delete(self, collection_id: str):
+        """Close a collection and delete its files; the default collection is only emptied"""
+        collection = self.acquire(collection_id)
+        with self._lock:
+            if collection.active > 1:
+                collection.active -= 1
+                raise ValueError(f"Collection {collection_id} is in use")
+            collection.store.clear_store()
+            collection.url_state.clear()
+            collection.answer_cache.invalidate()
+            collection.active -= 1
+            if collection_id != DEFAULT_COLLECTION:
+                self._open.pop(collection_id)
+                collection.close()
+                shutil.rmtree(self._path(collection_id), ignore_errors=True)
+        print(f"🗑️ Deleted collection {collection_id}")
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            memory = sum(collection.store.get_memory_estimate() for collection in self._open.values())
+            return {
+                "collections": len(self.list_collections()),
+                "open": list(self._open),
+                "memory_mb": round(memory / 2**20, 2),
+                "memory_budget_mb": round(self.memory_budget / 2**20, 2),
+                "max_open": self.max_open,
+                "opened": self.opened,
+                "evicted": self.evicted
+            }
+    def get_open_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {collection_id: {**collection.get_stats(), "open": True} for collection_id, collection in self._open.items()}
+    def close(self):
+        with self._lock:
+            for collection in self._open.values():
+                collection.close()
+            self._open.clear()
+    def _path(self, collection_id: str) -> str:
+        return os.path.join(self.root, collection_id)
+    def _load(self, collection_id: str) -> Collection:
+        if collection_id == DEFAULT_COLLECTION:
+            collection = Collection(collection_id, settings.VECTOR_STORE_PATH, settings.URL_STATE_PATH)
+        else:
+            path = self._path(collection_id)
+            os.makedirs(path, exist_ok=True)
+            collection = Collection(collection_id, os.path.join(path, "vector_db"), os.path.join(path, "url_state.sqlite"))
+        self._open[collection_id] = collection
+        self.opened += 1
+        print(f"📂 Opened collection {collection_id} ({len(self._open)} open)")
+        return collection
+    def _evict(self):
+        """Close least recently used idle collections while over the count or memory budget"""
+        sizes = {collection_id: collection.store.get_memory_estimate() for collection_id, collection in self._open.items()}
+        total = sum(sizes.values())
+        for collection_id in list(self._open):
+            if len(self._open) <= self.max_open and total <= self.memory_budget:
+                break
+            collection = self._open[collection_id]
+            if collection.active:
+                continue
+            del self._open[collection_id]
+            collection.close()
+            total -= sizes[collection_id]
+            self.evicted += 1
+            print(f"💤 Closed idle collection {collection_id} ({round(sizes[collection_id] / 2**20, 1)} MB)")
+collection_manager = CollectionManager(
+    settings.COLLECTIONS_PATH,
+    memory_budget_mb=settings.COLLECTION_MEMORY_BUDGET_MB,
+    max_open=settings.MAX_OPEN_COLLECTIONS
+)
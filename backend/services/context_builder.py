@@ -0,0 +1,134 @@
+import re
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchain.schema import Document
+from config import settings
+from services.tokenizer import count_tokens, truncate_tokens
+from services.vector_store import SearchHit
+WHITESPACE = re.compile(r"\s+")
+MIN_OVERLAP_CHARS = 20
+class ContextBuilder:
+    """Turns search hits into the context passed to the LLM.
+
+    Search over-fetches; from those hits k chunks are picked by maximal
+    marginal relevance on their stored vectors, skipping exact repeats and
+    chunks whose vector is within duplicate_similarity of one already
+    picked. Picked chunks that are consecutive in the same document (and
+    page) are merged with the text the splitter repeated between them
+    removed, and chunks wholly contained in another are dropped. The rest
+    are packed best-first into max_tokens, truncating the first chunk that
+    only partly fits.
+    """
+    def __init__(
+        self,
+        max_tokens: int = 3000,
+        mmr_lambda: float = 0.7,
+        duplicate_similarity: float = 0.95,
+        max_overlap_chars: int = 200,
+        min_chunk_tokens: int = 50
+    ):
+        self.max_tokens = max_tokens
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_similarity = duplicate_similarity
+        self.max_overlap_chars = max_overlap_chars
+        self.min_chunk_tokens = min_chunk_tokens
+    def build(self, hits: List[SearchHit], k: Optional[int] = None) -> List[Tuple[Document, float]]:
+        """(Document, relevance score) pairs for the prompt, best first"""
+        if k is None:
+            k = settings.TOP_K_RESULTS
+        selected = self._select(hits, k)
+        blocks = self._drop_contained(self._merge_adjacent(selected))
+        context, tokens = self._pack(blocks)
+        if hits:
+            print(f"🧩 Context: {len(hits)} hits -> {len(selected)} selected -> {len(context)} blocks, {tokens} tokens")
+        return context
+    def _select(self, hits: List[SearchHit], k: int) -> List[SearchHit]:
+        """Maximal marginal relevance over the retrieval scores, with near-duplicates excluded"""
+        if not hits:
+            return []
+        vectors = np.stack([hit.vector for hit in hits]).astype(np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        relevance = np.array([hit.score for hit in hits], dtype=np.float32)
+        available = np.ones(len(hits), dtype=bool)
+        seen_texts = set()
+        for i, hit in enumerate(hits):
+            text = _normalize(hit.document.page_content)
+            if text in seen_texts:
+                available[i] = False
+            seen_texts.add(text)
+        max_similarity = np.zeros(len(hits), dtype=np.float32)
+        chosen: List[int] = []
+        while len(chosen) < k and available.any():
+            scores = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_similarity
+            best = int(np.argmax(np.where(available, scores, -np.inf)))
+            chosen.append(best)
+            available[best] = False
+            max_similarity = np.maximum(max_similarity, vectors @ vectors[best])
+            available &= max_similarity < self.duplicate_similarity
+        return [hits[i] for i in chosen]
+    def _merge_adjacent(self, selected: List[SearchHit]) -> List[Tuple[Document, float]]:
+        """Join chunks at consecutive positions of the same document and page, keeping selection order"""
+        groups: Dict[tuple, List[int]] = {}
+        for i, hit in enumerate(selected):
+            metadata = hit.document.metadata
+            groups.setdefault((metadata.get("document_id"), metadata.get("page")), []).append(i)
+        blocks: List[Tuple[int, Document, float]] = []
+        for members in groups.values():
+            members.sort(key=lambda i: selected[i].position)
+            run = [members[0]]
+            for i in members[1:] + [None]:
+                if i is not None and selected[i].position == selected[run[-1]].position + 1:
+                    run.append(i)
+                    continue
+                blocks.append(self._merge_run([selected[j] for j in run]) + (min(run),))
+                run = [i]
+        blocks.sort(key=lambda block: block[2])
+        return [(document, score) for document, score, _ in blocks]
+    def _merge_run(self, run: List[SearchHit]) -> Tuple[Document, float]:
+        if len(run) == 1:
+            return run[0].document, run[0].score
+        text = run[0].document.page_content
+        for hit in run[1:]:
+            text = self._join(text, hit.document.page_content)
+        metadata = dict(run[0].document.metadata, merged_chunks=len(run))
+        return Document(page_content=text, metadata=metadata), max(hit.score for hit in run)
+    def _join(self, first: str, second: str) -> str:
+        """Concatenate consecutive chunks without the text the splitter repeated at the start of the second"""
+        probe = second[:MIN_OVERLAP_CHARS]
+        if len(probe) == MIN_OVERLAP_CHARS:
+            index = first.find(probe, max(len(first) - self.max_overlap_chars, 0))
+            while index != -1:
+                if second.startswith(first[index:]):
+                    return first + second[len(first) - index:]
+                index = first.find(probe, index + 1)
+        return first + " " + second
+    def _drop_contained(self, blocks: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """Drop blocks whose text appears in full inside another block"""
+        texts = [_normalize(document.page_content) for document, _ in blocks]
+        kept = []
+        for i, block in enumerate(blocks):
+            if not any(j != i and texts[i] in texts[j] and (len(texts[i]) < len(texts[j]) or j < i) for j in range(len(blocks))):
+                kept.append(block)
+        return kept
+    def _pack(self, blocks: List[Tuple[Document, float]]) -> Tuple[List[Tuple[Document, float]], int]:
+        """Best-first blocks that fit the token budget, and the tokens they use"""
+        remaining = self.max_tokens
+        packed = []
+        for document, score in blocks:
+            tokens = count_tokens(document.page_content)
+            if tokens <= remaining:
+                packed.append((document, score))
+                remaining -= tokens
+            elif remaining >= self.min_chunk_tokens:
+                text = truncate_tokens(document.page_content, remaining)
+                packed.append((Document(page_content=text, metadata=dict(document.metadata, truncated=True)), score))
+                remaining = 0
+        return packed, self.max_tokens - remaining
+def _normalize(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip().lower()
+context_builder = ContextBuilder(
+    max_tokens=settings.CONTEXT_MAX_TOKENS,
+    mmr_lambda=settings.CONTEXT_MMR_LAMBDA,
+    duplicate_similarity=settings.CONTEXT_DUPLICATE_SIMILARITY,
+    max_overlap_chars=settings.CHUNK_OVERLAP
+)
@@ -0,0 +1,224 @@
+import asyncio
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Set
+from urllib.parse import urljoin, urldefrag, urlparse
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
+from config import settings
+SKIPPED_EXTENSIONS = (
+    '.pdf', '.zip', '.gz', '.tar', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico',
+    '.css', '.js', '.json', '.xml', '.mp3', '.mp4', '.avi', '.mov', '.woff', '.woff2', '.ttf', '.exe', '.dmg'
+)
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+@dataclass
+class CrawledPage:
+    url: str
+    content: bytes
+    content_type: str
+    depth: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+class WebCrawler:
+    """Breadth-first, same-site crawler over a pooled async HTTP client.
+
+    Starting from a seed URL (and optionally its sitemap.xml), pages are
+    fetched concurrently with a global and a per-host concurrency limit and
+    handed back as they arrive. Links are followed up to max_depth hops and
+    no more than max_pages pages are fetched. The page queue handed to the
+    consumer is bounded, so fetching pauses while ingestion catches up.
+    """
+    def __init__(
+        self,
+        concurrency: int = 8,
+        per_host_concurrency: int = 4,
+        timeout_seconds: float = 30,
+        max_retries: int = 3
+    ):
+        self.concurrency = concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+    async def crawl(
+        self,
+        seed_url: str,
+        max_pages: int = 50,
+        max_depth: int = 2,
+        use_sitemap: bool = True
+    ) -> AsyncIterator[CrawledPage]:
+        """Yield HTML/text pages of the seed's site as they are fetched"""
+        seed_url = self._normalize(seed_url)
+        site = self._site(seed_url)
+        frontier: asyncio.Queue = asyncio.Queue()
+        pages: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        seen: Set[str] = set()
+        def schedule(url: str, depth: int):
+            if len(seen) >= max_pages or url in seen or self._site(url) != site:
+                return
+            seen.add(url)
+            frontier.put_nowait((url, depth))
+        schedule(seed_url, 0)
+        if use_sitemap:
+            for url in await self._sitemap_urls(seed_url):
+                schedule(url, 1)
+        async def worker():
+            while True:
+                url, depth = await frontier.get()
+                try:
+                    async with self._host_limit(url):
+                        response = await self._fetch(url)
+                    if response is None:
+                        continue
+                    final_url = self._normalize(str(response.url))
+                    if final_url != url:
+                        # Redirected: skip targets already crawled or queued under their own URL
+                        if final_url in seen or self._site(final_url) != site:
+                            continue
+                        seen.add(final_url)
+                    content_type = response.headers.get('content-type', '').lower()
+                    if 'text/html' not in content_type and 'text/plain' not in content_type:
+                        continue
+                    if depth < max_depth and 'text/html' in content_type:
+                        links = await asyncio.to_thread(self._extract_links, final_url, response.content)
+                        for link in links:
+                            schedule(link, depth + 1)
+                    await pages.put(CrawledPage(
+                        final_url,
+                        response.content,
+                        content_type,
+                        depth,
+                        response.headers.get('etag'),
+                        response.headers.get('last-modified')
+                    ))
+                except Exception as e:
+                    print(f"⚠️ Crawl failed for {url}: {e}")
+                finally:
+                    frontier.task_done()
+        async def supervise():
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                await frontier.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            await pages.put(None)
+        supervisor = asyncio.create_task(supervise())
+        try:
+            while True:
+                page = await pages.get()
+                if page is None:
+                    break
+                yield page
+        finally:
+            supervisor.cancel()
+            await asyncio.gather(supervisor, return_exceptions=True)
+        print(f"🕸️ Crawl of {seed_url} finished: {len(seen)} URLs scheduled")
+    async def fetch_conditional(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ) -> Optional[httpx.Response]:
+        """GET with If-None-Match / If-Modified-Since; a 304 response means unchanged.
+
+        Returns None when the page could not be fetched at all; 404 and 410
+        responses are returned so callers can drop pages that are gone.
+        Shares the per-host concurrency limit with crawls.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        async with self._host_limit(url):
+            return await self._fetch(url, headers, passthrough={304, 404, 410})
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc.lower()
+        return self._host_limits.setdefault(host, asyncio.Semaphore(self.per_host_concurrency))
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout_seconds,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            )
+        return self._client
+    async def _fetch(self, url: str, headers: Optional[Dict[str, str]] = None, passthrough: Set[int] = frozenset()) -> Optional[httpx.Response]:
+        """GET with exponential backoff on transport errors, 429 and 5xx"""
+        client = self._get_client()
+        for attempt in range(self.max_retries):
+            try:
+                response = await client.get(url, headers=headers)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    if response.is_success or response.status_code in passthrough:
+                        return response
+                    print(f"⚠️ Skipping {url}: HTTP {response.status_code}")
+                    return None
+            except httpx.TransportError as e:
+                if attempt == self.max_retries - 1:
+                    print(f"⚠️ Skipping {url}: {e}")
+                    return None
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        print(f"⚠️ Skipping {url}: retries exhausted")
+        return None
+    async def _sitemap_urls(self, seed_url: str) -> List[str]:
+        """Page URLs listed in the site's sitemap.xml, following one level of sitemap index"""
+        parsed = urlparse(seed_url)
+        sitemaps = [f"{parsed.scheme}://{parsed.netloc}/sitemap.xml"]
+        urls: List[str] = []
+        for depth in range(2):
+            nested = []
+            for sitemap_url in sitemaps:
+                response = await self._fetch(sitemap_url)
+                if response is None:
+                    continue
+                try:
+                    root = ET.fromstring(response.content)
+                except ET.ParseError:
+                    continue
+                is_index = root.tag.endswith('sitemapindex')
+                for loc in root.iter():
+                    if loc.tag.endswith('loc') and loc.text:
+                        (nested if is_index else urls).append(self._normalize(loc.text.strip()))
+            if not nested or depth == 1:
+                break
+            sitemaps = nested
+        if urls:
+            print(f"🗺️ Found {len(urls)} URLs in sitemap")
+        return urls
+    def _extract_links(self, base_url: str, content: bytes) -> List[str]:
+        soup = BeautifulSoup(content, 'html.parser', parse_only=SoupStrainer('a', href=True))
+        links = []
+        for anchor in soup.find_all('a', href=True):
+            url = urljoin(base_url, anchor['href'])
+            if url.startswith(('http://', 'https://')) and not urlparse(url).path.lower().endswith(SKIPPED_EXTENSIONS):
+                links.append(self._normalize(url))
+        return links
+    def _normalize(self, url: str) -> str:
+        url, _ = urldefrag(url)
+        parsed = urlparse(url)
+        return parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower(), path=parsed.path or '/').geturl()
+    def _site(self, url: str) -> str:
+        """Scope key: the host without a leading www."""
+        host = urlparse(url).netloc.lower()
+        return host[4:] if host.startswith('www.') else host
+web_crawler = WebCrawler(
+    concurrency=settings.CRAWL_CONCURRENCY,
+    per_host_concurrency=settings.CRAWL_PER_HOST_CONCURRENCY,
+    timeout_seconds=settings.CRAWL_TIMEOUT_SECONDS,
+    max_retries=settings.CRAWL_MAX_RETRIES
+)
@@ -1,12 +1,73 @@
+import io
 import os
+import re
 import uuid
+import tempfile
+import threading
 import requests
-from typing import List, Optional
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Iterator, Tuple, Union, BinaryIO, Callable
 from PyPDF2 import PdfReader
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from config import settings
+from services.tracing import tracer
+def clean_text(text: str) -> str:
+    """Clean and normalize text content"""
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\[\]\"\'\/]', '', text)
+    return text.strip()
+def _extract_pages(pdf_reader: PdfReader, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract and clean pages [start, end), skipping near-empty ones"""
+    pages = []
+    for page_num in range(start, end):
+        text = pdf_reader.pages[page_num].extract_text()
+        if text.strip():
+            cleaned_text = clean_text(text)
+            if len(cleaned_text) > 50:
+                pages.append((page_num, cleaned_text))
+    return pages
+def _extract_page_range(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract and clean pages [start, end) in a worker process"""
+    with open(file_path, 'rb') as file:
+        return _extract_pages(PdfReader(file), start, end)
+class UploadSpool:
+    """Write-once buffer for an uploaded file.
+
+    Data stays in memory up to max_memory bytes and then moves to a named
+    temporary file in UPLOAD_DIR, which parallel PDF workers can open by
+    path. close() removes the file.
+    """
+    def __init__(self, max_memory: int, suffix: str = ""):
+        self.max_memory = max_memory
+        self.suffix = suffix
+        self.size = 0
+        self.path: Optional[str] = None
+        self._file: BinaryIO = io.BytesIO()
+    def write(self, data: bytes):
+        if self.path is None and self.size + len(data) > self.max_memory:
+            self._rollover()
+        self._file.write(data)
+        self.size += len(data)
+    def open(self) -> BinaryIO:
+        """Finish writing and return the stream positioned at the start"""
+        self._file.flush()
+        self._file.seek(0)
+        return self._file
+    def close(self):
+        self._file.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+    def _rollover(self):
+        handle = tempfile.NamedTemporaryFile(dir=settings.UPLOAD_DIR, suffix=self.suffix, delete=False)
+        handle.write(self._file.getvalue())
+        self._file = handle
+        self.path = handle.name
 class DocumentProcessor:
     def __init__(self):
         self.text_splitter = RecursiveCharacterTextSplitter(
@@ -16,62 +77,148 @@ class DocumentProcessor:
             separators=["\n\n", "\n", " ", ""]
         )
         os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-    def process_pdf(self, file_path: str) -> List[Document]:
+        self._pdf_pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._session = self._create_session()
+    def process_pdf(self, source: Union[str, bytes, BinaryIO], source_name: Optional[str] = None) -> List[Document]:
         """Extract text from PDF and create document chunks"""
+        return [chunk for batch in self.iter_pdf_chunks(source, source_name) for chunk in batch]
+    def iter_pdf_chunks(
+        self,
+        source: Union[str, bytes, BinaryIO],
+        source_name: Optional[str] = None,
+        batch_chunks: int = None,
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> Iterator[List[Document]]:
+        """Stream a PDF as batches of chunks, in page order.
+
+        source is a file path, the raw bytes or a binary stream. For paths,
+        page ranges of PDF_PAGES_PER_TASK pages are extracted on a process
+        pool with a bounded number of ranges in flight; in-memory sources and
+        short PDFs are extracted in-process. Each finished range is split
+        right away and yielded in batches of about batch_chunks, so neither
+        all pages nor all chunks are held at once. on_progress, if given, is
+        called with (pages_scanned, page_count) after every range.
+        """
+        batch_chunks = batch_chunks or settings.INGEST_BATCH_CHUNKS
         try:
-            documents = []
-            with open(file_path, 'rb') as file:
-                pdf_reader = PdfReader(file)
-                for page_num, page in enumerate(pdf_reader.pages):
-                    text = page.extract_text()
-                    if text.strip():
-                        cleaned_text = self._clean_text(text)
-                        if len(cleaned_text) > 50:
-                            doc = Document(
-                                page_content=cleaned_text,
-                                metadata={
-                                    "source": os.path.basename(file_path),
-                                    "page": page_num + 1,
-                                    "type": "pdf"
-                                }
-                            )
-                            documents.append(doc)
-            if not documents:
+            if isinstance(source, bytes):
+                source = io.BytesIO(source)
+            if isinstance(source, str):
+                source_name = source_name or os.path.basename(source)
+                with open(source, 'rb') as file:
+                    page_count = len(PdfReader(file).pages)
+            else:
+                pdf_reader = PdfReader(source)
+                page_count = len(pdf_reader.pages)
+            pages_per_task = settings.PDF_PAGES_PER_TASK
+            ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+            if not isinstance(source, str):
+                page_batches = (_extract_pages(pdf_reader, start, end) for start, end in ranges)
+            elif page_count < settings.PDF_PARALLEL_MIN_PAGES:
+                page_batches = (_extract_page_range(source, start, end) for start, end in ranges)
+            else:
+                page_batches = self._extract_ranges_parallel(source, ranges)
+            page_batches = tracer.timed_iter("parse", page_batches)
+            pages_read = 0
+            pages_scanned = 0
+            chunks_created = 0
+            pending: List[Document] = []
+            for (start, end), pages in zip(ranges, page_batches):
+                documents = [
+                    Document(
+                        page_content=text,
+                        metadata={
+                            "source": source_name or "document.pdf",
+                            "page": page_num + 1,
+                            "type": "pdf"
+                        }
+                    )
+                    for page_num, text in pages
+                ]
+                pages_read += len(documents)
+                pages_scanned += end - start
+                if on_progress:
+                    on_progress(pages_scanned, page_count)
+                with tracer.stage("split"):
+                    pending.extend(self.text_splitter.split_documents(documents))
+                while len(pending) >= batch_chunks:
+                    batch, pending = pending[:batch_chunks], pending[batch_chunks:]
+                    chunks_created += len(batch)
+                    yield batch
+            if pending:
+                chunks_created += len(pending)
+                yield pending
+            if not pages_read:
                 raise ValueError("No readable content found in PDF")
-            chunked_docs = self.text_splitter.split_documents(documents)
-            print(f"✅ Processed PDF: {len(documents)} pages -> {len(chunked_docs)} chunks")
-            return chunked_docs
+            print(f"✅ Processed PDF: {pages_read} pages -> {chunks_created} chunks")
         except Exception as e:
             print(f"❌ Error processing PDF: {e}")
             raise ValueError(f"Failed to process PDF: {str(e)}")
+    def _extract_ranges_parallel(self, file_path: str, ranges: List[Tuple[int, int]]) -> Iterator[List[Tuple[int, str]]]:
+        pool = self._get_pdf_pool()
+        max_in_flight = pool._max_workers * 2
+        pending = deque()
+        remaining = iter(ranges)
+        for start, end in remaining:
+            pending.append(pool.submit(_extract_page_range, file_path, start, end))
+            if len(pending) >= max_in_flight:
+                break
+        while pending:
+            yield pending.popleft().result()
+            next_range = next(remaining, None)
+            if next_range is not None:
+                pending.append(pool.submit(_extract_page_range, file_path, *next_range))
+    def _get_pdf_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pdf_pool is None:
+                workers = settings.PDF_WORKERS or os.cpu_count() or 1
+                self._pdf_pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                print(f"⚙️ PDF extraction pool started: {workers} workers")
+            return self._pdf_pool
+    def close(self):
+        """Shut down the PDF extraction pool"""
+        with self._pool_lock:
+            if self._pdf_pool is not None:
+                self._pdf_pool.shutdown(wait=False, cancel_futures=True)
+                self._pdf_pool = None
     def process_url(self, url: str) -> List[Document]:
         """Extract content from website URL"""
+        return self.process_html(url, self.fetch_url(url).content)
+    def fetch_url(self, url: str) -> requests.Response:
+        """Fetch an HTML/text page, mapping failures to readable errors"""
         try:
             if not self._is_valid_url(url):
                 raise ValueError("Invalid URL format. Please use a complete URL like https://example.com")
             print(f"🌐 Fetching content from: {url}")
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-            }
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = requests.get(url, headers=headers, timeout=30, allow_redirects=True)
-                    response.raise_for_status()
-                    break
-                except requests.RequestException as e:
-                    if attempt == max_retries - 1:
-                        raise e
-                    print(f"⚠️ Attempt {attempt + 1} failed, retrying...")
-            content_type = response.headers.get('content-type', '').lower()
-            if 'text/html' not in content_type and 'text/plain' not in content_type:
-                raise ValueError(f"Unsupported content type: {content_type}. Only HTML and text content is supported.")
-            soup = BeautifulSoup(response.content, 'html.parser')
+            with tracer.stage("fetch"):
+                response = self._session.get(url, timeout=30, allow_redirects=True)
+            response.raise_for_status()
+            self.check_web_content_type(response.headers.get('content-type', ''))
+            return response
+        except requests.exceptions.Timeout:
+            raise ValueError("Request timed out. The website took too long to respond.")
+        except requests.exceptions.ConnectionError:
+            raise ValueError("Connection failed. Please check the URL and your internet connection.")
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 403:
+                raise ValueError("Access forbidden. The website blocks automated requests.")
+            elif e.response.status_code == 404:
+                raise ValueError("Page not found. Please check the URL.")
+            else:
+                raise ValueError(f"HTTP error {e.response.status_code}: {e.response.reason}")
+        except requests.RequestException as e:
+            raise ValueError(f"Failed to fetch URL: {str(e)}")
+        except Exception as e:
+            print(f"❌ Error fetching URL: {e}")
+            raise ValueError(f"Failed to fetch URL: {str(e)}")
+    def process_html(self, url: str, content: bytes) -> List[Document]:
+        """Clean a fetched HTML/text page and split it into chunks"""
+        with tracer.stage("parse"):
+            soup = BeautifulSoup(content, 'html.parser')
             title = "Unknown"
             if soup.title and soup.title.string:
                 title = soup.title.string.strip()
@@ -86,42 +233,28 @@ class DocumentProcessor:
                 main_content = soup.find('body') or soup
             text = main_content.get_text(separator=' ', strip=True)
             cleaned_text = self._clean_text(text)
-            if len(cleaned_text) < 100:
-                raise ValueError(f"Insufficient content extracted from URL. Only {len(cleaned_text)} characters found. The page might be empty, require JavaScript, or be behind authentication.")
-            doc = Document(
-                page_content=cleaned_text,
-                metadata={
-                    "source": url,
-                    "title": title,
-                    "type": "web",
-                    "content_length": len(cleaned_text)
-                }
-            )
+        if len(cleaned_text) < 100:
+            raise ValueError(f"Insufficient content extracted from URL. Only {len(cleaned_text)} characters found. The page might be empty, require JavaScript, or be behind authentication.")
+        doc = Document(
+            page_content=cleaned_text,
+            metadata={
+                "source": url,
+                "title": title,
+                "type": "web",
+                "content_length": len(cleaned_text)
+            }
+        )
+        with tracer.stage("split"):
             chunked_docs = self.text_splitter.split_documents([doc])
-            print(f"✅ Processed URL: {len(cleaned_text)} chars -> {len(chunked_docs)} chunks from {url}")
-            return chunked_docs
-        except requests.exceptions.Timeout:
-            raise ValueError("Request timed out. The website took too long to respond.")
-        except requests.exceptions.ConnectionError:
-            raise ValueError("Connection failed. Please check the URL and your internet connection.")
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 403:
-                raise ValueError("Access forbidden. The website blocks automated requests.")
-            elif e.response.status_code == 404:
-                raise ValueError("Page not found. Please check the URL.")
-            else:
-                raise ValueError(f"HTTP error {e.response.status_code}: {e.response.reason}")
-        except requests.RequestException as e:
-            raise ValueError(f"Failed to fetch URL: {str(e)}")
-        except Exception as e:
-            print(f"❌ Error processing URL: {e}")
-            raise ValueError(f"Failed to process URL: {str(e)}")
+        print(f"✅ Processed URL: {len(cleaned_text)} chars -> {len(chunked_docs)} chunks from {url}")
+        return chunked_docs
     def process_text(self, text: str, source_name: str = "raw_text") -> List[Document]:
         """Process raw text input"""
         try:
             if not text or len(text.strip()) < 10:
                 raise ValueError("Text content is too short")
-            cleaned_text = self._clean_text(text)
+            with tracer.stage("parse"):
+                cleaned_text = self._clean_text(text)
             doc = Document(
                 page_content=cleaned_text,
                 metadata={
@@ -130,7 +263,8 @@ class DocumentProcessor:
                     "length": len(cleaned_text)
                 }
             )
-            chunked_docs = self.text_splitter.split_documents([doc])
+            with tracer.stage("split"):
+                chunked_docs = self.text_splitter.split_documents([doc])
             print(f"✅ Processed text: {len(cleaned_text)} chars -> {len(chunked_docs)} chunks")
             return chunked_docs
         except Exception as e:
@@ -138,33 +272,52 @@ class DocumentProcessor:
             raise ValueError(f"Failed to process text: {str(e)}")
     def _clean_text(self, text: str) -> str:
         """Clean and normalize text content"""
-        import re
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\[\]\"\'\/]', '', text)
-        return text.strip()
+        return clean_text(text)
+    def _create_session(self) -> requests.Session:
+        """Shared session: keep-alive connections and retries with exponential backoff"""
+        session = requests.Session()
+        session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': 'gzip, deflate',
+            'Upgrade-Insecure-Requests': '1',
+        })
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    def check_web_content_type(self, content_type: str):
+        """Reject fetched pages that are not HTML or plain text"""
+        content_type = content_type.lower()
+        if 'text/html' not in content_type and 'text/plain' not in content_type:
+            raise ValueError(f"Unsupported content type: {content_type}. Only HTML and text content is supported.")
     def _is_valid_url(self, url: str) -> bool:
         """Validate URL format"""
         from urllib.parse import urlparse
         try:
             if not url or not isinstance(url, str):
                 return False
-            if not url.startswith(('http://', 'https://')):
+            if '://' not in url:
                 url = 'https://' + url
             result = urlparse(url)
             return all([
                 result.scheme in ['http', 'https'],
-                result.netloc,
-                '.' in result.netloc
+                result.hostname
             ])
         except:
             return False
-    def save_uploaded_file(self, file_content: bytes, filename: str) -> str:
-        """Save uploaded file and return path"""
-        file_id = str(uuid.uuid4())
-        file_extension = os.path.splitext(filename)[1]
-        safe_filename = f"{file_id}_{filename}"
-        file_path = os.path.join(settings.UPLOAD_DIR, safe_filename)
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
-        return file_path
+    def open_upload_spool(self, filename: str) -> UploadSpool:
+        """Create a spool for an incoming upload"""
+        return UploadSpool(
+            settings.UPLOAD_SPOOL_MEMORY_MB * 1024 * 1024,
+            suffix=os.path.splitext(filename)[1]
+        )
 document_processor = DocumentProcessor()
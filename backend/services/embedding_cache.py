@@ -0,0 +1,158 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Dict, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+class CachedEmbeddings(Embeddings):
+    """Persistent content-hash cache in front of a document embedding model.
+
+    Vectors live in a memory-mapped float32 matrix (vectors.f32) and a
+    SQLite key index maps sha256(model + text) to a row of that matrix.
+    When the cache is full the least recently used rows are evicted and
+    reused; a batch with more new texts than the cache can hold caches as
+    many as fit. Hits update last_used in memory and are written with the
+    next store or every TOUCH_BATCH hits. Query embeddings are passed
+    straight through.
+    """
+    EVICT_FRACTION = 0.1
+    TOUCH_BATCH = 1000
+    def __init__(self, base: Embeddings, model_name: str, cache_dir: str, max_entries: int = 200000):
+        self.base = base
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        safe_name = re.sub(r'[^\w\-\.]', '_', model_name)
+        self.cache_dir = os.path.join(cache_dir, safe_name)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._vectors_path = os.path.join(self.cache_dir, "vectors.f32")
+        self._db = sqlite3.connect(os.path.join(self.cache_dir, "keys.sqlite"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER NOT NULL, last_used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.commit()
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        self._dim = meta.get("dim")
+        self._capacity = meta.get("capacity", 0)
+        self._next_slot = meta.get("next_slot", 0)
+        self._free_slots: List[int] = []
+        self._touched: Dict[str, float] = {}
+        self._vectors = None
+        if self._dim and self._capacity and os.path.exists(self._vectors_path):
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(self._capacity, self._dim))
+            if self._next_slot >= self.max_entries:
+                # Slots evicted but not yet reused before the last shutdown
+                used = {slot for (slot,) in self._db.execute("SELECT slot FROM entries")}
+                self._free_slots = [slot for slot in range(self._next_slot) if slot not in used]
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, computing only the ones not already cached"""
+        keys = [self._key(text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key, slot in self._lookup(set(keys)).items():
+                vectors[key] = np.array(self._vectors[slot])
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in vectors and key not in missing:
+                    missing[key] = text
+            self.hits += len(texts) - sum(1 for key in keys if key in missing)
+            self.misses += len(missing)
+        if missing:
+            computed = self.base.embed_documents(list(missing.values()))
+            new_vectors = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing.keys(), computed)}
+            with self._lock:
+                self._store(new_vectors)
+            vectors.update(new_vectors)
+        return [vectors[key].tolist() for key in keys]
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+    def _lookup(self, keys: set) -> Dict[str, int]:
+        """Return key -> slot for cached keys and note their last_used time"""
+        if self._vectors is None or not keys:
+            return {}
+        found: Dict[str, int] = {}
+        key_list = list(keys)
+        for i in range(0, len(key_list), 500):
+            batch = key_list[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", batch).fetchall()
+            found.update(rows)
+        now = time.time()
+        self._touched.update((key, now) for key in found)
+        if len(self._touched) >= self.TOUCH_BATCH:
+            self._write_touches()
+            self._db.commit()
+        return found
+    def _write_touches(self):
+        if self._touched:
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(used, key) for key, used in self._touched.items()])
+            self._touched = {}
+    def _store(self, vectors: Dict[str, np.ndarray]):
+        """Write new vectors into free slots, evicting LRU entries when full"""
+        if self._dim is None:
+            self._dim = len(next(iter(vectors.values())))
+        # Evictions order by last_used, so recent hits must be on disk first
+        self._write_touches()
+        rows = []
+        now = time.time()
+        for key, vector in vectors.items():
+            slot = self._allocate_slot()
+            if slot is None:
+                print(f"⚠️ Embedding cache full, not caching {len(vectors) - len(rows)} of {len(vectors)} new embeddings")
+                break
+            self._vectors[slot] = vector
+            rows.append((key, slot, now))
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._db.executemany("INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)", rows)
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+            [("dim", self._dim), ("capacity", self._capacity), ("next_slot", self._next_slot)]
+        )
+        self._db.commit()
+    def _allocate_slot(self) -> Optional[int]:
+        """A free slot, evicting LRU entries when full; None when every slot holds a vector of the current batch"""
+        if not self._free_slots and self._next_slot >= self.max_entries:
+            self._evict()
+        if self._free_slots:
+            return self._free_slots.pop()
+        if self._next_slot >= self.max_entries:
+            return None
+        if self._next_slot >= self._capacity:
+            self._grow(min(max(self._capacity * 2, 1024), self.max_entries))
+        slot = self._next_slot
+        self._next_slot += 1
+        return slot
+    def _grow(self, capacity: int):
+        """Extend the vectors file and remap it"""
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, 'ab') as f:
+            f.truncate(capacity * self._dim * 4)
+        self._capacity = capacity
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self._dim))
+    def _evict(self):
+        count = max(1, int(self.max_entries * self.EVICT_FRACTION))
+        rows = self._db.execute("SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (count,)).fetchall()
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+        self._free_slots.extend(slot for _, slot in rows)
+        print(f"♻️ Evicted {len(rows)} entries from embedding cache")
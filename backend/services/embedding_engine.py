@@ -0,0 +1,128 @@
+import os
+import time
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Iterator, Optional, Dict, Any
+import numpy as np
+from langchain_core.embeddings import Embeddings
+_worker_model = None
+def _init_worker(model_name: str, threads: int):
+    """Load one model copy per worker process, pinned to its share of the cores"""
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device='cpu')
+def _encode_batch(texts: List[str], batch_size: int, normalize: bool) -> np.ndarray:
+    return _worker_model.encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=normalize,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    ).astype(np.float32)
+class LocalEmbeddingEngine(Embeddings):
+    """Sentence-transformers embeddings fanned out over a process pool.
+
+    Chunks are split into batches of batch_size and encoded by worker
+    processes that each hold their own model copy; results are yielded back
+    in input order. Inputs that fit in a single batch, and all queries, are
+    encoded in-process to avoid the IPC round trip.
+    """
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 64,
+        workers: int = 0,
+        threads_per_worker: int = 0,
+        normalize: bool = True
+    ):
+        cpu_count = os.cpu_count() or 1
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers = workers or cpu_count
+        self.threads_per_worker = threads_per_worker or max(1, cpu_count // self.workers)
+        self.normalize = normalize
+        self.total_chunks = 0
+        self.total_seconds = 0.0
+        self.last_throughput = 0.0
+        self._model = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return np.concatenate(list(self.iter_embeddings(texts))).tolist()
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode_local([text])[0].tolist()
+    def iter_embeddings(self, texts: List[str]) -> Iterator[np.ndarray]:
+        """Yield one float32 array per batch, in input order"""
+        start_time = time.time()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1 or self.workers <= 1:
+            for batch in batches:
+                yield self._encode_local(batch)
+        else:
+            pool = self._get_pool()
+            # Keep every worker busy without queueing the whole corpus at once
+            max_in_flight = self.workers * 2
+            pending = deque()
+            remaining = iter(batches)
+            for batch in remaining:
+                pending.append(pool.submit(_encode_batch, batch, self.batch_size, self.normalize))
+                if len(pending) >= max_in_flight:
+                    break
+            while pending:
+                yield pending.popleft().result()
+                next_batch = next(remaining, None)
+                if next_batch is not None:
+                    pending.append(pool.submit(_encode_batch, next_batch, self.batch_size, self.normalize))
+        self._record(len(texts), time.time() - start_time)
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "batch_size": self.batch_size,
+            "chunks_embedded": self.total_chunks,
+            "last_chunks_per_sec": round(self.last_throughput, 1),
+            "avg_chunks_per_sec": round(self.total_chunks / self.total_seconds, 1) if self.total_seconds else 0.0
+        }
+    def close(self):
+        """Shut down the worker pool"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+    def _encode_local(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name, device='cpu')
+        return self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=self.normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32)
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: forking a process that already holds torch threads can deadlock
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.threads_per_worker)
+                )
+                print(f"⚙️ Embedding pool started: {self.workers} workers x {self.threads_per_worker} threads")
+            return self._pool
+    def _record(self, count: int, seconds: float):
+        self.total_chunks += count
+        self.total_seconds += seconds
+        self.last_throughput = count / seconds if seconds > 0 else 0.0
+        if count > self.batch_size:
+            print(f"⚡ Embedded {count} chunks in {seconds:.2f}s ({self.last_throughput:.0f} chunks/sec)")
@@ -0,0 +1,69 @@
+from typing import List, Optional
+from langchain_openai import OpenAIEmbeddings
+from config import settings
+from services.embedding_cache import CachedEmbeddings
+from services.embedding_engine import LocalEmbeddingEngine
+class EmbeddingService:
+    """The embedding model, shared by every collection.
+
+    One model (and, for local embeddings, one pool of worker processes) and
+    one content-hash cache serve all collections, so identical text is
+    embedded once no matter which collection it is uploaded to.
+    """
+    def __init__(self):
+        self.embeddings = None
+        self.embedding_cache: Optional[CachedEmbeddings] = None
+        self.embedding_engine: Optional[LocalEmbeddingEngine] = None
+        self._initialize_embeddings()
+    def _initialize_embeddings(self):
+        """Initialize embeddings based on LLM provider"""
+        if settings.LLM_PROVIDER == "openai" and settings.is_llm_configured:
+            model_name = "text-embedding-ada-002"
+            embeddings = OpenAIEmbeddings(
+                openai_api_key=settings.OPENAI_API_KEY,
+                model=model_name
+            )
+            print("✅ OpenAI embeddings initialized")
+        else:
+            model_name = "sentence-transformers/all-MiniLM-L6-v2"
+            self.embedding_engine = LocalEmbeddingEngine(
+                model_name,
+                batch_size=settings.EMBEDDING_BATCH_SIZE,
+                workers=settings.EMBEDDING_WORKERS,
+                threads_per_worker=settings.EMBEDDING_THREADS_PER_WORKER,
+                normalize=True
+            )
+            embeddings = self.embedding_engine
+            print(f"✅ Local embedding engine initialized ({self.embedding_engine.workers} workers, batch size {self.embedding_engine.batch_size})")
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = CachedEmbeddings(
+                embeddings,
+                model_name,
+                settings.EMBEDDING_CACHE_PATH,
+                max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+            )
+            embeddings = self.embedding_cache
+            print(f"✅ Embedding cache enabled at {settings.EMBEDDING_CACHE_PATH}")
+        self.embeddings = embeddings
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query once so it can be reused for caching and search"""
+        return self.embeddings.embed_query(query)
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed many queries in one batched call.
+
+        Goes straight to the model, like embed_query: one-off questions
+        would only churn the chunk embedding cache.
+        """
+        model = self.embedding_cache.base if self.embedding_cache else self.embeddings
+        return model.embed_documents(queries)
+    def get_cache_stats(self) -> Optional[dict]:
+        """Embedding cache hit/miss counters, if the cache is enabled"""
+        return self.embedding_cache.get_stats() if self.embedding_cache else None
+    def get_engine_stats(self) -> Optional[dict]:
+        """Local embedding throughput, if the local engine is in use"""
+        return self.embedding_engine.get_stats() if self.embedding_engine else None
+    def close(self):
+        """Release embedding worker processes"""
+        if self.embedding_engine:
+            self.embedding_engine.close()
+embedding_service = EmbeddingService()
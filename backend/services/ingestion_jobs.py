@@ -0,0 +1,130 @@
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from config import settings
+class IngestionJob:
+    """Status record of one queued upload"""
+    def __init__(self, source: str, document_id: str, collection_id: str):
+        self.id = str(uuid.uuid4())
+        self.source = source
+        self.document_id = document_id
+        self.collection_id = collection_id
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0.0
+        self.chunks_created = 0
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+    def update(self, stage: Optional[str] = None, progress: Optional[float] = None, chunks_created: Optional[int] = None):
+        """Called from the job (possibly on a worker thread) as it advances"""
+        if stage is not None:
+            self.stage = stage
+        if progress is not None:
+            self.progress = round(min(max(progress, 0.0), 1.0), 3)
+        if chunks_created is not None:
+            self.chunks_created = chunks_created
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "chunks_created": self.chunks_created,
+            "document_id": self.document_id,
+            "collection_id": self.collection_id,
+            "source": self.source,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+JobRunner = Callable[[IngestionJob], Awaitable[Dict[str, Any]]]
+class IngestionJobQueue:
+    """Bounded queue of ingestion jobs drained by a fixed set of workers.
+
+    submit() never waits: when max_queued jobs are already waiting it raises
+    asyncio.QueueFull, so a burst of uploads is turned away instead of
+    piling request bodies up in memory. Finished jobs are kept for status
+    lookups until the history limit pushes them out.
+    """
+    def __init__(self, workers: int = 2, max_queued: int = 16, history: int = 500):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.history = history
+        self.rejected = 0
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+    def submit(self, job: IngestionJob, runner: JobRunner) -> IngestionJob:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((job, runner))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise
+        self._jobs[job.id] = job
+        self._trim_history()
+        print(f"📥 Queued ingestion job {job.id} ({self._queue.qsize()} waiting)")
+        return job
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+    def list_jobs(self) -> List[IngestionJob]:
+        return list(self._jobs.values())
+    def get_stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "waiting": self._queue.qsize() if self._queue else 0,
+            "rejected": self.rejected,
+            "jobs": counts
+        }
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    async def _worker(self):
+        while True:
+            job, runner = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = await runner(job)
+                job.status = "completed"
+                job.update(stage="done", progress=1.0)
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "Cancelled during shutdown"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(getattr(e, "detail", e))
+                print(f"❌ Ingestion job {job.id} failed: {job.error}")
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+    def _trim_history(self):
+        while len(self._jobs) > self.history:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status in ("queued", "running"):
+                break
+            del self._jobs[oldest_id]
+ingestion_queue = IngestionJobQueue(
+    workers=settings.INGEST_WORKERS,
+    max_queued=settings.INGEST_QUEUE_SIZE,
+    history=settings.INGEST_JOB_HISTORY
+)
@@ -0,0 +1,56 @@
+import re
+from collections import Counter
+from typing import Optional
+WORD = re.compile(r"[^\W\d_]+", re.UNICODE)
+# Short, frequent words that are distinctive enough to tell the Latin-script languages apart
+STOPWORDS = {
+    "en": {"the", "and", "is", "are", "of", "to", "in", "that", "it", "with", "for", "this", "was", "be", "on", "as", "by", "or", "not", "which", "you", "can", "from", "have"},
+    "es": {"el", "los", "las", "del", "que", "es", "por", "para", "con", "una", "un", "se", "lo", "como", "más", "pero", "sus", "también", "está", "son", "y", "en", "muy", "cuando"},
+    "fr": {"le", "les", "des", "est", "et", "une", "un", "du", "que", "qui", "dans", "pour", "pas", "sur", "au", "avec", "ce", "cette", "sont", "ou", "mais", "aux", "il", "nous"},
+    "de": {"der", "die", "das", "und", "ist", "nicht", "ein", "eine", "zu", "den", "mit", "von", "sich", "auf", "für", "auch", "dem", "es", "sind", "wird", "werden", "oder", "wie", "bei"},
+    "it": {"il", "gli", "della", "che", "di", "è", "per", "con", "una", "un", "sono", "non", "del", "alla", "come", "più", "anche", "nel", "delle", "questo", "ma", "si", "lo", "ed"},
+    "pt": {"os", "as", "que", "é", "do", "da", "dos", "das", "não", "para", "com", "uma", "um", "em", "por", "mais", "como", "mas", "ao", "se", "são", "também", "está", "na"},
+}
+MIN_LETTERS = 20
+MIN_STOPWORDS = 3
+def detect_language(text: str) -> Optional[str]:
+    """Best-guess language code of text, or None when it is too short or too mixed to tell.
+
+    Covers English plus the languages answers can be requested in: the
+    script decides Russian, Japanese, Korean and Chinese, and counts of
+    common words decide between the Latin-script languages.
+    """
+    scripts = Counter()
+    for char in text:
+        if not char.isalpha():
+            continue
+        code = ord(char)
+        if 0x3040 <= code <= 0x30FF:
+            scripts["kana"] += 1
+        elif 0xAC00 <= code <= 0xD7AF or 0x1100 <= code <= 0x11FF:
+            scripts["ko"] += 1
+        elif 0x4E00 <= code <= 0x9FFF:
+            scripts["han"] += 1
+        elif 0x0400 <= code <= 0x04FF:
+            scripts["ru"] += 1
+        elif code < 0x0250:
+            scripts["latin"] += 1
+    letters = sum(scripts.values())
+    if letters < MIN_LETTERS:
+        return None
+    # A CJK character carries about a word, so a small share of them outweighs quoted Latin text
+    if scripts["kana"] and scripts["kana"] + scripts["han"] >= 0.1 * letters:
+        return "ja"
+    if scripts["ko"] >= 0.1 * letters:
+        return "ko"
+    if scripts["han"] >= 0.1 * letters:
+        return "zh"
+    if scripts["ru"] >= 0.5 * letters:
+        return "ru"
+    words = Counter(word.lower() for word in WORD.findall(text))
+    counts = {language: sum(words[word] for word in stopwords) for language, stopwords in STOPWORDS.items()}
+    ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    (best, best_count), (_, second_count) = ranked[0], ranked[1]
+    if best_count < MIN_STOPWORDS or best_count < 1.5 * second_count:
+        return None
+    return best
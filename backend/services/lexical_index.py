@@ -0,0 +1,188 @@
+import os
+import re
+import math
+from array import array
+from collections import Counter
+from typing import Dict, List, Tuple
+import numpy as np
+TOKEN_PATTERN = re.compile(r"\w+(?:[\-\.\/]\w+)*")
+TOKEN_SEPARATORS = re.compile(r"[\-\.\/]")
+MAX_TOKEN_LENGTH = 64
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens. Compound tokens such as product codes
+    ("ERR-404", "v1.2.3") are kept whole and also split into their parts."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()[:MAX_TOKEN_LENGTH]
+        tokens.append(token)
+        if TOKEN_SEPARATORS.search(token):
+            tokens.extend(part for part in TOKEN_SEPARATORS.split(token) if part)
+    return tokens
+class BM25Index:
+    """BM25 inverted index over chunk text, addressed by chunk position.
+
+    Chunks up to the last compaction form the base: flat CSR arrays saved
+    as .npy files and memory-mapped on open, with terms sorted so a lookup
+    is a binary search and nothing is parsed at startup. Chunks added
+    since then go to an in-memory delta whose per-term postings are two
+    parallel int32 arrays (positions and term frequencies). Deleted
+    positions are masked at query time until write() produces a new base
+    without them. A query costs time proportional to the postings of its
+    terms, not to the corpus size.
+    """
+    BASE_FILES = ("terms", "offsets", "postings", "frequencies", "lengths", "stats")
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.clear()
+    def clear(self):
+        self._terms = np.zeros(0, dtype=str)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._base_postings = np.zeros(0, dtype=np.int32)
+        self._base_frequencies = np.zeros(0, dtype=np.int32)
+        self._base_lengths = np.zeros(0, dtype=np.int32)
+        self._base_size = 0
+        self._lengths = array('i')
+        self._vocab: Dict[str, int] = {}
+        self._postings: List[array] = []
+        self._frequencies: List[array] = []
+        self._delta_postings = 0
+        self._deleted = set()
+        self._deleted_array = np.zeros(0, dtype=np.int32)
+        self._live_count = 0
+        self._total_length = 0
+    def __len__(self) -> int:
+        return self._live_count
+    def memory_estimate(self) -> int:
+        """Bytes of the mapped base arrays plus the in-memory delta"""
+        base = sum(values.nbytes for values in (
+            self._terms, self._offsets, self._base_postings, self._base_frequencies, self._base_lengths
+        ))
+        return base + 8 * self._delta_postings + 4 * len(self._lengths) + 64 * len(self._vocab)
+    def open(self, directory: str) -> bool:
+        """Map a base written by write(); returns False if there is none"""
+        if not os.path.exists(os.path.join(directory, "stats.npy")):
+            return False
+        self.clear()
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in self.BASE_FILES}
+        self._terms = arrays["terms"]
+        self._offsets = arrays["offsets"]
+        self._base_postings = arrays["postings"]
+        self._base_frequencies = arrays["frequencies"]
+        self._base_lengths = arrays["lengths"]
+        self._base_size = len(self._base_lengths)
+        self._live_count, self._total_length = (int(value) for value in arrays["stats"])
+        return True
+    def add(self, positions: List[int], texts: List[str]):
+        """Index new chunks; positions must continue on from the last one added"""
+        for position, text in zip(positions, texts):
+            if position != self._base_size + len(self._lengths):
+                raise ValueError(f"BM25 position {position} out of sequence")
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+            self._lengths.append(length)
+            self._live_count += 1
+            self._total_length += length
+            for term, frequency in counts.items():
+                term_id = self._vocab.get(term)
+                if term_id is None:
+                    term_id = self._vocab[term] = len(self._postings)
+                    self._postings.append(array('i'))
+                    self._frequencies.append(array('i'))
+                self._postings[term_id].append(position)
+                self._frequencies[term_id].append(frequency)
+            self._delta_postings += len(counts)
+    def delete(self, positions: List[int]):
+        for position in positions:
+            if position in self._deleted or position >= self._base_size + len(self._lengths):
+                continue
+            self._deleted.add(position)
+            self._live_count -= 1
+            self._total_length -= int(self._length_of(np.array([position]))[0])
+        self._deleted_array = np.fromiter(self._deleted, dtype=np.int32, count=len(self._deleted))
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top-k (position, BM25 score) pairs, best first"""
+        if not self._live_count:
+            return []
+        avg_length = self._total_length / self._live_count or 1.0
+        slot_parts, score_parts = [], []
+        for term in set(tokenize(query)):
+            slots, frequencies = self._term_postings(term)
+            if self._deleted and len(slots):
+                live = ~np.isin(slots, self._deleted_array)
+                slots, frequencies = slots[live], frequencies[live]
+            if not len(slots):
+                continue
+            df = len(slots)
+            idf = math.log(1 + (self._live_count - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._length_of(slots) / avg_length)
+            slot_parts.append(slots)
+            score_parts.append(idf * frequencies * (self.k1 + 1) / (frequencies + norm))
+        if not slot_parts:
+            return []
+        if len(slot_parts) == 1:
+            slots, scores = slot_parts[0], score_parts[0]
+        else:
+            slots, inverse = np.unique(np.concatenate(slot_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(slots[i]), float(scores[i])) for i in top]
+    def write(self, directory: str, keep: np.ndarray):
+        """Write a new base holding only the positions in keep (sorted), renumbered 0..len(keep)-1"""
+        total = self._base_size + len(self._lengths)
+        remap = np.full(total, -1, dtype=np.int32)
+        remap[keep] = np.arange(len(keep), dtype=np.int32)
+        all_lengths = np.concatenate([np.asarray(self._base_lengths), np.frombuffer(self._lengths, dtype=np.int32)])
+        terms, counts, posting_parts, frequency_parts = [], [], [], []
+        for term in sorted(set(self._terms.tolist()) | set(self._vocab)):
+            slots, frequencies = self._term_postings(term)
+            new_slots = remap[slots]
+            live = new_slots >= 0
+            if not live.any():
+                continue
+            terms.append(term)
+            counts.append(int(live.sum()))
+            posting_parts.append(new_slots[live])
+            frequency_parts.append(frequencies[live])
+        arrays = {
+            "terms": np.array(terms, dtype=str),
+            "offsets": np.concatenate([[0], np.cumsum(counts, dtype=np.int64)]).astype(np.int64),
+            "postings": np.concatenate(posting_parts or [np.zeros(0, dtype=np.int32)]).astype(np.int32),
+            "frequencies": np.concatenate(frequency_parts or [np.zeros(0, dtype=np.int32)]).astype(np.int32),
+            "lengths": all_lengths[keep].astype(np.int32),
+            "stats": np.array([len(keep), int(all_lengths[keep].sum())], dtype=np.int64)
+        }
+        os.makedirs(directory, exist_ok=True)
+        for name, values in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), values, allow_pickle=False)
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Base and delta postings of a term, concatenated"""
+        slot_parts, frequency_parts = [], []
+        if len(self._terms):
+            i = int(np.searchsorted(self._terms, term))
+            if i < len(self._terms) and self._terms[i] == term:
+                start, end = self._offsets[i], self._offsets[i + 1]
+                slot_parts.append(np.asarray(self._base_postings[start:end]))
+                frequency_parts.append(np.asarray(self._base_frequencies[start:end]))
+        term_id = self._vocab.get(term)
+        if term_id is not None:
+            slot_parts.append(np.frombuffer(self._postings[term_id], dtype=np.int32))
+            frequency_parts.append(np.frombuffer(self._frequencies[term_id], dtype=np.int32))
+        if not slot_parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        if len(slot_parts) == 1:
+            return slot_parts[0], frequency_parts[0]
+        return np.concatenate(slot_parts), np.concatenate(frequency_parts)
+    def _length_of(self, slots: np.ndarray) -> np.ndarray:
+        if not len(self._lengths):
+            return np.asarray(self._base_lengths[slots])
+        delta_lengths = np.frombuffer(self._lengths, dtype=np.int32)
+        in_base = slots < self._base_size
+        lengths = np.empty(len(slots), dtype=np.int32)
+        lengths[in_base] = self._base_lengths[slots[in_base]]
+        lengths[~in_base] = delta_lengths[slots[~in_base] - self._base_size]
+        return lengths
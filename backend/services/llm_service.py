@@ -1,166 +1,426 @@
+import re
 import time
-from typing import List, Tuple, Optional
-from openai import OpenAI
-from groq import Groq
+import asyncio
+from typing import List, Tuple, Optional, AsyncIterator, Dict, Any
+import openai
+import groq
+from openai import AsyncOpenAI
+from groq import AsyncGroq
 from langchain.schema import Document
 from config import settings
 from models import QueryResponse, Source
+from services.tokenizer import count_message_tokens
+from services.language_detector import detect_language
+from services.translation_cache import TranslationCache
+from services.tracing import tracer
+from services.provider_scheduler import (
+    ProviderScheduler, connection_pool, PRIORITY_ANSWER, PRIORITY_FOLLOWUP, PRIORITY_BACKGROUND
+)
+LANGUAGE_NAMES = {
+    "es": "Spanish", "fr": "French", "de": "German", "it": "Italian",
+    "pt": "Portuguese", "ru": "Russian", "ja": "Japanese", 
+    "ko": "Korean", "zh": "Chinese"
+}
+DEFAULT_FOLLOWUPS = [
+    "Can you explain this in more detail?",
+    "What are the key takeaways from this?",
+    "Are there any related topics?",
+    "What should I know next about this?"
+]
+FOLLOWUP_MARKER = "[[FOLLOWUPS]]"
+FOLLOWUP_MAX_TOKENS = 150
+FOLLOWUP_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+def _marker_prefix_length(text: str) -> int:
+    """Length of the longest suffix of text that could be the start of the follow-up marker"""
+    tail = text[-(len(FOLLOWUP_MARKER) - 1):].lower()
+    marker = FOLLOWUP_MARKER.lower()
+    for length in range(len(tail), 0, -1):
+        if marker.startswith(tail[-length:]):
+            return length
+    return 0
 class LLMService:
     def __init__(self):
         if not settings.is_llm_configured:
             raise ValueError(f"{settings.LLM_PROVIDER} API key not configured")
+        base_url = settings.LLM_BASE_URL or None
+        http_client = connection_pool(settings.LLM_MAX_CONNECTIONS, settings.LLM_TIMEOUT_SECONDS)
+        # Every call goes through the scheduler, which does the retrying, so the SDK's own retries are off
         if settings.LLM_PROVIDER == "openai":
-            self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+            self.async_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=base_url, max_retries=0, http_client=http_client)
             self.model = "gpt-3.5-turbo"
+            connection_errors = (openai.APIConnectionError,)
             print("✅ OpenAI LLM service initialized")
         elif settings.LLM_PROVIDER == "groq":
-            self.client = Groq(api_key=settings.GROQ_API_KEY)
+            self.async_client = AsyncGroq(api_key=settings.GROQ_API_KEY, base_url=base_url, max_retries=0, http_client=http_client)
             self.model = "llama-3.1-8b-instant"
+            connection_errors = (groq.APIConnectionError,)
             print("✅ Groq LLM service initialized")
         else:
             raise ValueError(f"Unsupported LLM provider: {settings.LLM_PROVIDER}")
-    def generate_answer(
+        self.scheduler = ProviderScheduler(
+            requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            max_retries=settings.LLM_MAX_RETRIES,
+            backoff_base_seconds=settings.LLM_BACKOFF_BASE_SECONDS,
+            backoff_max_seconds=settings.LLM_BACKOFF_MAX_SECONDS,
+            connection_errors=connection_errors
+        )
+        self.translation_cache = TranslationCache(settings.TRANSLATION_CACHE_MAX_ENTRIES)
+        self.translations = 0
+        self.translations_skipped = 0
+    async def agenerate_answer(
         self, 
         question: str, 
         context_docs: List[Tuple[Document, float]], 
         mode: str = "human",
         language: str = "en",
-        short_answer: bool = False
+        short_answer: bool = False,
+        include_followups: bool = False,
+        priority: int = PRIORITY_ANSWER
     ) -> QueryResponse:
-        """Generate answer using RAG pipeline"""
+        """Generate an answer using the RAG pipeline.
+
+        With FOLLOWUPS_IN_ANSWER, follow-ups are asked for in a trailing
+        section of the answer itself and split off, so a query costs one
+        completion; the separate follow-up call only runs when that section
+        is missing or unusable. Answers are generated in the requested
+        language and only translated when they came back in another one.
+        Translation and a fallback follow-up call both only depend on the
+        answer, so they run concurrently. priority
+        orders the answer call in the provider queue; follow-ups never go
+        ahead of answers.
+        """
         start_time = time.time()
+        followup_questions = None
         try:
             if not context_docs:
-                return QueryResponse(
-                    answer="I couldn't find relevant information in the uploaded documents to answer your question.",
-                    context="",
-                    sources=[],
-                    language=language,
-                    processing_time_ms=int((time.time() - start_time) * 1000),
-                    confidence_score=0.0
-                )
-            context_text = "\n\n".join([doc.page_content for doc, score in context_docs])
-            sources = [
-                Source(
-                    document=doc.metadata.get("source", "Unknown"),
-                    chunk=doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                    relevance_score=round(score, 3)
+                response = self._empty_response(language, start_time)
+                if include_followups:
+                    response.followup_questions = await self.agenerate_followup_questions(
+                        question, response.answer, priority=max(priority, PRIORITY_FOLLOWUP)
+                    )
+                return response
+            inline_followups = include_followups and settings.FOLLOWUPS_IN_ANSWER
+            with tracer.stage("prompt_build"):
+                context_text, sources = self._build_context(context_docs)
+                confidence_score = self._calculate_confidence(context_docs)
+                messages = self._build_answer_messages(question, context_text, mode, language, short_answer, inline_followups)
+            with tracer.stage("llm_answer"):
+                response = await self._acomplete(
+                    priority,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=self._answer_max_tokens(short_answer, inline_followups)
                 )
-                for doc, score in context_docs
-            ]
-            confidence_score = self._calculate_confidence(context_docs)
-            system_prompt = self._get_system_prompt(mode, language, short_answer)
-            user_prompt = f"""Context from uploaded documents:
-{context_text}
-Question: {question}
-Please provide a comprehensive answer based on the context above."""
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=1000 if short_answer else 2000
-            )
             answer = response.choices[0].message.content.strip()
-            if language != "en":
-                answer = self._translate_text(answer, language)
-            processing_time = int((time.time() - start_time) * 1000)
-            return QueryResponse(
-                answer=answer,
-                context=context_text[:500] + "..." if len(context_text) > 500 else context_text,
-                sources=sources,
-                language=language,
-                processing_time_ms=processing_time,
-                confidence_score=confidence_score
+            if inline_followups:
+                answer, followup_questions = self._split_followups(answer)
+            pending = {}
+            if self._needs_translation(answer, language):
+                pending["translation"] = self._atranslate_text(answer, language, priority)
+            if include_followups and followup_questions is None:
+                pending["followups"] = self.agenerate_followup_questions(question, answer, priority=max(priority, PRIORITY_FOLLOWUP))
+            results = dict(zip(pending, await asyncio.gather(*pending.values())))
+            answer = results.get("translation", answer)
+            followup_questions = results.get("followups", followup_questions)
+            result = self._build_response(
+                answer, context_text, sources, language, confidence_score, start_time, self._prompt_tokens(messages, response)
             )
+            result.followup_questions = followup_questions
+            return result
         except Exception as e:
             print(f"❌ Error generating answer: {e}")
-            processing_time = int((time.time() - start_time) * 1000)
-            return QueryResponse(
-                answer=f"I encountered an error while processing your question: {str(e)}",
-                context="",
-                sources=[],
-                language=language,
-                processing_time_ms=processing_time,
-                confidence_score=0.0
-            )
-    def generate_summary(self, documents: List[Document]) -> str:
-        """Generate summary of uploaded documents"""
+            result = self._error_response(e, language, start_time)
+            if include_followups:
+                result.followup_questions = list(DEFAULT_FOLLOWUPS)
+            return result
+    async def astream_answer(
+        self, 
+        question: str, 
+        context_docs: List[Tuple[Document, float]], 
+        mode: str = "human",
+        language: str = "en",
+        short_answer: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the RAG answer as events.
+
+        Yields a "sources" event before the completion starts, "token"
+        events as content deltas arrive from the provider, then trailing
+        "followups" and "done" events; a provider error ends the stream
+        with an "error" event instead. With FOLLOWUPS_IN_ANSWER the
+        follow-up section is held back from the token stream and sent as
+        the "followups" event. Non-English answers rely on the
+        system prompt's language instruction, since a post-hoc translation
+        would have to wait for the full answer.
+        """
+        start_time = time.time()
+        if not context_docs:
+            empty = self._empty_response(language, start_time)
+            yield {"event": "sources", "sources": [], "context": ""}
+            yield {"event": "token", "text": empty.answer}
+            yield {"event": "followups", "followup_questions": await self.agenerate_followup_questions(question, empty.answer)}
+            yield {"event": "done", "answer": empty.answer, "language": language, "confidence_score": 0.0, "processing_time_ms": int((time.time() - start_time) * 1000)}
+            return
+        inline_followups = settings.FOLLOWUPS_IN_ANSWER
+        with tracer.stage("prompt_build"):
+            context_text, sources = self._build_context(context_docs)
+            confidence_score = self._calculate_confidence(context_docs)
+            messages = self._build_answer_messages(question, context_text, mode, language, short_answer, inline_followups)
+        yield {
+            "event": "sources",
+            "sources": [source.dict() for source in sources],
+            "context": context_text[:500] + "..." if len(context_text) > 500 else context_text
+        }
+        text = ""
+        emitted = 0
+        marker_at = None
+        llm_start = time.perf_counter()
+        first_token = True
         try:
-            combined_text = "\n".join([
-                doc.page_content[:300] for doc in documents[:3]
-            ])
-            if len(combined_text) < 50:
-                return "Document processed successfully"
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that creates concise summaries of documents."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Please provide a brief summary (2-3 sentences) of this document:\n\n{combined_text}"
-                    }
-                ],
+            stream = await self._acomplete(
+                PRIORITY_ANSWER,
+                messages=messages,
                 temperature=0.3,
-                max_tokens=200
+                max_tokens=self._answer_max_tokens(short_answer, inline_followups),
+                stream=True
             )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token:
+                    tracer.observe("llm_first_token", time.perf_counter() - llm_start)
+                    first_token = False
+                text += delta
+                if not inline_followups:
+                    yield {"event": "token", "text": delta}
+                    continue
+                if marker_at is not None:
+                    continue
+                # Text before emitted is known not to contain the start of the follow-up marker
+                found = text.lower().find(FOLLOWUP_MARKER.lower(), emitted)
+                if found != -1:
+                    marker_at = found
+                    safe = found
+                else:
+                    safe = len(text) - _marker_prefix_length(text)
+                if safe > emitted:
+                    yield {"event": "token", "text": text[emitted:safe]}
+                    emitted = safe
+            if inline_followups and marker_at is None and emitted < len(text):
+                yield {"event": "token", "text": text[emitted:]}
+        except Exception as e:
+            print(f"❌ Error streaming answer: {e}")
+            tracer.observe("llm_answer", time.perf_counter() - llm_start)
+            # The answer is incomplete: no follow-ups for it, and nothing to cache
+            yield {"event": "error", "detail": f"I encountered an error while processing your question: {str(e)}"}
+            return
+        tracer.observe("llm_answer", time.perf_counter() - llm_start)
+        answer, followup_questions = self._split_followups(text) if marker_at is not None else (text.strip(), None)
+        if followup_questions is None:
+            followup_questions = await self.agenerate_followup_questions(question, answer) if answer else list(DEFAULT_FOLLOWUPS)
+        yield {"event": "followups", "followup_questions": followup_questions}
+        yield {
+            "event": "done",
+            "answer": answer,
+            "language": language,
+            "confidence_score": confidence_score,
+            "prompt_tokens": count_message_tokens(messages),
+            "processing_time_ms": int((time.time() - start_time) * 1000)
+        }
+    async def _acomplete(self, priority: int, **kwargs):
+        """chat.completions.create for this model, queued and retried by the provider scheduler"""
+        return await self.scheduler.call(self.async_client.chat.completions.create, priority, model=self.model, **kwargs)
+    def get_scheduler_stats(self) -> dict:
+        return self.scheduler.get_stats()
+    def get_translation_stats(self) -> dict:
+        return {
+            "translated": self.translations,
+            "skipped": self.translations_skipped,
+            "cache": self.translation_cache.get_stats()
+        }
+    async def aclose(self):
+        """Close the shared provider connection pool"""
+        await self.async_client.close()
+    def _build_context(self, context_docs: List[Tuple[Document, float]]) -> Tuple[str, List[Source]]:
+        """Join retrieved chunks into prompt context and source attributions"""
+        context_text = "\n\n".join([doc.page_content for doc, score in context_docs])
+        sources = [
+            Source(
+                document=doc.metadata.get("source", "Unknown"),
+                chunk=doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
+                relevance_score=round(score, 3)
+            )
+            for doc, score in context_docs
+        ]
+        return context_text, sources
+    def _build_answer_messages(
+        self,
+        question: str,
+        context_text: str,
+        mode: str,
+        language: str,
+        short_answer: bool,
+        include_followups: bool = False
+    ) -> List[dict]:
+        """Build chat messages for the answer completion"""
+        system_prompt = self._get_system_prompt(mode, language, short_answer, include_followups)
+        user_prompt = f"""Context from uploaded documents:
+{context_text}
+Question: {question}
+Please provide a comprehensive answer based on the context above."""
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    def _answer_max_tokens(self, short_answer: bool, include_followups: bool) -> int:
+        return (1000 if short_answer else 2000) + (FOLLOWUP_MAX_TOKENS if include_followups else 0)
+    def _split_followups(self, text: str, max_questions: int = 4) -> Tuple[str, Optional[List[str]]]:
+        """Separate the answer from its trailing follow-up section.
+
+        Returns None for the questions when there is no section or fewer
+        than two usable questions in it, so the caller can fall back to
+        the separate follow-up call.
+        """
+        found = text.lower().find(FOLLOWUP_MARKER.lower())
+        if found == -1:
+            return text.strip(), None
+        lines = [FOLLOWUP_BULLET.sub("", line).strip() for line in text[found + len(FOLLOWUP_MARKER):].split("\n")]
+        questions = [line for line in lines if len(line) > 10][:max_questions]
+        return text[:found].strip(), questions if len(questions) >= 2 else None
+    def _prompt_tokens(self, messages: List[dict], response) -> int:
+        """Prompt tokens as billed by the provider, or counted locally if it did not report usage"""
+        usage = getattr(response, "usage", None)
+        return getattr(usage, "prompt_tokens", None) or count_message_tokens(messages)
+    def _build_response(
+        self,
+        answer: str,
+        context_text: str,
+        sources: List[Source],
+        language: str,
+        confidence_score: float,
+        start_time: float,
+        prompt_tokens: Optional[int] = None
+    ) -> QueryResponse:
+        processing_time = int((time.time() - start_time) * 1000)
+        return QueryResponse(
+            answer=answer,
+            context=context_text[:500] + "..." if len(context_text) > 500 else context_text,
+            sources=sources,
+            language=language,
+            processing_time_ms=processing_time,
+            confidence_score=confidence_score,
+            prompt_tokens=prompt_tokens
+        )
+    def _empty_response(self, language: str, start_time: float) -> QueryResponse:
+        return QueryResponse(
+            answer="I couldn't find relevant information in the uploaded documents to answer your question.",
+            context="",
+            sources=[],
+            language=language,
+            processing_time_ms=int((time.time() - start_time) * 1000),
+            confidence_score=0.0
+        )
+    def _error_response(self, error: Exception, language: str, start_time: float) -> QueryResponse:
+        processing_time = int((time.time() - start_time) * 1000)
+        return QueryResponse(
+            answer=f"I encountered an error while processing your question: {str(error)}",
+            context="",
+            sources=[],
+            language=language,
+            processing_time_ms=processing_time,
+            confidence_score=0.0
+        )
+    async def agenerate_summary(self, documents: List[Document]) -> Optional[str]:
+        """Generate a summary of uploaded documents; returns None on failure so callers can retry later"""
+        messages = self._build_summary_messages(documents)
+        if messages is None:
+            return "Document processed successfully"
+        try:
+            with tracer.stage("summary"):
+                response = await self._acomplete(
+                    PRIORITY_BACKGROUND,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=200
+                )
             return response.choices[0].message.content.strip()
         except Exception as e:
             print(f"❌ Error generating summary: {e}")
-            return "Document processed and ready for questions"
-    def generate_followup_questions(self, question: str, answer: str, max_questions: int = 4) -> List[str]:
+            return None
+    def _build_summary_messages(self, documents: List[Document]) -> Optional[List[dict]]:
+        combined_text = "\n".join([
+            doc.page_content[:300] for doc in documents[:3]
+        ])
+        if len(combined_text) < 50:
+            return None
+        return [
+            {
+                "role": "system",
+                "content": "You are a helpful assistant that creates concise summaries of documents."
+            },
+            {
+                "role": "user",
+                "content": f"Please provide a brief summary (2-3 sentences) of this document:\n\n{combined_text}"
+            }
+        ]
+    async def agenerate_followup_questions(
+        self,
+        question: str,
+        answer: str,
+        max_questions: int = 4,
+        priority: int = PRIORITY_FOLLOWUP
+    ) -> List[str]:
         """Generate follow-up questions based on the original question and answer"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are an expert at generating relevant follow-up questions. 
-                        Based on the user's original question and the AI's answer, suggest related questions 
-                        that would naturally follow in a conversation.
-                        Focus on:
-                        - Deeper details about the same topic
-                        - Related aspects not covered in the answer
-                        - Practical applications or next steps
-                        - Clarifications or specific examples
-                        Return ONLY the questions, one per line, without numbers or bullets.
-                        Make questions specific and actionable."""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"""Original Question: {question}
-AI Answer: {answer[:500]}...
-Generate {max_questions} relevant follow-up questions that someone might naturally ask next:"""
-                    }
-                ],
-                temperature=0.4,
-                max_tokens=200
-            )
-            questions_text = response.choices[0].message.content.strip()
-            questions = [q.strip() for q in questions_text.split('\n') if q.strip()]
-            questions = [q for q in questions if len(q) > 10][:max_questions]
-            if len(questions) < 2:
-                questions.extend([
-                    "Can you provide more details about this?",
-                    "Are there any related topics I should know about?",
-                    "What are the practical implications of this?"
-                ])
-            return questions[:max_questions]
+            with tracer.stage("followups"):
+                response = await self._acomplete(
+                    priority,
+                    messages=self._build_followup_messages(question, answer, max_questions),
+                    temperature=0.4,
+                    max_tokens=200
+                )
+            return self._parse_followup_questions(response.choices[0].message.content, max_questions)
         except Exception as e:
             print(f"❌ Error generating follow-up questions: {e}")
-            return [
-                "Can you explain this in more detail?",
-                "What are the key takeaways from this?",
-                "Are there any related topics?",
-                "What should I know next about this?"
-            ]
-    def _get_system_prompt(self, mode: str, language: str, short_answer: bool) -> str:
+            return list(DEFAULT_FOLLOWUPS)
+    def _build_followup_messages(self, question: str, answer: str, max_questions: int) -> List[dict]:
+        return [
+            {
+                "role": "system",
+                "content": """You are an expert at generating relevant follow-up questions. 
+                Based on the user's original question and the AI's answer, suggest related questions 
+                that would naturally follow in a conversation.
+                Focus on:
+                - Deeper details about the same topic
+                - Related aspects not covered in the answer
+                - Practical applications or next steps
+                - Clarifications or specific examples
+                Return ONLY the questions, one per line, without numbers or bullets.
+                Make questions specific and actionable."""
+            },
+            {
+                "role": "user",
+                "content": f"""Original Question: {question}
+AI Answer: {answer[:500]}...
+Generate {max_questions} relevant follow-up questions that someone might naturally ask next:"""
+            }
+        ]
+    def _parse_followup_questions(self, questions_text: str, max_questions: int) -> List[str]:
+        questions_text = questions_text.strip()
+        questions = [q.strip() for q in questions_text.split('\n') if q.strip()]
+        questions = [q for q in questions if len(q) > 10][:max_questions]
+        if len(questions) < 2:
+            questions.extend([
+                "Can you provide more details about this?",
+                "Are there any related topics I should know about?",
+                "What are the practical implications of this?"
+            ])
+        return questions[:max_questions]
+    def _get_system_prompt(self, mode: str, language: str, short_answer: bool, include_followups: bool = False) -> str:
         """Get system prompt based on mode, language and answer length"""
         if mode == "technical":
             base_prompt = """You are a senior technical architect. Provide detailed technical explanations with this EXACT format:
@@ -216,48 +476,68 @@ Guidelines: Use simple language, avoid jargon, include relatable examples, make
         else:
             base_prompt += "\n- Provide detailed explanations with examples when helpful"
         if language != "en":
-            language_names = {
-                "es": "Spanish", "fr": "French", "de": "German", "it": "Italian",
-                "pt": "Portuguese", "ru": "Russian", "ja": "Japanese", 
-                "ko": "Korean", "zh": "Chinese"
-            }
-            lang_name = language_names.get(language, language)
-            base_prompt += f"\n- Respond in {lang_name}"
+            lang_name = LANGUAGE_NAMES.get(language, language)
+            base_prompt += f"\n- Respond in {lang_name}, even where the context is in another language"
+        if include_followups:
+            base_prompt += (
+                f"\n- After the answer, write {FOLLOWUP_MARKER} on its own line, followed by 4 short questions "
+                "the user might naturally ask next, one per line, without numbers or bullets"
+            )
         return base_prompt
     def _calculate_confidence(self, context_docs: List[Tuple[Document, float]]) -> float:
         """Calculate confidence score based on retrieval results"""
         if not context_docs:
             return 0.0
         avg_score = sum(score for _, score in context_docs) / len(context_docs)
-        result_count_factor = min(len(context_docs) / settings.TOP_K_RESULTS, 1.0)
+        # Chunks merged by the context builder still count as the chunks they were retrieved as
+        chunk_count = sum(doc.metadata.get("merged_chunks", 1) for doc, _ in context_docs)
+        result_count_factor = min(chunk_count / settings.TOP_K_RESULTS, 1.0)
         confidence = avg_score * result_count_factor
         return round(min(confidence, 1.0), 2)
-    def _translate_text(self, text: str, target_language: str) -> str:
+    def _needs_translation(self, text: str, target_language: str) -> bool:
+        """Whether an answer generated for target_language came back in a different language.
+
+        The answer prompt already asks for the target language, so this is
+        only the fallback: answers whose language cannot be told are kept.
+        """
+        if target_language == "en" or not settings.TRANSLATION_FALLBACK:
+            return False
+        detected = detect_language(text)
+        if detected is None or detected == target_language:
+            self.translations_skipped += 1
+            return False
+        print(f"🌐 Answer came back in {detected} instead of {target_language}, translating")
+        self.translations += 1
+        return True
+    async def _atranslate_text(self, text: str, target_language: str, priority: int = PRIORITY_ANSWER) -> str:
         """Translate text to target language using LLM"""
+        cached = self.translation_cache.get(text, target_language)
+        if cached is not None:
+            return cached
         try:
-            language_names = {
-                "es": "Spanish", "fr": "French", "de": "German", "it": "Italian",
-                "pt": "Portuguese", "ru": "Russian", "ja": "Japanese", 
-                "ko": "Korean", "zh": "Chinese"
-            }
-            lang_name = language_names.get(target_language, target_language)
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"You are a professional translator. Translate the following text to {lang_name}. Maintain the original meaning and tone."
-                    },
-                    {
-                        "role": "user",
-                        "content": text
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=2000
-            )
-            return response.choices[0].message.content.strip()
+            with tracer.stage("translation"):
+                response = await self._acomplete(
+                    priority,
+                    messages=self._build_translation_messages(text, target_language),
+                    temperature=0.1,
+                    max_tokens=2000
+                )
+            translation = response.choices[0].message.content.strip()
+            self.translation_cache.put(text, target_language, translation)
+            return translation
         except Exception as e:
             print(f"❌ Translation error: {e}")
             return f"[Translation to {target_language} failed] {text}"
+    def _build_translation_messages(self, text: str, target_language: str) -> List[dict]:
+        lang_name = LANGUAGE_NAMES.get(target_language, target_language)
+        return [
+            {
+                "role": "system",
+                "content": f"You are a professional translator. Translate the following text to {lang_name}. Maintain the original meaning and tone."
+            },
+            {
+                "role": "user",
+                "content": text
+            }
+        ]
 llm_service = LLMService()
@@ -0,0 +1,237 @@
+import time
+import heapq
+import random
+import asyncio
+import itertools
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+import httpx
+from services.tokenizer import count_message_tokens, count_tokens
+from services.tracing import tracer
+PRIORITY_ANSWER = 0
+PRIORITY_FOLLOWUP = 1
+PRIORITY_BACKGROUND = 2
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+class TokenBucket:
+    """Per-minute budget that refills continuously; a rate of 0 means unlimited.
+
+    The balance may go negative when a call used more than was reserved
+    for it, which simply delays the next calls until it is paid back.
+    """
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self._updated = time.monotonic()
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken"""
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        missing = min(amount, self.capacity) - self.available
+        return max(missing, 0.0) * 60.0 / self.capacity
+    def take(self, amount: float):
+        if self.capacity:
+            self._refill()
+            self.available -= amount
+    def give_back(self, amount: float):
+        if self.capacity:
+            self._refill()
+            self.available = min(self.available + amount, self.capacity)
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.capacity / 60.0)
+        self._updated = now
+class ProviderScheduler:
+    """Admission control, retries and a shared connection pool for LLM provider calls.
+
+    Every completion goes through call(). Callers wait in one priority
+    queue (lower number first, FIFO within a priority) until a concurrency
+    slot is free and the request and token buckets can cover the call;
+    token use is reserved from the prompt's token count plus max_tokens
+    and settled against the usage the provider reports. Retryable
+    failures are retried with full-jitter exponential backoff; a 429
+    pauses the whole queue for the provider's Retry-After, so waiting
+    answers resume before waiting follow-ups and summaries.
+    """
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        max_concurrency: int = 16,
+        max_retries: int = 4,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 30,
+        connection_errors: Tuple[Type[BaseException], ...] = (httpx.TransportError,)
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.connection_errors = connection_errors
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self._waiters: List[Tuple[int, int, float, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+    async def call(self, create: Callable[..., Awaitable[Any]], priority: int = PRIORITY_ANSWER, **kwargs) -> Any:
+        """Run create(**kwargs) once admitted, retrying retryable failures.
+
+        Streaming calls (stream=True) keep their slot until the returned
+        stream is exhausted or closed; they are only retried until the
+        stream has been opened.
+        """
+        reserved = self._estimate_tokens(kwargs)
+        for attempt in range(self.max_retries + 1):
+            with tracer.stage("llm_queue"):
+                await self._acquire(priority, reserved)
+            try:
+                response = await create(**kwargs)
+            except asyncio.CancelledError:
+                self._release()
+                raise
+            except Exception as e:
+                self._release()
+                delay = self._retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                if self._paused_until <= time.monotonic():
+                    await asyncio.sleep(delay)
+                # Otherwise the queue is paused: wait in it, so the call keeps its place by priority
+                continue
+            self.calls += 1
+            if kwargs.get("stream"):
+                return self._hold_until_done(response, reserved, kwargs)
+            self._settle(reserved, _reported_tokens(response))
+            self._release()
+            return response
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "queued": sum(1 for *_, future in self._waiters if not future.done()),
+            "paused_seconds": round(max(self._paused_until - time.monotonic(), 0.0), 2),
+            "requests_available": round(self.requests.available, 1) if self.requests.capacity else None,
+            "tokens_available": round(self.tokens.available) if self.tokens.capacity else None
+        }
+    async def _acquire(self, priority: int, reserved: float):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), reserved, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled after being admitted: hand the slot to the next waiter
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+    def _dispatch(self):
+        """Admit waiters in priority order while there is capacity, else wake up when there will be"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            priority, _, reserved, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self.max_concurrency:
+                return
+            delay = max(
+                self._paused_until - time.monotonic(),
+                self.requests.wait_time(1),
+                self.tokens.wait_time(reserved)
+            )
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self.requests.take(1)
+            self.tokens.take(reserved)
+            self.in_flight += 1
+            future.set_result(None)
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None if the error is not retryable"""
+        status = getattr(error, "status_code", None)
+        if status is None and not isinstance(error, self.connection_errors):
+            return None
+        if status is not None and status not in RETRY_STATUS_CODES:
+            return None
+        delay = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.backoff_base_seconds)
+        if status == 429:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            print(f"⏳ Provider rate limit hit, pausing calls for {delay:.1f}s")
+        return delay
+    def _settle(self, reserved: float, used: Optional[int]):
+        """Replace the token reservation with the tokens the call actually used"""
+        if used is not None:
+            if used < reserved:
+                self.tokens.give_back(reserved - used)
+            else:
+                self.tokens.take(used - reserved)
+    async def _hold_until_done(self, stream: AsyncIterator[Any], reserved: float, kwargs: Dict[str, Any]) -> AsyncIterator[Any]:
+        """Yield the stream's chunks, then settle its tokens and free its slot.
+
+        Usage comes from the final chunk when the provider reports it there;
+        otherwise it is estimated from the prompt and the text streamed so
+        far, which also covers streams closed early.
+        """
+        used = None
+        text = []
+        try:
+            async for chunk in stream:
+                used = _reported_tokens(chunk) or used
+                for choice in getattr(chunk, "choices", None) or []:
+                    content = getattr(getattr(choice, "delta", None), "content", None)
+                    if content:
+                        text.append(content)
+                yield chunk
+        finally:
+            if used is None:
+                used = count_message_tokens(kwargs.get("messages", [])) + count_tokens("".join(text))
+            self._settle(reserved, used)
+            self._release()
+    @staticmethod
+    def _estimate_tokens(kwargs: Dict[str, Any]) -> float:
+        """Prompt tokens plus the completion allowance"""
+        return count_message_tokens(kwargs.get("messages", [])) + kwargs.get("max_tokens", 0)
+def _reported_tokens(response: Any) -> Optional[int]:
+    """Total tokens the provider reported for a response or stream chunk (Groq puts it under x_groq)"""
+    usage = getattr(response, "usage", None) or getattr(getattr(response, "x_groq", None), "usage", None)
+    return getattr(usage, "total_tokens", None)
+def _retry_after(error: Exception) -> Optional[float]:
+    """Retry-After (seconds, or retry-after-ms) from the error's HTTP response, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return max(float(headers["retry-after-ms"]) / 1000, 0.0)
+        if headers.get("retry-after") is not None:
+            return max(float(headers["retry-after"]), 0.0)
+    except ValueError:
+        return None
+    return None
+def connection_pool(max_connections: int, timeout_seconds: float) -> httpx.AsyncClient:
+    """HTTP client shared by every call to the provider, so connections are kept alive and reused"""
+    return httpx.AsyncClient(
+        timeout=timeout_seconds,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    )
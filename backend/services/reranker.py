@@ -0,0 +1,115 @@
+import time
+import threading
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
+import numpy as np
+from config import settings
+from services.vector_store import SearchHit
+class Reranker:
+    """Local cross-encoder that re-scores search hits against the question.
+
+    Scoring runs on one dedicated thread and is bounded by timeout_ms:
+    when the model is still loading, busy with earlier queries for the
+    whole budget, or does not finish in time, rerank() returns None and
+    the caller keeps vector order. The number of candidates scored is capped by what the recent
+    per-pair latency says fits in the budget. Scores are the model's
+    logits through a sigmoid, so they read as relevance in [0, 1].
+    """
+    def __init__(self, model_name: str, timeout_ms: int = 300, max_length: int = 256, batch_size: int = 32):
+        self.model_name = model_name
+        self.timeout_seconds = timeout_ms / 1000
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.reranked = 0
+        self.fallbacks = 0
+        self.total_seconds = 0.0
+        self._pair_seconds: Optional[float] = None
+        self._model = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._busy = threading.Lock()
+        self._loading = None
+    def warm_up(self):
+        """Load the model in the background so the first queries are not kept waiting"""
+        if self._loading is None:
+            self._loading = self._executor.submit(self._load)
+    def rerank(self, question: str, hits: List[SearchHit], keep: int) -> Optional[List[SearchHit]]:
+        """The best keep hits by cross-encoder score, or None to fall back to vector order"""
+        if not hits:
+            return []
+        self.warm_up()
+        start_time = time.time()
+        # Concurrent queries wait their turn, but only within their own budget
+        if self._model is None or not self._busy.acquire(timeout=self.timeout_seconds):
+            self.fallbacks += 1
+            return None
+        remaining = self.timeout_seconds - (time.time() - start_time)
+        if remaining <= 0:
+            self._busy.release()
+            self.fallbacks += 1
+            return None
+        candidates = hits[:self._affordable(len(hits), keep, remaining)]
+        try:
+            future = self._executor.submit(self._score, question, candidates)
+            scores = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            # The scoring thread keeps the busy lock until it finishes
+            future.add_done_callback(lambda _: self._busy.release())
+            self._pair_seconds = max(self._pair_seconds or 0.0, remaining / len(candidates))
+            self.fallbacks += 1
+            print(f"⚠️ Rerank exceeded {self.timeout_seconds * 1000:.0f}ms for {len(candidates)} candidates, keeping vector order")
+            return None
+        except Exception as e:
+            self._busy.release()
+            self.fallbacks += 1
+            print(f"❌ Rerank failed: {e}")
+            return None
+        self._busy.release()
+        elapsed = time.time() - start_time
+        self.reranked += 1
+        self.total_seconds += elapsed
+        order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:keep]
+        return [dataclasses.replace(candidates[i], score=scores[i]) for i in order]
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "ready": self._model is not None,
+            "reranked": self.reranked,
+            "fallbacks": self.fallbacks,
+            "avg_ms": round(self.total_seconds / self.reranked * 1000, 1) if self.reranked else 0.0,
+            "timeout_ms": round(self.timeout_seconds * 1000)
+        }
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    def _affordable(self, count: int, keep: int, seconds: float) -> int:
+        """How many candidates the recent per-pair latency allows in the given time (at least keep)"""
+        if not self._pair_seconds:
+            return count
+        return max(keep, min(count, int(seconds * 0.8 / self._pair_seconds)))
+    def _load(self):
+        try:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, max_length=self.max_length, device='cpu')
+            print(f"✅ Reranker {self.model_name} loaded")
+        except Exception as e:
+            print(f"❌ Could not load reranker {self.model_name}: {e}")
+    def _score(self, question: str, candidates: List[SearchHit]) -> List[float]:
+        start_time = time.time()
+        logits = self._model.predict(
+            [(question, hit.document.page_content) for hit in candidates],
+            batch_size=self.batch_size,
+            show_progress_bar=False
+        )
+        pair_seconds = (time.time() - start_time) / len(candidates)
+        # Follow slowdowns at once, speed-ups gradually
+        if self._pair_seconds is None or pair_seconds > self._pair_seconds:
+            self._pair_seconds = pair_seconds
+        else:
+            self._pair_seconds = 0.8 * self._pair_seconds + 0.2 * pair_seconds
+        return (1 / (1 + np.exp(-np.clip(np.asarray(logits, dtype=np.float64), -50, 50)))).tolist()
+reranker = Reranker(
+    settings.RERANK_MODEL,
+    timeout_ms=settings.RERANK_TIMEOUT_MS,
+    max_length=settings.RERANK_MAX_LENGTH,
+    batch_size=settings.RERANK_BATCH_SIZE
+)
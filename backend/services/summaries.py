@@ -0,0 +1,116 @@
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional, Any
+from langchain.schema import Document
+from config import settings
+from services.llm_service import llm_service
+class SummaryService:
+    """Document summaries generated in the background and cached by content.
+
+    A summary only looks at the first few chunks, so it is keyed by a hash
+    of those chunks (and the LLM provider/model): re-uploading the same
+    content reuses the stored summary without another LLM call. Each
+    document, identified by collection and document id, points at the
+    content hash of its summary.
+    """
+    SUMMARY_CHUNKS = 3
+    def __init__(self, db_path: str, concurrency: int = 2):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS summaries (content_hash TEXT PRIMARY KEY, summary TEXT NOT NULL, created_at REAL NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents (collection_id TEXT NOT NULL, document_id TEXT NOT NULL, "
+            "content_hash TEXT NOT NULL, PRIMARY KEY (collection_id, document_id))"
+        )
+        self._db.commit()
+        self.concurrency = concurrency
+        self.generated = 0
+        self.reused = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, asyncio.Task] = {}
+    def schedule(self, collection_id: str, document_id: str, documents: List[Document]) -> Optional[str]:
+        """Attach a summary to a collection's document: the cached one if known, otherwise start generating it.
+
+        Must be called from the event loop. Returns the summary when it is
+        already available, else None.
+        """
+        digest = self._content_hash(documents[:self.SUMMARY_CHUNKS])
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (collection_id, document_id, content_hash) VALUES (?, ?, ?)",
+                (collection_id, document_id, digest)
+            )
+            self._db.commit()
+        summary = self._get_by_hash(digest)
+        if summary is not None:
+            self.reused += 1
+            return summary
+        if digest not in self._pending:
+            self._pending[digest] = asyncio.create_task(self._generate(digest, documents[:self.SUMMARY_CHUNKS]))
+        return None
+    def get(self, collection_id: str, document_id: str) -> Dict[str, Any]:
+        """Summary status for a collection's document: ready, pending or missing"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_hash FROM documents WHERE collection_id = ? AND document_id = ?",
+                (collection_id, document_id)
+            ).fetchone()
+        result = {"document_id": document_id, "collection_id": collection_id, "status": "missing", "summary": None}
+        if row is None:
+            return result
+        summary = self._get_by_hash(row[0])
+        if summary is not None:
+            return dict(result, status="ready", summary=summary)
+        return dict(result, status="pending" if row[0] in self._pending else "failed")
+    def remove_document(self, collection_id: str, document_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM documents WHERE collection_id = ? AND document_id = ?", (collection_id, document_id))
+            self._db.commit()
+    def remove_collection(self, collection_id: str):
+        """Forget every document of a collection (cached summaries stay, keyed by content)"""
+        with self._lock:
+            self._db.execute("DELETE FROM documents WHERE collection_id = ?", (collection_id,))
+            self._db.commit()
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            cached = self._db.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        return {"cached": cached, "pending": len(self._pending), "generated": self.generated, "reused": self.reused}
+    async def close(self):
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        with self._lock:
+            self._db.close()
+    async def _generate(self, digest: str, documents: List[Document]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            async with self._semaphore:
+                summary = await llm_service.agenerate_summary(documents)
+            if summary is None:
+                return
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO summaries (content_hash, summary, created_at) VALUES (?, ?, ?)",
+                    (digest, summary, time.time())
+                )
+                self._db.commit()
+            self.generated += 1
+            print(f"📝 Summary ready for content {digest[:12]}")
+        finally:
+            self._pending.pop(digest, None)
+    def _get_by_hash(self, digest: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT summary FROM summaries WHERE content_hash = ?", (digest,)).fetchone()
+        return row[0] if row else None
+    def _content_hash(self, documents: List[Document]) -> str:
+        digest = hashlib.sha256(f"{settings.LLM_PROVIDER}\0{llm_service.model}".encode("utf-8"))
+        for doc in documents:
+            digest.update(b"\0")
+            digest.update(doc.page_content[:300].encode("utf-8"))
+        return digest.hexdigest()
+summary_service = SummaryService(settings.SUMMARY_STORE_PATH, settings.SUMMARY_CONCURRENCY)
@@ -0,0 +1,34 @@
+import threading
+from typing import List
+from config import settings
+_encoding = None
+_encoding_failed = False
+_lock = threading.Lock()
+def _get_encoding():
+    """tiktoken encoding, loaded once; None if it cannot be loaded (e.g. offline without a cached BPE file)"""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+                except Exception as e:
+                    _encoding_failed = True
+                    print(f"⚠️ Tokenizer {settings.TOKENIZER_ENCODING} unavailable ({e}); estimating 4 characters per token")
+    return _encoding
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+def count_message_tokens(messages: List[dict]) -> int:
+    """Prompt tokens of a chat request, with the few tokens of framing each message adds"""
+    return sum(count_tokens(message.get("content") or "") + 4 for message in messages) + 3
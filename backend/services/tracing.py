@@ -0,0 +1,132 @@
+import time
+import bisect
+import threading
+import contextlib
+import contextvars
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+from config import settings
+T = TypeVar("T")
+# Upper bounds in seconds, from sub-millisecond cache lookups to slow provider calls and large uploads
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_timings", default=None)
+class Histogram:
+    """Cumulative-bucket latency histogram; observing is a bisect and three additions under a lock"""
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+    def observe(self, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+    def snapshot(self) -> Tuple[List[int], int, float]:
+        """Per-bucket counts (the last one above every bound), total count and sum"""
+        with self._lock:
+            return list(self.counts), self.count, self.total
+    def quantile(self, q: float) -> float:
+        """Estimate of the q-quantile in seconds, interpolated within its bucket"""
+        counts, count, _ = self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+class Tracer:
+    """Per-stage latency histograms, plus an optional breakdown for the current request.
+
+    Stages are timed with stage(name) around the code they cover, or
+    reported with observe() when the duration is measured elsewhere (e.g.
+    time to first token). A request that calls start_request() also
+    collects the milliseconds spent in each stage it went through; the
+    breakdown follows the request into worker threads and tasks it starts,
+    since it lives in a context variable.
+    """
+    def __init__(self, enabled: bool = True, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+    def observe(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram(self.buckets))
+        histogram.observe(seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            # Stages repeated within a request (e.g. embedding batches) add up
+            timings[name] = timings.get(name, 0.0) + seconds * 1000
+    def timed_iter(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Yield from iterable, timing only the work of producing each item"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    def start_request(self) -> Dict[str, float]:
+        """Start collecting a stage breakdown for the current request (and the tasks it spawns from here on)"""
+        timings: Dict[str, float] = {}
+        _request_timings.set(timings)
+        return timings
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {
+            name: {
+                "count": histogram.count,
+                "avg_ms": round(histogram.total / histogram.count * 1000, 1) if histogram.count else 0.0,
+                "p50_ms": round(histogram.quantile(0.5) * 1000, 1),
+                "p99_ms": round(histogram.quantile(0.99) * 1000, 1)
+            }
+            for name, histogram in sorted(histograms.items())
+        }
+    def render_prometheus(self) -> str:
+        """All stage histograms in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = dict(self._histograms)
+        lines = [
+            "# HELP rag_stage_duration_seconds Time spent in each stage of query answering and document ingestion",
+            "# TYPE rag_stage_duration_seconds histogram"
+        ]
+        for name, histogram in sorted(histograms.items()):
+            counts, count, total = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'rag_stage_duration_seconds_bucket{{stage="{name}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'rag_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'rag_stage_duration_seconds_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'rag_stage_duration_seconds_count{{stage="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+def round_timings(timings: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+    """A request's stage breakdown in milliseconds, rounded for responses"""
+    if timings is None:
+        return None
+    return {name: round(ms, 1) for name, ms in timings.items()}
+tracer = Tracer(enabled=settings.TRACING_ENABLED)
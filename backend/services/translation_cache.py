@@ -0,0 +1,42 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+class TranslationCache:
+    """In-memory LRU of translations keyed by a hash of the source text and the target language"""
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+    def get(self, text: str, target_language: str) -> Optional[str]:
+        key = self._key(text, target_language)
+        with self._lock:
+            translation = self._entries.get(key)
+            if translation is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return translation
+    def put(self, text: str, target_language: str, translation: str):
+        if self.max_entries <= 0:
+            return
+        key = self._key(text, target_language)
+        with self._lock:
+            self._entries[key] = translation
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+    @staticmethod
+    def _key(text: str, target_language: str) -> str:
+        return hashlib.sha256(f"{target_language}\0{text}".encode("utf-8")).hexdigest()
@@ -0,0 +1,76 @@
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Optional, Dict, Any
+from langchain.schema import Document
+def content_hash(documents: List[Document]) -> str:
+    """Fingerprint of a page's extracted chunks, independent of markup noise"""
+    digest = hashlib.sha256()
+    for doc in documents:
+        digest.update(doc.page_content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+class UrlStateStore:
+    """Per-URL fetch state for web sources.
+
+    Keeps the document id, HTTP validators (ETag / Last-Modified) and a
+    content hash for every ingested page, so refreshes can send
+    conditional requests and skip re-embedding pages that did not change.
+    """
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            "url TEXT PRIMARY KEY, document_id TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "content_hash TEXT NOT NULL, fetched_at REAL NOT NULL, checked_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS urls_document_id ON urls (document_id)")
+        self._db.commit()
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM urls WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+    def list(self, urls: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            if urls is None:
+                rows = self._db.execute("SELECT * FROM urls ORDER BY url").fetchall()
+            else:
+                rows = []
+                for i in range(0, len(urls), 500):
+                    batch = urls[i:i + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows.extend(self._db.execute(f"SELECT * FROM urls WHERE url IN ({placeholders})", batch).fetchall())
+        return [dict(row) for row in rows]
+    def record(self, url: str, document_id: str, etag: Optional[str], last_modified: Optional[str], digest: str):
+        """Save state after a full fetch"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO urls (url, document_id, etag, last_modified, content_hash, fetched_at, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, document_id, etag, last_modified, digest, now, now)
+            )
+            self._db.commit()
+    def touch(self, url: str):
+        """Mark a URL as checked and unchanged"""
+        with self._lock:
+            self._db.execute("UPDATE urls SET checked_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+    def remove(self, url: str):
+        with self._lock:
+            self._db.execute("DELETE FROM urls WHERE url = ?", (url,))
+            self._db.commit()
+    def remove_document(self, document_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM urls WHERE document_id = ?", (document_id,))
+            self._db.commit()
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM urls")
+            self._db.commit()
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,104 @@
+import os
+from typing import Tuple
+import numpy as np
+class VectorFile:
+    """Append-only float32 matrix in a memory-mapped file, one row per chunk position.
+
+    The file is mapped rather than read, so opening it costs nothing and
+    every process serving the same store shares one copy in the page
+    cache. Squared norms are kept in a side file so exact L2 search is a
+    single matrix product over the mapped rows.
+    """
+    BLOCK_ROWS = 65536
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self._norms_path = path + ".norms"
+        self._vectors = None
+        self._norms = None
+        self._capacity = 0
+        if os.path.exists(path):
+            self._map(self._file_capacity())
+    def write(self, start: int, vectors: np.ndarray):
+        """Write rows starting at position start, growing the file as needed"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        end = start + len(vectors)
+        if end > self._capacity:
+            self._grow(max(self._capacity * 2, end, 1024))
+        self._vectors[start:end] = vectors
+        self._norms[start:end] = np.einsum("ij,ij->i", vectors, vectors)
+        self._vectors.flush()
+        self._norms.flush()
+    def refresh(self):
+        """Remap if another process grew the files since they were mapped"""
+        capacity = self._file_capacity()
+        if capacity > self._capacity:
+            self.close()
+            self._map(capacity)
+    def rows(self, start: int, end: int) -> np.ndarray:
+        """View of rows [start, end) backed by the file"""
+        if self._vectors is None:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return self._vectors[start:end]
+    def take(self, positions: np.ndarray) -> np.ndarray:
+        return np.asarray(self._vectors[positions]) if len(positions) else np.zeros((0, self.dim), dtype=np.float32)
+    def search(self, queries: np.ndarray, k: int, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact squared-L2 top-k over rows [start, end) for each query row.
+
+        Returns (distances, positions), each of shape (queries, <= k),
+        nearest first. All queries share one pass over the mapped rows, so a
+        batch costs one matrix-matrix product per block instead of one scan
+        per query.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        query_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        best_distances, best_positions = [], []
+        for block_start in range(start, end, self.BLOCK_ROWS):
+            block_end = min(block_start + self.BLOCK_ROWS, end)
+            distances = self._norms[block_start:block_end] - 2 * (queries @ self._vectors[block_start:block_end].T) + query_norms
+            if distances.shape[1] > k:
+                top = np.argpartition(distances, k, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+            best_distances.append(np.take_along_axis(distances, top, axis=1))
+            best_positions.append(top + block_start)
+        if not best_distances:
+            empty = (len(queries), 0)
+            return np.zeros(empty, dtype=np.float32), np.zeros(empty, dtype=np.int64)
+        distances = np.concatenate(best_distances, axis=1)
+        positions = np.concatenate(best_positions, axis=1)
+        order = np.argsort(distances, axis=1)[:, :k]
+        return np.maximum(np.take_along_axis(distances, order, axis=1), 0), np.take_along_axis(positions, order, axis=1)
+    def copy_to(self, path: str, positions: np.ndarray) -> "VectorFile":
+        """Write the given rows, in order, to a new vector file"""
+        target = VectorFile(path, self.dim)
+        for i in range(0, len(positions), self.BLOCK_ROWS):
+            target.write(i, self.take(positions[i:i + self.BLOCK_ROWS]))
+        return target
+    def close(self):
+        self._vectors = None
+        self._norms = None
+    def remove(self):
+        self.close()
+        for path in (self.path, self._norms_path):
+            if os.path.exists(path):
+                os.remove(path)
+    def _map(self, capacity: int):
+        self._capacity = capacity
+        if capacity:
+            self._vectors = np.memmap(self.path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+            self._norms = np.memmap(self._norms_path, dtype=np.float32, mode='r+', shape=(capacity,))
+    def _file_capacity(self) -> int:
+        """Rows both files can hold (another process may be between growing one and the other)"""
+        if not os.path.exists(self.path) or not os.path.exists(self._norms_path):
+            return 0
+        return min(os.path.getsize(self.path) // (self.dim * 4), os.path.getsize(self._norms_path) // 4)
+    def _grow(self, capacity: int):
+        """Extend both files and remap them; never shrinks files another process grew"""
+        capacity = max(capacity, self._file_capacity())
+        self.close()
+        with open(self.path, 'ab') as f:
+            f.truncate(capacity * self.dim * 4)
+        with open(self._norms_path, 'ab') as f:
+            f.truncate(capacity * 4)
+        self._map(capacity)
@@ -1,128 +1,696 @@
 import os
-import pickle
-from typing import List, Tuple, Optional
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import re
+import json
+import math
+import uuid
+import shutil
+import sqlite3
+import itertools
+import threading
+from dataclasses import dataclass
+from typing import List, Tuple, Optional, Dict, Iterable
+import numpy as np
+import faiss
 from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
 from langchain.schema import Document
 from config import settings
+from services.lexical_index import BM25Index
+from services.chunk_store import ChunkStore, STAGED_PREFIX
+from services.vector_file import VectorFile
+from services import ann_index
+from services.tracing import tracer
+GENERATION_FILE = re.compile(r"^(vectors|ann|bm25)-(\d+)")
+LEGACY_FILES = ("index.faiss", "index.pkl", "manifest.jsonl", "segments", "bm25.npz", "index_meta.json")
+class StoreLock:
+    """Cross-process write lock: an IMMEDIATE transaction on a small SQLite file.
+
+    Re-entrant within a process; callers hold the store's thread lock
+    around it, which also serializes the threads of one process.
+    """
+    def __init__(self, path: str, timeout_seconds: float = 600):
+        self.path = path
+        self.timeout_seconds = timeout_seconds
+        self._db: Optional[sqlite3.Connection] = None
+        self._depth = 0
+    def __enter__(self):
+        if self._depth == 0:
+            if self._db is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._db = sqlite3.connect(self.path, timeout=self.timeout_seconds, isolation_level=None, check_same_thread=False)
+            self._db.execute("BEGIN IMMEDIATE")
+        self._depth += 1
+        return self
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            self._db.execute("COMMIT")
+    def close(self):
+        if self._db is not None and self._depth == 0:
+            self._db.close()
+            self._db = None
+@dataclass
+class SearchHit:
+    document: Document
+    score: float
+    position: int
+    vector: np.ndarray
 class VectorStoreService:
-    def __init__(self):
-        self.vector_store: Optional[FAISS] = None
-        self.embeddings = None
+    """Vector store kept on disk in memory-mappable files, with no pickle.
+
+    Every chunk has a position: its row in the vector file (memory-mapped,
+    so processes serving the same store share one copy in the page cache),
+    its row in chunks.sqlite (text and metadata, read only for search hits)
+    and its slot in the BM25 index. Opening a store maps files and reads a
+    few meta values, so cold start does not grow with the corpus.
+
+    Several processes can serve one store. Writes take a cross-process lock
+    (a .lock file next to the store) and start by catching up with the
+    chunk store; searches catch up first too. Catching up is one meta
+    read when nothing changed; otherwise it indexes the chunks other
+    processes appended and masks the ones they deleted, or reopens the
+    store when they compacted it to a new generation. Hit text is read in
+    a snapshot checked against the searched generation, so a compaction
+    that renumbers chunks mid-search makes the search run again.
+
+    Adds append rows; deletes flag rows and are masked at search time.
+    Compaction writes a new generation of the vector, ANN and BM25 files
+    without deleted chunks and switches to it by committing the new file
+    names to the chunk store's meta table together with the renumbered rows.
+    Dense search is exact over the mapped vectors, or, for large corpora,
+    uses an IVF-Flat, HNSW or IVF-PQ index over the positions up to the last
+    compaction plus an exact scan of the chunks added since. IVF indexes
+    keep their lists mapped; an HNSW graph is read into each process's
+    memory, so it is only used when configured explicitly.
+    """
+    def __init__(self, path: str, embeddings: Embeddings):
+        self.path = path
+        self.embeddings = embeddings
+        self.chunks: Optional[ChunkStore] = None
+        self.vectors: Optional[VectorFile] = None
+        self.index: Optional[faiss.Index] = None
+        self._meta: Dict = {}
         self._document_count = 0
-        self._initialize_embeddings()
+        self._position_count = 0
+        self._base_count = 0
+        self._deleted = set()
+        self._state: Optional[Tuple[int, int]] = None
+        self._chunks_inode: Optional[int] = None
+        self._corpus_version = 0
+        self.lexical_index = BM25Index(k1=settings.BM25_K1, b=settings.BM25_B)
+        self._lock = threading.RLock()
+        self._write_lock = StoreLock(os.path.normpath(path) + ".lock")
         self._load_existing_store()
-    def _initialize_embeddings(self):
-        """Initialize embeddings based on LLM provider"""
-        if settings.LLM_PROVIDER == "openai" and settings.is_llm_configured:
-            self.embeddings = OpenAIEmbeddings(
-                openai_api_key=settings.OPENAI_API_KEY,
-                model="text-embedding-ada-002"
-            )
-            print("✅ OpenAI embeddings initialized")
-        else:
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2",
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
-            )
-            print("✅ Local HuggingFace embeddings initialized")
+    @property
+    def corpus_version(self) -> int:
+        """Bumped whenever the searchable chunks change, here or in another process"""
+        with self._lock:
+            self._refresh()
+            return self._corpus_version
     def _load_existing_store(self):
-        """Load existing vector store if it exists"""
-        if os.path.exists(settings.VECTOR_STORE_PATH):
-            try:
-                self.vector_store = FAISS.load_local(
-                    settings.VECTOR_STORE_PATH,
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                count_file = os.path.join(settings.VECTOR_STORE_PATH, "doc_count.pkl")
-                if os.path.exists(count_file):
-                    with open(count_file, 'rb') as f:
-                        self._document_count = pickle.load(f)
-                else:
-                    self._document_count = len(self.vector_store.docstore._dict) if self.vector_store else 0
+        """Open the store on disk if there is one, converting the old pickle format once"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with self._lock, self._write_lock:
+                if os.path.exists(os.path.join(self.path, ChunkStore.FILE_NAME)):
+                    self._open_store()
+                    self._remove_stale_files()
+                elif any(os.path.exists(os.path.join(self.path, name)) for name in LEGACY_FILES):
+                    self._migrate_legacy_store()
+            if self.chunks is not None:
                 print(f"✅ Loaded existing vector store with {self._document_count} documents")
-            except Exception as e:
-                print(f"⚠️ Could not load existing vector store: {e}")
-                self.vector_store = None
-                self._document_count = 0
-    def add_documents(self, documents: List[Document], replace_existing: bool = True) -> int:
-        """Add documents to vector store"""
+        except Exception as e:
+            print(f"⚠️ Could not load existing vector store: {e}")
+            self._close_store()
+    def _open_store(self):
+        """Map the current generation of files and index the chunks added since the last compaction"""
+        os.makedirs(self.path, exist_ok=True)
+        chunks_path = os.path.join(self.path, ChunkStore.FILE_NAME)
+        self.chunks = ChunkStore(chunks_path)
+        self._chunks_inode = os.stat(chunks_path).st_ino
+        self._state = self.chunks.get_state()
+        self._meta = self.chunks.get_meta()
+        self._position_count = self.chunks.next_position()
+        self._document_count = self.chunks.live_count()
+        self._base_count = self._meta.get("base_count", 0)
+        self._deleted = set(self.chunks.deleted_positions())
+        if self._meta.get("vectors_file"):
+            self.vectors = VectorFile(os.path.join(self.path, self._meta["vectors_file"]), self._meta["dim"])
+        if self._meta.get("ann_file"):
+            self.index = faiss.read_index(os.path.join(self.path, self._meta["ann_file"]), faiss.IO_FLAG_MMAP)
+            ann_index.configure_defaults(self.index, settings.IVF_NPROBE, settings.HNSW_EF_SEARCH)
+        self.lexical_index.clear()
+        if self._meta.get("bm25_dir"):
+            self.lexical_index.open(os.path.join(self.path, self._meta["bm25_dir"]))
+        for rows in self.chunks.iter_texts(self._base_count):
+            self.lexical_index.add([position for position, _, _ in rows], [text for _, text, _ in rows])
+        self.lexical_index.delete(sorted(self._deleted))
+    def _close_store(self):
+        if self.chunks is not None:
+            self.chunks.close()
+        if self.vectors is not None:
+            self.vectors.close()
+        self.chunks = None
+        self.vectors = None
+        self.index = None
+        self._meta = {}
+        self._document_count = 0
+        self._position_count = 0
+        self._base_count = 0
+        self._deleted = set()
+        self._state = None
+        self._chunks_inode = None
+        self.lexical_index.clear()
+    def _refresh(self):
+        """Catch up with what other processes changed in the store since it was last read"""
+        try:
+            inode = os.stat(os.path.join(self.path, ChunkStore.FILE_NAME)).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode != self._chunks_inode:
+            # Created, cleared or recreated elsewhere
+            self._corpus_version += 1
+            self._close_store()
+            if inode is not None:
+                self._open_store()
+            return
+        if self.chunks is None:
+            return
+        state = self.chunks.get_state()
+        if state == self._state:
+            return
+        # Cached answers may rest on chunks another process changed
+        self._corpus_version += 1
+        if state[0] != self._meta.get("generation", 0):
+            # Compacted elsewhere: positions were renumbered, so map the new generation
+            self._close_store()
+            self._open_store()
+            return
+        self._meta = self.chunks.get_meta()
+        for rows in self.chunks.iter_texts(self._position_count):
+            self.lexical_index.add([position for position, _, _ in rows], [text for _, text, _ in rows])
+            self._position_count = rows[-1][0] + 1
+        if self.vectors is None and self._meta.get("vectors_file"):
+            self.vectors = VectorFile(os.path.join(self.path, self._meta["vectors_file"]), self._meta["dim"])
+        elif self.vectors is not None:
+            self.vectors.refresh()
+        deleted = set(self.chunks.deleted_positions())
+        self.lexical_index.delete(sorted(deleted - self._deleted))
+        self._deleted = deleted
+        self._document_count = self.chunks.live_count()
+        self._state = state
+    def _remove_stale_files(self):
+        """Delete files of generations other than the current one (left by a compaction or a crash).
+
+        Only called under the write lock, so no other process is writing a
+        generation; processes still mapping an old one keep their mapping.
+        """
+        current = {self._meta.get("vectors_file"), self._meta.get("ann_file"), self._meta.get("bm25_dir")}
+        for name in os.listdir(self.path):
+            base_name = name[:-len(".norms")] if name.endswith(".norms") else name
+            if GENERATION_FILE.match(name) and base_name not in current:
+                full_path = os.path.join(self.path, name)
+                if os.path.isdir(full_path):
+                    shutil.rmtree(full_path)
+                else:
+                    os.remove(full_path)
+    def _migrate_legacy_store(self):
+        """One-time conversion of a store saved as pickled FAISS snapshot + segments"""
+        def load(folder: str) -> FAISS:
+            return FAISS.load_local(folder, self.embeddings, allow_dangerous_deserialization=True)
+        chunks: Dict[str, Tuple[Document, np.ndarray]] = {}
+        def collect(store: FAISS):
+            vectors = ann_index.reconstruct_all(store.index)
+            for position, chunk_id in store.index_to_docstore_id.items():
+                doc = store.docstore.search(chunk_id)
+                if not isinstance(doc, str):  # the docstore answers unknown ids with a message string
+                    chunks[chunk_id] = (doc, vectors[position])
+        if os.path.exists(os.path.join(self.path, "index.faiss")):
+            collect(load(self.path))
+        documents: Dict[str, List[str]] = {}
+        manifest_path = os.path.join(self.path, "manifest.jsonl")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                for record in (json.loads(line) for line in f if line.strip()):
+                    if record["op"] == "add":
+                        if record.get("segment"):
+                            collect(load(os.path.join(self.path, "segments", record["segment"])))
+                        documents.setdefault(record["document_id"], []).extend(record["ids"])
+                    elif record["op"] == "delete":
+                        documents.pop(record["document_id"], None)
+        else:
+            documents = {str(uuid.uuid4()): list(chunks)}
+        for document_id, ids in documents.items():
+            live = [chunks[chunk_id] for chunk_id in ids if chunk_id in chunks]
+            if live:
+                self._append([doc for doc, _ in live], document_id, np.array([vector for _, vector in live]))
+        if self.chunks is not None:
+            self._compact()
+        for name in LEGACY_FILES:
+            legacy_path = os.path.join(self.path, name)
+            if os.path.isdir(legacy_path):
+                shutil.rmtree(legacy_path)
+            elif os.path.exists(legacy_path):
+                os.remove(legacy_path)
+        print(f"🔁 Migrated vector store to the memory-mapped format ({self._document_count} documents)")
+    def add_documents(self, documents: List[Document], replace_existing: bool = True, document_id: Optional[str] = None) -> int:
+        """Add documents to vector store.
+
+        With replace_existing the whole store is rebuilt from these documents.
+        Otherwise the chunks are appended; if document_id is already present,
+        its previous chunks are replaced.
+        """
         try:
             if not documents:
                 raise ValueError("No documents provided")
-            if replace_existing:
-                self.clear_store()
-                self.vector_store = FAISS.from_documents(documents, self.embeddings)
-                self._document_count = len(documents)
-                print(f"🔄 Created new vector store with {len(documents)} documents (replaced existing)")
-            else:
-                if self.vector_store is None:
-                    self.vector_store = FAISS.from_documents(documents, self.embeddings)
-                    self._document_count = len(documents)
-                    print(f"🆕 Created new vector store with {len(documents)} documents")
+            document_id = document_id or str(uuid.uuid4())
+            with self._lock, self._write_lock:
+                self._refresh()
+                if replace_existing:
+                    self.clear_store()
+                    self._append(documents, document_id)
+                    print(f"🔄 Created new vector store with {len(documents)} documents (replaced existing)")
+                else:
+                    if self.has_document(document_id):
+                        self._delete_chunks(document_id)
+                    self._append(documents, document_id)
+                    print(f"➕ Added {len(documents)} documents to store as {document_id}")
+                # Bumped before compacting: the chunks changed even if compaction fails
+                self._corpus_version += 1
+                if replace_existing:
+                    self._compact()
                 else:
-                    self.vector_store.add_documents(documents)
-                    self._document_count += len(documents)
-                    print(f"➕ Added {len(documents)} documents to existing store")
-            self._save_store()
+                    self._maybe_compact()
             return len(documents)
         except Exception as e:
             print(f"❌ Error adding documents: {e}")
             raise ValueError(f"Failed to add documents: {str(e)}")
-    def similarity_search(self, query: str, k: int = None) -> List[Tuple[Document, float]]:
-        """Search for similar documents with relevance scores"""
-        if k is None:
-            k = settings.TOP_K_RESULTS
-        if self.vector_store is None:
-            print("⚠️ No documents in vector store")
-            return []
+    def add_document_stream(
+        self,
+        batches: Iterable[List[Document]],
+        replace_existing: bool = False,
+        document_id: Optional[str] = None
+    ) -> int:
+        """Embed and add chunk batches as they arrive.
+
+        Only the batch being embedded is held in memory; the store itself
+        lives in mapped files. Batches are stored under a staged id and
+        only replace the document's previous chunks (or, with
+        replace_existing, the whole store) once the stream is complete; if
+        parsing or embedding fails part way, the staged chunks are deleted
+        and the previous version is kept. Compaction is checked once at the
+        end rather than per batch.
+        """
         try:
-            results = self.vector_store.similarity_search_with_relevance_scores(query, k=k)
-            print(f"🔍 Found {len(results)} similar documents for query: {query[:50]}...")
-            min_threshold = 0.1
-            filtered_results = [(doc, score) for doc, score in results if score >= min_threshold]
-            return filtered_results
+            document_id = document_id or str(uuid.uuid4())
+            staged_id = f"{STAGED_PREFIX}{uuid.uuid4()}"
+            batches = iter(batches)
+            first_batch = next((batch for batch in batches if batch), None)
+            if first_batch is None:
+                raise ValueError("No documents provided")
+            total = 0
+            try:
+                for batch in itertools.chain([first_batch], batches):
+                    if not batch:
+                        continue
+                    # Embed outside the lock so searches keep running during ingestion
+                    with tracer.stage("embed"):
+                        vectors = self.embeddings.embed_documents([doc.page_content for doc in batch])
+                    with self._lock, self._write_lock:
+                        self._refresh()
+                        self._append(batch, document_id, vectors, stored_as=staged_id)
+                        self._corpus_version += 1
+                    total += len(batch)
+                    print(f"➕ Added batch of {len(batch)} chunks to {document_id} ({total} so far)")
+            except Exception:
+                with self._lock, self._write_lock:
+                    self._refresh()
+                    if total:
+                        self._delete_chunks(staged_id)
+                        self._corpus_version += 1
+                raise
+            with self._lock, self._write_lock:
+                self._refresh()
+                self._forget(self.chunks.publish_staged(staged_id, document_id, replace_existing))
+                self._corpus_version += 1
+                if replace_existing:
+                    print(f"🔄 Replaced vector store contents with {total} chunks of {document_id}")
+                    self._compact()
+                else:
+                    self._maybe_compact()
+            return total
+        except Exception as e:
+            print(f"❌ Error adding documents: {e}")
+            raise ValueError(f"Failed to add documents: {str(e)}")
+    def delete_document(self, document_id: str) -> int:
+        """Delete a single document's chunks, returning how many were removed"""
+        with self._lock, self._write_lock:
+            self._refresh()
+            if not self.has_document(document_id):
+                raise ValueError(f"Document not found: {document_id}")
+            removed = self._delete_chunks(document_id)
+            self._corpus_version += 1
+            self._maybe_compact()
+            print(f"🗑️ Deleted {removed} chunks of document {document_id}")
+            return removed
+    def has_document(self, document_id: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return self.chunks is not None and self.chunks.has_document(document_id)
+    def list_documents(self) -> Dict[str, int]:
+        """Map of document id to its chunk count"""
+        with self._lock:
+            self._refresh()
+            return self.chunks.document_counts() if self.chunks is not None else {}
+    def _tag_documents(self, documents: List[Document], document_id: str):
+        for doc in documents:
+            doc.metadata["document_id"] = document_id
+    def _append(
+        self,
+        documents: List[Document],
+        document_id: str,
+        vectors: Optional[List[List[float]]] = None,
+        stored_as: Optional[str] = None
+    ):
+        """Append chunks at the next positions of the vector file, chunk store and BM25 index.
+
+        stored_as keeps the rows under another (staged) id in the chunk store.
+        """
+        self._tag_documents(documents, document_id)
+        texts = [doc.page_content for doc in documents]
+        if vectors is None:
+            with tracer.stage("embed"):
+                vectors = self.embeddings.embed_documents(texts)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with tracer.stage("save"):
+            self._ensure_store(vectors.shape[1])
+            start = self._position_count
+            # Vectors first: rows past the chunk store's last position are simply overwritten later
+            self.vectors.write(start, vectors)
+            self.chunks.add(start, stored_as or document_id, documents)
+            self.lexical_index.add(list(range(start, start + len(documents))), texts)
+        self._position_count += len(documents)
+        self._document_count += len(documents)
+    def _ensure_store(self, dim: int):
+        if self.chunks is None:
+            self._open_store()
+        if self.vectors is None:
+            vectors_file = f"vectors-{self._meta.get('generation', 0)}.f32"
+            self.chunks.set_meta(dim=dim, vectors_file=vectors_file)
+            self._meta.update(dim=dim, vectors_file=vectors_file)
+            self.vectors = VectorFile(os.path.join(self.path, vectors_file), dim)
+        elif self.vectors.dim != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match the store ({self.vectors.dim})")
+    def _delete_chunks(self, document_id: str) -> int:
+        positions = self.chunks.delete_document(document_id)
+        self._forget(positions)
+        return len(positions)
+    def _forget(self, positions: List[int]):
+        """Mask chunks the chunk store just flagged deleted"""
+        self._deleted.update(positions)
+        self.lexical_index.delete(positions)
+        self._document_count -= len(positions)
+    def _maybe_compact(self):
+        """Compact when too much is deleted or too many chunks were added since the last compaction"""
+        if self.chunks is None:
+            return
+        too_many_deleted = len(self._deleted) > max(self._document_count, 1)
+        too_many_new = self._position_count - self._base_count > settings.VECTOR_STORE_MAX_DELTA_CHUNKS
+        if too_many_deleted or too_many_new:
+            self._compact()
+    def _compact(self):
+        """Write the next generation of files without deleted chunks and switch to it.
+
+        The ANN index is extended in place when only chunks were added and
+        the index type still fits; otherwise it is rebuilt (type change, an
+        IVF index that outgrew its training, or deleted chunks to purge).
+
+        All files of the new generation are written before the chunk store
+        switches to it in one transaction (renumbering rows if chunks were
+        purged). If anything fails up to and including that commit, the new
+        files are removed, the store keeps serving the current generation
+        and the error is raised.
+        """
+        keep = self.chunks.live_positions()
+        purge = len(keep) < self._position_count
+        generation = self._meta.get("generation", 0) + 1
+        meta = {
+            "generation": generation,
+            "base_count": len(keep),
+            "bm25_dir": f"bm25-{generation}",
+            "ann_file": None,
+            "index_type": "flat",
+            "trained_size": 0
+        }
+        vectors = self.vectors
+        try:
+            if purge:
+                meta["vectors_file"] = f"vectors-{generation}.f32"
+                vectors = self.vectors.copy_to(os.path.join(self.path, meta["vectors_file"]), keep)
+            desired = ann_index.choose_index_type(
+                settings.VECTOR_INDEX_TYPE, len(keep), settings.VECTOR_INDEX_AUTO_THRESHOLD
+            )
+            if desired != "flat" and len(keep):
+                current = self._meta.get("index_type", "flat")
+                trained_size = self._meta.get("trained_size", 0)
+                grown = current in ("ivf_flat", "ivf_pq") and len(keep) > trained_size * settings.VECTOR_INDEX_RETRAIN_GROWTH
+                if self.index is not None and not purge and desired == current and not grown:
+                    # Read a private copy (the mapped one is read-only) and add the new rows
+                    index = faiss.read_index(os.path.join(self.path, self._meta["ann_file"]))
+                    index.add(np.ascontiguousarray(vectors.rows(self._base_count, len(keep))))
+                else:
+                    index = ann_index.build_index(
+                        vectors.rows(0, len(keep)),
+                        desired,
+                        nlist=settings.IVF_NLIST,
+                        hnsw_m=settings.HNSW_M,
+                        ef_construction=settings.HNSW_EF_CONSTRUCTION,
+                        pq_m=settings.PQ_M,
+                        pq_nbits=settings.PQ_NBITS
+                    )
+                    trained_size = len(keep)
+                    print(f"🧭 Built {desired} vector index over {len(keep)} vectors (was {current})")
+                meta.update(ann_file=f"ann-{generation}.faiss", index_type=desired, trained_size=trained_size)
+                faiss.write_index(index, os.path.join(self.path, meta["ann_file"]))
+            self.lexical_index.write(os.path.join(self.path, meta["bm25_dir"]), keep)
+            if purge:
+                self.chunks.renumber(**meta)
+            else:
+                self.chunks.set_meta(**meta)
+        except Exception as e:
+            print(f"❌ Error compacting store, keeping generation {generation - 1}: {e}")
+            if vectors is not self.vectors:
+                vectors.close()
+            # Nothing points at the new generation yet, so its files are stale
+            self._remove_stale_files()
+            raise
+        if vectors is not self.vectors:
+            vectors.close()
+        self._corpus_version += 1
+        self._close_store()
+        self._open_store()
+        self._remove_stale_files()
+        print(f"💾 Vector store compacted to generation {generation} ({len(keep)} chunks)")
+
+    def get_index_stats(self) -> dict:
+        """Dense index type, size and search defaults"""
+        with self._lock:
+            self._refresh()
+            if self.index is not None:
+                info = ann_index.describe(self.index)
+            else:
+                info = {"type": "flat" if self.vectors else None, "vectors": self._position_count, "memory_mapped": True}
+                if self.vectors:
+                    info["dimension"] = self.vectors.dim
+            info.update(
+                unindexed=self._position_count - self._base_count if self.index is not None else 0,
+                tombstones=len(self._deleted),
+                trained_size=self._meta.get("trained_size", 0),
+                generation=self._meta.get("generation", 0)
+            )
+            return info
+    def search_hits(
+        self,
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        k: int = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[List[SearchHit]]:
+        """Search for similar chunks for many queries at once, one hit list per query.
+
+        Dense hits and BM25 hits are merged with reciprocal rank fusion when
+        hybrid search is enabled. Each result keeps its dense relevance
+        score; chunks found only lexically are scored by their BM25 score
+        relative to the best lexical hit. nprobe / ef_search override the
+        IVF / HNSW search breadth for these queries only. Hits also carry
+        the chunk's position and stored vector, for context assembly. The
+        dense side is a single index search over the whole query matrix,
+        and the hits of every query are read from the chunk store and
+        vector file in one pass.
+        """
+        with self._lock:
+            self._refresh()
+            if self.vectors is None or not queries:
+                return [[] for _ in queries]
+        try:
+            results = self._search(queries, query_embeddings, k, nprobe, ef_search)
+            print(f"🔍 Found {sum(len(r) for r in results)} similar documents for {len(queries)} queries")
+            return results
         except Exception as e:
             print(f"❌ Error during similarity search: {e}")
-            return []
+            return [[] for _ in queries]
+    def _search(
+        self,
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        k: Optional[int],
+        nprobe: Optional[int],
+        ef_search: Optional[int]
+    ) -> List[List[SearchHit]]:
+        if k is None:
+            k = settings.TOP_K_RESULTS
+        min_threshold = 0.1
+        candidates = max(k, settings.HYBRID_CANDIDATES) if settings.HYBRID_SEARCH_ENABLED else k
+        with self._lock:
+            rankings = []
+            with tracer.stage("vector_search"):
+                dense_rankings = self._dense_search(query_embeddings, candidates, nprobe, ef_search)
+            for query, dense in zip(queries, dense_rankings):
+                lexical = []
+                if settings.HYBRID_SEARCH_ENABLED:
+                    with tracer.stage("lexical_search"):
+                        lexical = self.lexical_index.search(query, candidates)
+                if lexical:
+                    rankings.append(self._fuse(dense, lexical, k, min_threshold))
+                else:
+                    rankings.append([(position, score) for position, score in dense[:k] if score >= min_threshold])
+            positions = sorted({position for ranked in rankings for position, _ in ranked})
+            documents = self.chunks.get(positions, self._meta.get("generation", 0))
+            if documents is None:
+                # Another process compacted the store during the search; search its new generation
+                self._refresh()
+                return self._search(queries, query_embeddings, k, nprobe, ef_search)
+            vectors = dict(zip(positions, self.vectors.take(np.array(positions, dtype=np.int64))))
+        return [
+            [SearchHit(documents[position], score, position, vectors[position]) for position, score in ranked if position in documents]
+            for ranked in rankings
+        ]
+    def _dense_search(
+        self,
+        query_embeddings: List[List[float]],
+        k: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Nearest chunks as (position, relevance score), best first, for each query"""
+        vectors = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        # Over-fetch so deleted chunks do not leave the result short
+        fetch_k = k + min(len(self._deleted), 4 * k)
+        hits: List[List[Tuple[float, int]]] = [[] for _ in range(len(vectors))]
+        exact_from = 0
+        if self.index is not None:
+            params = ann_index.search_parameters(self.index, nprobe, ef_search)
+            if params is not None:
+                distances, positions = self.index.search(vectors, fetch_k, params=params)
+            else:
+                distances, positions = self.index.search(vectors, fetch_k)
+            for row, row_distances, row_positions in zip(hits, distances.tolist(), positions.tolist()):
+                row.extend((distance, position) for distance, position in zip(row_distances, row_positions) if position != -1)
+            exact_from = self._base_count
+        if self._position_count > exact_from:
+            distances, positions = self.vectors.search(vectors, fetch_k, exact_from, self._position_count)
+            for row, row_distances, row_positions in zip(hits, distances.tolist(), positions.tolist()):
+                row.extend(zip(row_distances, row_positions))
+        rankings = []
+        for row in hits:
+            row.sort()
+            results = []
+            for distance, position in row:
+                if position in self._deleted:
+                    continue
+                # Same scale as LangChain's FAISS wrapper uses for (squared) L2 distances
+                results.append((position, 1.0 - distance / math.sqrt(2)))
+                if len(results) == k:
+                    break
+            rankings.append(results)
+        return rankings
+    def _fuse(
+        self,
+        dense: List[Tuple[int, float]],
+        lexical: List[Tuple[int, float]],
+        k: int,
+        min_threshold: float
+    ) -> List[Tuple[int, float]]:
+        """Reciprocal rank fusion of dense and BM25 rankings.
+
+        Order comes from the fusion; the score reported for each hit is its
+        dense relevance, or its BM25 score relative to the best lexical hit
+        when that is higher (lexical-only hits have no usable dense score),
+        clamped to [0, 1].
+        """
+        rrf_k = settings.RRF_K
+        fused: Dict[int, float] = {}
+        for ranking in (dense, lexical):
+            for rank, (position, _) in enumerate(ranking):
+                fused[position] = fused.get(position, 0.0) + 1.0 / (rrf_k + rank + 1)
+        dense_scores = dict(dense)
+        best_lexical = lexical[0][1]
+        lexical_scores = {
+            position: score / best_lexical if best_lexical > 0 else 0.0
+            for position, score in lexical
+        }
+        results = []
+        for position in sorted(fused, key=fused.get, reverse=True):
+            if position in lexical_scores:
+                score = max(dense_scores.get(position, 0.0), lexical_scores[position])
+            elif dense_scores[position] >= min_threshold:
+                score = dense_scores[position]
+            else:
+                continue
+            results.append((position, min(max(score, 0.0), 1.0)))
+            if len(results) == k:
+                break
+        return results
     def get_document_count(self) -> int:
         """Get total number of documents"""
-        return self._document_count
+        with self._lock:
+            self._refresh()
+            return self._document_count
+    def get_memory_estimate(self) -> int:
+        """Approximate bytes the open store can keep resident: its mapped files and the BM25 delta"""
+        with self._lock:
+            size = self.lexical_index.memory_estimate()
+            if self.vectors is not None:
+                size += self._position_count * (self.vectors.dim + 1) * 4
+            if self._meta.get("ann_file"):
+                size += os.path.getsize(os.path.join(self.path, self._meta["ann_file"]))
+            return size
+    def close(self):
+        """Close the store files"""
+        with self._lock:
+            self._close_store()
+            self._write_lock.close()
     def get_status(self) -> str:
         """Get vector store status"""
-        if self.vector_store is None:
-            return "empty"
-        elif self._document_count == 0:
-            return "initialized"
-        else:
-            return "ready"
+        with self._lock:
+            self._refresh()
+            if self.chunks is None:
+                return "empty"
+            elif self._document_count == 0:
+                return "initialized"
+            else:
+                return "ready"
     def clear_store(self):
         """Clear all documents from vector store"""
-        try:
-            self.vector_store = None
-            self._document_count = 0
-            if os.path.exists(settings.VECTOR_STORE_PATH):
-                import shutil
-                shutil.rmtree(settings.VECTOR_STORE_PATH)
-                print("🗑️ Vector store files deleted from disk")
-            print("🗑️ Vector store cleared completely")
-        except Exception as e:
-            print(f"❌ Error clearing store: {e}")
-            self.vector_store = None
-            self._document_count = 0
-    def _save_store(self):
-        """Save vector store to disk"""
-        try:
-            os.makedirs(settings.VECTOR_STORE_PATH, exist_ok=True)
-            if self.vector_store:
-                self.vector_store.save_local(settings.VECTOR_STORE_PATH)
-            count_file = os.path.join(settings.VECTOR_STORE_PATH, "doc_count.pkl")
-            with open(count_file, 'wb') as f:
-                pickle.dump(self._document_count, f)
-            print(f"💾 Vector store saved to {settings.VECTOR_STORE_PATH}")
-        except Exception as e:
-            print(f"❌ Error saving store: {e}")
-vector_store_service = VectorStoreService()
+        with self._lock, self._write_lock:
+            self._corpus_version += 1
+            try:
+                self._close_store()
+                if os.path.exists(self.path):
+                    shutil.rmtree(self.path)
+                    print("🗑️ Vector store files deleted from disk")
+                print("🗑️ Vector store cleared completely")
+            except Exception as e:
+                print(f"❌ Error clearing store: {e}")
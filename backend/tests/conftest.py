@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+# Tests import the backend modules the way main.py does (config, models, services.*)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The LLM service refuses to start without a key; tests never reach the provider
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+# Module-level services open their stores on import; keep them out of the working tree
+_scratch = tempfile.mkdtemp()
+os.environ.setdefault("SUMMARY_STORE_PATH", os.path.join(_scratch, "summaries.sqlite"))
+os.environ.setdefault("ANALYTICS_FILE", os.path.join(_scratch, "analytics.jsonl"))
@@ -0,0 +1,23 @@
+import json
+import pytest
+from config import settings
+from services.analytics import AnalyticsService
+@pytest.fixture
+def analytics(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ANALYTICS_FILE", str(tmp_path / "analytics.jsonl"))
+    service = AnalyticsService()
+    yield service
+    service.close()
+def test_export_is_one_json_document(analytics):
+    analytics.log_upload("notes.txt", 120, 3)
+    analytics.log_upload("report.pdf", 4000, 12)
+    exported = json.loads("".join(analytics.export_analytics()))
+    assert exported["summary"]["total_uploads"] == 2
+    assert [entry["data"]["filename"] for entry in exported["raw_data"]] == ["notes.txt", "report.pdf"]
+def test_export_fails_before_streaming_when_the_summary_fails(analytics, monkeypatch):
+    def broken():
+        raise OSError("disk unavailable")
+    monkeypatch.setattr(analytics, "get_analytics", broken)
+    # Raised by the call itself, while the endpoint can still answer with an error status
+    with pytest.raises(OSError):
+        analytics.export_analytics()
@@ -0,0 +1,14 @@
+import faiss
+import numpy as np
+from services import ann_index
+def test_auto_picks_a_mapped_index_for_large_corpora():
+    assert ann_index.choose_index_type("auto", 1000, 50000) == "flat"
+    assert ann_index.choose_index_type("auto", 60000, 50000) == "ivf_flat"
+    assert ann_index.choose_index_type("hnsw", 60000, 50000) == "hnsw"
+def test_mapped_ivf_index_reports_memory_mapped(tmp_path):
+    vectors = np.random.default_rng(0).random((400, 8), dtype=np.float32)
+    path = str(tmp_path / "ann.faiss")
+    faiss.write_index(ann_index.build_index(vectors, "ivf_flat", nlist=4), path)
+    index = faiss.read_index(path, faiss.IO_FLAG_MMAP)
+    assert ann_index.describe(index)["memory_mapped"] is True
+    assert ann_index.describe(ann_index.build_index(vectors, "hnsw", hnsw_m=8))["memory_mapped"] is False
@@ -0,0 +1,45 @@
+from services.answer_cache import AnswerCache
+from models import QueryResponse
+def response(answer: str, followups=None) -> QueryResponse:
+    return QueryResponse(answer=answer, context="", followup_questions=followups)
+def test_answers_without_followups_are_not_served_when_followups_are_needed():
+    cache = AnswerCache()
+    cache.store([1.0, 0.0], "normal", "en", False, 1, response("batch"))
+    assert cache.lookup([1.0, 0.0], "normal", "en", False, 1, require_followups=True) is None
+    assert cache.lookup([1.0, 0.0], "normal", "en", False, 1).answer == "batch"
+    cache.store([1.0, 0.0], "normal", "en", False, 1, response("interactive", ["Why?"]))
+    cached = cache.lookup([1.0, 0.0], "normal", "en", False, 1, require_followups=True)
+    assert cached.answer == "interactive"
+    assert cached.followup_questions == ["Why?"]
+def test_similar_question_with_same_key_is_a_hit():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.store([1.0, 0.0], "normal", "en", False, 1, response("Lava."))
+    assert cache.lookup([0.99, 0.05], "normal", "en", False, 1).answer == "Lava."
+    assert cache.lookup([1.0, 0.0], "detailed", "en", False, 1) is None
+    assert cache.lookup([1.0, 0.0], "normal", "fr", False, 1) is None
+    assert cache.lookup([1.0, 0.0], "normal", "en", True, 1) is None
+    assert cache.get_stats()["hits"] == 1
+def test_questions_below_the_threshold_miss():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.store([1.0, 0.0], "normal", "en", False, 1, response("Lava."))
+    # cos(45°) ~ 0.71
+    assert cache.lookup([1.0, 1.0], "normal", "en", False, 1) is None
+    assert cache.get_stats()["misses"] == 1
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("services.answer_cache.time.time", lambda: now[0])
+    cache = AnswerCache(ttl_seconds=60)
+    cache.store([1.0, 0.0], "normal", "en", False, 1, response("Lava."))
+    now[0] += 59
+    assert cache.lookup([1.0, 0.0], "normal", "en", False, 1) is not None
+    now[0] += 2
+    assert cache.lookup([1.0, 0.0], "normal", "en", False, 1) is None
+    assert cache.get_stats()["entries"] == 0
+def test_corpus_change_empties_the_cache():
+    cache = AnswerCache()
+    cache.store([1.0, 0.0], "normal", "en", False, 1, response("Lava."))
+    assert cache.lookup([1.0, 0.0], "normal", "en", False, 2) is None
+    assert cache.get_stats()["invalidations"] == 1
+    # An answer generated against the older corpus is not stored
+    cache.store([1.0, 0.0], "normal", "en", False, 1, response("Stale."))
+    assert cache.get_stats()["entries"] == 0
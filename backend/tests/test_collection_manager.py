@@ -0,0 +1,29 @@
+import pytest
+pytest.importorskip("langchain_openai")
+from services.collection_manager import CollectionManager
+def test_least_recently_used_idle_collection_is_evicted(tmp_path):
+    manager = CollectionManager(str(tmp_path), max_open=2)
+    pinned = manager.acquire("geology", create=True)
+    manager.release(manager.acquire("ice", create=True))
+    manager.release(manager.acquire("oceans", create=True))
+    # geology is the least recently used but still in use, so ice goes
+    assert list(manager._open) == ["geology", "oceans"]
+    assert manager.evicted == 1
+    manager.release(pinned)
+    manager.release(manager.acquire("ice"))
+    assert list(manager._open) == ["oceans", "ice"]
+    manager.close()
+def test_collections_in_use_are_kept_over_budget(tmp_path):
+    manager = CollectionManager(str(tmp_path), memory_budget_mb=0, max_open=1)
+    first = manager.acquire("geology", create=True)
+    second = manager.acquire("ice", create=True)
+    assert list(manager._open) == ["geology", "ice"]
+    assert manager.evicted == 0
+    manager.release(first)
+    assert list(manager._open) == ["ice"]
+    manager.release(second)
+    assert list(manager._open) == []
+    # Evicted collections reopen from disk
+    manager.release(manager.acquire("geology"))
+    assert manager.opened == 3
+    manager.close()
@@ -0,0 +1,62 @@
+import numpy as np
+from langchain.schema import Document
+from services.context_builder import ContextBuilder
+from services.tokenizer import count_tokens
+from services.vector_store import SearchHit
+def hit(text: str, score: float, vector, document_id: str = "doc", position: int = 0) -> SearchHit:
+    document = Document(page_content=text, metadata={"document_id": document_id, "page": 1})
+    return SearchHit(document, score, position, np.asarray(vector, dtype=np.float32))
+def _texts(context) -> list:
+    return [document.page_content for document, _ in context]
+def test_mmr_prefers_a_different_chunk_over_a_similar_one():
+    hits = [
+        hit("Lava is molten rock.", 0.9, [1.0, 0.0], "a"),
+        hit("Lava is very hot molten rock.", 0.85, [0.9, 0.44], "b"),
+        hit("Ash clouds travel far.", 0.6, [0.0, 1.0], "c"),
+    ]
+    assert _texts(ContextBuilder(mmr_lambda=0.5).build(hits, k=2)) == ["Lava is molten rock.", "Ash clouds travel far."]
+    # Relevance alone keeps the two lava chunks
+    assert _texts(ContextBuilder(mmr_lambda=1.0).build(hits, k=2)) == ["Lava is molten rock.", "Lava is very hot molten rock."]
+def test_repeated_and_near_duplicate_chunks_are_dropped():
+    hits = [
+        hit("Lava is molten rock.", 0.9, [1.0, 0.0], "a"),
+        hit("lava is   molten rock.", 0.8, [0.0, 1.0], "b"),
+        hit("Molten rock is called lava.", 0.7, [0.99, 0.05], "c"),
+        hit("Ash clouds travel far.", 0.6, [0.0, 1.0], "d"),
+    ]
+    assert _texts(ContextBuilder(mmr_lambda=1.0).build(hits, k=4)) == ["Lava is molten rock.", "Ash clouds travel far."]
+def test_consecutive_chunks_are_merged_without_the_repeated_overlap():
+    first = "Volcanoes form where magma reaches the surface through vents."
+    second = "reaches the surface through vents. Eruptions can be explosive."
+    hits = [
+        hit(second, 0.9, [1.0, 0.0], position=5),
+        hit("Unrelated chunk about glaciers and ice.", 0.8, [0.0, 1.0], "other"),
+        hit(first, 0.7, [0.0, -1.0], position=4),
+    ]
+    context = ContextBuilder(mmr_lambda=1.0).build(hits, k=3)
+    assert _texts(context) == [
+        "Volcanoes form where magma reaches the surface through vents. Eruptions can be explosive.",
+        "Unrelated chunk about glaciers and ice."
+    ]
+    document, score = context[0]
+    assert document.metadata["merged_chunks"] == 2
+    assert score == 0.9
+def test_blocks_are_packed_into_the_token_budget():
+    first = "Lava flows downhill. " * 20
+    second = "Ash clouds travel far. " * 20
+    third = "Glaciers carve valleys. " * 20
+    hits = [
+        hit(first, 0.9, [1.0, 0.0, 0.0], "a"),
+        hit(second, 0.8, [0.0, 1.0, 0.0], "b"),
+        hit(third, 0.7, [0.0, 0.0, 1.0], "c"),
+    ]
+    budget = count_tokens(first) + 10
+    builder = ContextBuilder(max_tokens=budget, mmr_lambda=1.0, min_chunk_tokens=5)
+    context = builder.build(hits, k=3)
+    # The first block fits whole, the second is cut to what is left, the third does not fit
+    assert [document.metadata["document_id"] for document, _ in context] == ["a", "b"]
+    assert context[1][0].metadata["truncated"]
+    assert sum(count_tokens(document.page_content) for document, _ in context) <= budget
+    # Too little room left for a useful piece: the second block is left out instead
+    context = ContextBuilder(max_tokens=budget, mmr_lambda=1.0, min_chunk_tokens=20).build(hits, k=3)
+    assert _texts(context) == [first]
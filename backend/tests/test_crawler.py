@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from services.crawler import WebCrawler
+from services.document_processor import document_processor
+class SiteHandler(BaseHTTPRequestHandler):
+    """Serves a small site: a chain of pages for depth, a redirect, an off-host link and a sitemap"""
+    pages = {
+        "/": '<a href="/a">a</a> <a href="/old">old</a> <a href="http://localhost:{port}/elsewhere">elsewhere</a>',
+        "/a": '<a href="/a/deep">deep</a> <a href="/">home</a>',
+        "/a/deep": '<a href="/a/deeper">deeper</a>',
+        "/a/deeper": "too deep",
+        "/listed": "only in the sitemap",
+        "/elsewhere": "other host",
+    }
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requested.append(self.path)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(0.05)
+            if self.path == "/old":
+                self.send_response(301)
+                self.send_header("Location", "/a")
+                self.end_headers()
+                return
+            if self.path == "/sitemap.xml":
+                port = server.server_address[1]
+                body = f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"><url><loc>http://127.0.0.1:{port}/listed</loc></url></urlset>'
+                self._send(body, "application/xml")
+                return
+            if self.path not in self.pages:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self._send(self.pages[self.path].format(port=server.server_address[1]), "text/html")
+        finally:
+            with server.lock:
+                server.active -= 1
+    def _send(self, body: str, content_type: str):
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    def log_message(self, *args):
+        pass
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    server.lock = threading.Lock()
+    server.requested = []
+    server.active = 0
+    server.max_active = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+async def _crawl(crawler, url, **kwargs):
+    try:
+        return [page async for page in crawler.crawl(url, **kwargs)]
+    finally:
+        await crawler.close()
+def test_crawl_follows_depth_host_and_sitemap(site):
+    base = f"http://127.0.0.1:{site.server_address[1]}"
+    crawler = WebCrawler(concurrency=8, per_host_concurrency=2, timeout_seconds=5, max_retries=1)
+    pages = asyncio.run(_crawl(crawler, base + "/", max_pages=20, max_depth=2))
+    urls = sorted(page.url for page in pages)
+    assert urls == [base + "/", base + "/a", base + "/a/deep", base + "/listed"]
+    assert {page.depth for page in pages if page.url == base + "/listed"} == {1}
+    # Beyond max_depth and off-host links are never requested
+    assert "/a/deeper" not in site.requested
+    assert "/elsewhere" not in site.requested
+    # /old redirects to /a, which is crawled (and yielded) only once
+    assert "/old" in site.requested
+    assert site.max_active <= 2
+def test_crawl_without_sitemap(site):
+    base = f"http://127.0.0.1:{site.server_address[1]}"
+    crawler = WebCrawler(concurrency=4, per_host_concurrency=4, timeout_seconds=5, max_retries=1)
+    pages = asyncio.run(_crawl(crawler, base + "/", max_pages=20, max_depth=1, use_sitemap=False))
+    assert sorted(page.url for page in pages) == [base + "/", base + "/a"]
+    assert "/sitemap.xml" not in site.requested
+def test_conditional_fetches_share_the_per_host_limit(site):
+    base = f"http://127.0.0.1:{site.server_address[1]}"
+    crawler = WebCrawler(concurrency=8, per_host_concurrency=2, timeout_seconds=5, max_retries=1)
+    async def fetch_all():
+        try:
+            return await asyncio.gather(*(crawler.fetch_conditional(base + "/a") for _ in range(6)))
+        finally:
+            await crawler.close()
+    responses = asyncio.run(fetch_all())
+    assert [response.status_code for response in responses] == [200] * 6
+    assert site.max_active <= 2
+def test_local_and_intranet_urls_are_valid():
+    assert document_processor._is_valid_url("http://localhost:8000/docs")
+    assert document_processor._is_valid_url("http://wiki/start")
+    assert document_processor._is_valid_url("example.com/page")
+    assert not document_processor._is_valid_url("http://")
+    assert not document_processor._is_valid_url("ftp://example.com")
@@ -0,0 +1,39 @@
+from typing import List
+import pytest
+from langchain_core.embeddings import Embeddings
+from services.embedding_cache import CachedEmbeddings
+class CountingEmbeddings(Embeddings):
+    """Embeds "text N" as [N, 1, 0, 0] and counts how many texts it was asked for"""
+    def __init__(self):
+        self.embedded = 0
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded += len(texts)
+        return [[float(text.split()[-1]), 1.0, 0.0, 0.0] for text in texts]
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+@pytest.fixture
+def base():
+    return CountingEmbeddings()
+def test_batch_larger_than_the_cache_is_embedded_and_partly_cached(tmp_path, base):
+    cache = CachedEmbeddings(base, "test-model", str(tmp_path), max_entries=4)
+    texts = [f"text {i}" for i in range(10)]
+    assert [vector[0] for vector in cache.embed_documents(texts)] == list(range(10))
+    assert cache.get_stats()["entries"] == 4
+    # A second oversized batch evicts the first one's entries and still fits what it can
+    more = [f"text {i}" for i in range(10, 20)]
+    assert [vector[0] for vector in cache.embed_documents(more)] == list(range(10, 20))
+    assert cache.get_stats()["entries"] <= 4
+def test_recent_hits_survive_eviction(tmp_path, base):
+    cache = CachedEmbeddings(base, "test-model", str(tmp_path), max_entries=4)
+    cache.embed_documents([f"text {i}" for i in range(4)])
+    cache.embed_documents(["text 0"])
+    cache.embed_documents(["text 9"])
+    embedded = base.embedded
+    assert cache.embed_documents(["text 0"]) == [[0.0, 1.0, 0.0, 0.0]]
+    assert base.embedded == embedded
+def test_hits_are_served_from_disk_after_reopening(tmp_path, base):
+    CachedEmbeddings(base, "test-model", str(tmp_path), max_entries=8).embed_documents(["text 1", "text 2"])
+    reopened = CachedEmbeddings(base, "test-model", str(tmp_path), max_entries=8)
+    assert reopened.embed_documents(["text 2", "text 1"]) == [[2.0, 1.0, 0.0, 0.0], [1.0, 1.0, 0.0, 0.0]]
+    assert base.embedded == 2
+    assert reopened.get_stats()["hits"] == 2
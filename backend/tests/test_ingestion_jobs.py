@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from services.ingestion_jobs import IngestionJob, IngestionJobQueue
+def _job(name: str) -> IngestionJob:
+    return IngestionJob(f"Text: {name}", name, "default")
+def test_full_queue_turns_jobs_away_until_workers_catch_up():
+    async def run():
+        queue = IngestionJobQueue(workers=1, max_queued=1)
+        release = asyncio.Event()
+        async def runner(job):
+            await release.wait()
+            return {"document_id": job.document_id}
+        first = queue.submit(_job("first"), runner)
+        await asyncio.sleep(0)
+        # The worker holds the first job; one more fits in the queue
+        second = queue.submit(_job("second"), runner)
+        with pytest.raises(asyncio.QueueFull):
+            queue.submit(_job("third"), runner)
+        assert queue.get_stats()["rejected"] == 1
+        assert [job.document_id for job in queue.list_jobs()] == ["first", "second"]
+        release.set()
+        await queue._queue.join()
+        await queue.close()
+        return first, second
+    first, second = asyncio.run(run())
+    assert (first.status, second.status) == ("completed", "completed")
+    assert second.result == {"document_id": "second"}
+def test_failed_job_records_its_error():
+    async def run():
+        queue = IngestionJobQueue(workers=1)
+        async def runner(job):
+            raise ValueError("No text content found")
+        job = queue.submit(_job("empty"), runner)
+        await queue._queue.join()
+        await queue.close()
+        return job
+    job = asyncio.run(run())
+    assert job.status == "failed"
+    assert job.error == "No text content found"
+    assert job.finished_at is not None
+def test_upload_returns_503_when_the_queue_is_full(monkeypatch):
+    pytest.importorskip("langchain_openai")
+    from fastapi.testclient import TestClient
+    import main
+    # No workers: queued jobs stay queued
+    monkeypatch.setattr(main, "ingestion_queue", IngestionJobQueue(workers=0, max_queued=1))
+    client = TestClient(main.app)
+    accepted = client.post("/upload", data={"text": "Lava is molten rock. " * 10})
+    assert accepted.status_code == 202
+    assert accepted.json()["status"] == "queued"
+    rejected = client.post("/upload", data={"text": "Ash clouds travel far. " * 10})
+    assert rejected.status_code == 503
+    assert rejected.headers["retry-after"] == str(main.settings.INGEST_RETRY_AFTER_SECONDS)
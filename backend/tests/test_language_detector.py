@@ -0,0 +1,21 @@
+import pytest
+from services.language_detector import detect_language
+@pytest.mark.parametrize("text, language", [
+    ("The volcano is active and the lava flows down to the sea, which is why it is dangerous.", "en"),
+    ("El volcán está activo y la lava baja hasta el mar, por eso es peligroso para los pueblos.", "es"),
+    ("Le volcan est actif et la lave descend vers la mer, ce qui est dangereux pour les villages.", "fr"),
+    ("Der Vulkan ist aktiv und die Lava fließt zum Meer, was für die Dörfer gefährlich ist.", "de"),
+    ("Il vulcano è attivo e la lava scende fino al mare, per questo è pericoloso per i paesi.", "it"),
+    ("O vulcão está ativo e a lava desce até o mar, por isso é perigoso para as aldeias.", "pt"),
+    ("Вулкан активен, и лава стекает к морю, поэтому он опасен для деревень.", "ru"),
+    ("火山は活動中で、溶岩が海まで流れているので、村にとって危険です。", "ja"),
+    ("화산이 활동 중이며 용암이 바다까지 흘러 마을에 위험합니다.", "ko"),
+    ("火山正在活动，熔岩流向大海，因此对村庄很危险，需要疏散居民。", "zh"),
+])
+def test_detects_supported_languages(text, language):
+    assert detect_language(text) == language
+def test_quoted_latin_text_does_not_hide_japanese():
+    assert detect_language("Das Handbuch nennt es «Eruption», 日本語では噴火と言います。") == "ja"
+def test_short_or_undecided_text_is_unknown():
+    assert detect_language("Lava!") is None
+    assert detect_language("ERR-404 0x1F 192.168.0.1 https://example.com/status") is None
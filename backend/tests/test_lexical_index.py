@@ -0,0 +1,42 @@
+import math
+import pytest
+from services.lexical_index import BM25Index, tokenize
+TEXTS = [
+    "lava lava lava",
+    "lava flows downhill from the crater",
+    "glaciers carve valleys",
+]
+def _bm25(frequency: int, length: int, df: int, count: int, avg_length: float, k1: float = 1.5, b: float = 0.75) -> float:
+    idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+    return idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / avg_length))
+def test_compound_tokens_are_kept_whole_and_split():
+    assert tokenize("Error ERR-404 in v1.2") == ["error", "err-404", "err", "404", "in", "v1.2", "v1", "2"]
+def test_scores_follow_bm25():
+    index = BM25Index()
+    index.add([0, 1, 2], TEXTS)
+    avg_length = (3 + 6 + 3) / 3
+    hits = index.search("lava", 5)
+    assert [position for position, _ in hits] == [0, 1]
+    assert hits[0][1] == pytest.approx(_bm25(3, 3, 2, 3, avg_length))
+    assert hits[1][1] == pytest.approx(_bm25(1, 6, 2, 3, avg_length))
+    # Scores of the query terms add up
+    both = dict(index.search("lava crater", 5))
+    assert both[1] == pytest.approx(_bm25(1, 6, 2, 3, avg_length) + _bm25(1, 6, 1, 3, avg_length))
+def test_deleted_chunks_are_not_matched_or_counted():
+    index = BM25Index()
+    index.add([0, 1, 2], TEXTS)
+    index.delete([0])
+    hits = index.search("lava", 5)
+    assert [position for position, _ in hits] == [1]
+    assert hits[0][1] == pytest.approx(_bm25(1, 6, 1, 2, (6 + 3) / 2))
+def test_written_base_scores_like_the_delta(tmp_path):
+    index = BM25Index()
+    index.add([0, 1, 2], TEXTS)
+    expected = index.search("lava valleys", 5)
+    index.write(str(tmp_path), [0, 1, 2])
+    reopened = BM25Index()
+    assert reopened.open(str(tmp_path))
+    assert reopened.search("lava valleys", 5) == pytest.approx(expected)
+    # New chunks go to the delta on top of the mapped base
+    reopened.add([3], ["valleys of lava"])
+    assert {position for position, _ in reopened.search("valleys", 5)} == {2, 3}
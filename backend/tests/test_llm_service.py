@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from langchain.schema import Document
+from services.llm_service import LLMService, FOLLOWUP_MARKER, _marker_prefix_length
+CONTEXT = [(Document(page_content="Lava is molten rock.", metadata={"source": "volcanoes.pdf"}), 0.8)]
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr("services.llm_service.settings.FOLLOWUPS_IN_ANSWER", True)
+    return LLMService()
+def _streaming(*deltas):
+    """_acomplete stand-in streaming the given content deltas"""
+    async def acomplete(priority, **kwargs):
+        async def chunks():
+            for delta in deltas:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+        return chunks()
+    return acomplete
+async def _collect(events):
+    return [event async for event in events]
+def _stream_events(service, *deltas):
+    service._acomplete = _streaming(*deltas)
+    return asyncio.run(_collect(service.astream_answer("What is lava?", CONTEXT)))
+def test_split_followups_strips_bullets_and_caps_the_count(service):
+    text = "Lava is hot.\n[[followups]]\n1. What is magma made of?\n- Where do volcanoes form?\n* How hot does lava get?\n• Can lava be cooled?\n5) Is obsidian lava?"
+    answer, questions = service._split_followups(text)
+    assert answer == "Lava is hot."
+    assert questions == ["What is magma made of?", "Where do volcanoes form?", "How hot does lava get?", "Can lava be cooled?"]
+def test_split_followups_falls_back_without_a_usable_section(service):
+    assert service._split_followups("Lava is hot.") == ("Lava is hot.", None)
+    # One question, or lines too short to be questions, are not enough
+    assert service._split_followups(f"Lava is hot.\n{FOLLOWUP_MARKER}\nWhat is magma made of?\nWhy?") == ("Lava is hot.", None)
+def test_marker_prefix_length():
+    assert _marker_prefix_length("Lava is hot.\n[[FOLL") == len("[[FOLL")
+    assert _marker_prefix_length("Lava is hot. [") == 1
+    assert _marker_prefix_length("Lava is hot.") == 0
+def test_stream_holds_back_the_followup_section(service):
+    events = _stream_events(
+        service, "Lava is ", "hot.\n[[FOLL", "OWUPS]]\n- What is magma made of?\n", "- Where do volcanoes form?"
+    )
+    tokens = "".join(event["text"] for event in events if event["event"] == "token")
+    assert tokens == "Lava is hot.\n"
+    followups = next(event for event in events if event["event"] == "followups")
+    assert followups["followup_questions"] == ["What is magma made of?", "Where do volcanoes form?"]
+    assert events[-1]["event"] == "done"
+    assert events[-1]["answer"] == "Lava is hot."
+def test_stream_releases_held_text_that_is_not_the_marker(service):
+    async def followups(question, answer, **kwargs):
+        return ["What is magma made of?", "Where do volcanoes form?"]
+    service.agenerate_followup_questions = followups
+    events = _stream_events(service, "Array [", "0] is ", "the first [[")
+    tokens = "".join(event["text"] for event in events if event["event"] == "token")
+    assert tokens == "Array [0] is the first [["
+    assert events[-1]["answer"] == "Array [0] is the first [["
+def _answering(text: str, calls: list):
+    """_acomplete stand-in answering text, translating by tagging it, and recording which calls were made"""
+    async def acomplete(priority, **kwargs):
+        system = kwargs["messages"][0]["content"]
+        kind = "translation" if "translator" in system else "answer"
+        calls.append(kind)
+        content = f"(es) {kwargs['messages'][-1]['content']}" if kind == "translation" else text
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+    return acomplete
+def test_answer_already_in_the_requested_language_is_not_translated(service, monkeypatch):
+    monkeypatch.setattr("services.llm_service.settings.TRANSLATION_FALLBACK", True)
+    calls = []
+    spanish = "La lava es roca fundida que sale del volcán y se enfría para formar nuevas rocas."
+    service._acomplete = _answering(spanish, calls)
+    response = asyncio.run(service.agenerate_answer("¿Qué es la lava?", CONTEXT, language="es"))
+    assert response.answer == spanish
+    assert calls == ["answer"]
+    assert service.get_translation_stats()["skipped"] == 1
+def test_answer_in_another_language_falls_back_to_translation(service, monkeypatch):
+    monkeypatch.setattr("services.llm_service.settings.TRANSLATION_FALLBACK", True)
+    calls = []
+    english = "Lava is molten rock that comes out of the volcano and cools to form new rocks."
+    service._acomplete = _answering(english, calls)
+    response = asyncio.run(service.agenerate_answer("¿Qué es la lava?", CONTEXT, language="es"))
+    assert response.answer == f"(es) {english}"
+    assert calls == ["answer", "translation"]
+    assert service.get_translation_stats()["translated"] == 1
+    # Without the fallback the answer is kept as generated
+    monkeypatch.setattr("services.llm_service.settings.TRANSLATION_FALLBACK", False)
+    calls.clear()
+    assert asyncio.run(service.agenerate_answer("¿Qué es la lava?", CONTEXT, language="es")).answer == english
+    assert calls == ["answer"]
+def test_stream_ends_with_error_when_the_provider_fails(service):
+    followup_calls = []
+    async def followups(question, answer, **kwargs):
+        followup_calls.append(answer)
+        return ["What is magma made of?", "Where do volcanoes form?"]
+    service.agenerate_followup_questions = followups
+    async def acomplete(priority, **kwargs):
+        async def chunks():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="Lava is "))])
+            raise ConnectionError("connection reset")
+        return chunks()
+    service._acomplete = acomplete
+    events = asyncio.run(_collect(service.astream_answer("What is lava?", CONTEXT)))
+    assert [event["event"] for event in events] == ["sources", "token", "error"]
+    assert "connection reset" in events[-1]["detail"]
+    assert followup_calls == []
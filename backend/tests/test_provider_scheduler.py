@@ -0,0 +1,142 @@
+import time
+import socket
+import asyncio
+import threading
+from types import SimpleNamespace
+import pytest
+import uvicorn
+from openai import AsyncOpenAI
+import fake_provider
+from services import provider_scheduler
+from services.provider_scheduler import ProviderScheduler, PRIORITY_ANSWER, PRIORITY_FOLLOWUP, PRIORITY_BACKGROUND
+from services.tokenizer import count_message_tokens, count_tokens
+MESSAGES = [{"role": "user", "content": "Tell me about volcanoes."}]
+def _chunk(content=None, usage=None):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=usage)
+def _streaming(chunks):
+    async def create(**kwargs):
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+        return stream()
+    return create
+def _scheduler():
+    scheduler = ProviderScheduler(tokens_per_minute=100000)
+    # Freeze the refill so the balance only reflects what was taken and given back
+    scheduler.tokens._refill = lambda: None
+    return scheduler
+async def _consume(scheduler, chunks, limit=None):
+    stream = await scheduler.call(_streaming(chunks), messages=MESSAGES, max_tokens=500, stream=True)
+    seen = 0
+    async for _ in stream:
+        seen += 1
+        if seen == limit:
+            break
+    await stream.aclose()
+def test_stream_settles_with_usage_from_final_chunk():
+    scheduler = _scheduler()
+    chunks = [_chunk("Lava "), _chunk("flows."), _chunk(usage=SimpleNamespace(total_tokens=40))]
+    asyncio.run(_consume(scheduler, chunks))
+    assert scheduler.in_flight == 0
+    assert scheduler.tokens.available == 100000 - 40
+def test_stream_without_usage_settles_with_estimate():
+    scheduler = _scheduler()
+    chunks = [_chunk("Lava "), _chunk("flows "), _chunk("downhill.")]
+    asyncio.run(_consume(scheduler, chunks, limit=2))
+    # Closed after two chunks: only the text actually streamed is counted
+    expected = count_message_tokens(MESSAGES) + count_tokens("Lava flows ")
+    assert scheduler.in_flight == 0
+    assert scheduler.tokens.available == 100000 - expected
+@pytest.fixture(scope="module")
+def provider_url():
+    """fake_provider.py served on a free local port for the module's tests"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(fake_provider.app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}/v1"
+    server.should_exit = True
+    thread.join()
+@pytest.fixture
+def provider(provider_url):
+    fake_provider.options.latency, fake_provider.options.rpm, fake_provider.options.error_rate = 0.0, 0, 0.0
+    fake_provider.recent_requests.clear()
+    return provider_url
+def _recording(client, sent):
+    """create() factory that records (tag, time) each time a call goes out to the provider"""
+    def tagged(tag):
+        async def create(**kwargs):
+            sent.append((tag, time.monotonic()))
+            return await client.chat.completions.create(model="fake", **kwargs)
+        return create
+    return tagged
+async def _with_client(provider, run):
+    client = AsyncOpenAI(api_key="test-key", base_url=provider, max_retries=0)
+    try:
+        return await run(client)
+    finally:
+        await client.close()
+def test_rate_limit_pauses_queue_for_retry_after(provider):
+    # Two requests a minute, both spent 59.5s ago: the first call is told to retry after under 0.5s
+    fake_provider.options.rpm = 2
+    fake_provider.recent_requests.extend([time.monotonic() - 59.5] * 2)
+    scheduler = ProviderScheduler(backoff_base_seconds=0.05)
+    sent = []
+    async def run(client):
+        create = _recording(client, sent)
+        answer = asyncio.create_task(scheduler.call(create("answer"), messages=MESSAGES, max_tokens=50))
+        while not scheduler.rate_limited:
+            await asyncio.sleep(0.01)
+        followup = await scheduler.call(create("followup"), PRIORITY_FOLLOWUP, messages=MESSAGES, max_tokens=50)
+        return await answer, followup
+    answer, followup = asyncio.run(_with_client(provider, run))
+    assert answer.choices[0].message.content and followup.choices[0].message.content
+    # The follow-up waited out the pause behind the retried answer instead of drawing a second 429
+    assert [tag for tag, _ in sent] == ["answer", "answer", "followup"]
+    assert sent[1][1] - sent[0][1] >= 0.3
+    assert scheduler.rate_limited == 1
+    assert scheduler.retries == 1
+def test_server_errors_are_retried_with_jittered_backoff(provider, monkeypatch):
+    fake_provider.options.error_rate = 1.0
+    drawn = []
+    uniform = provider_scheduler.random.uniform
+    def recording_uniform(low, high):
+        drawn.append((low, high, uniform(low, high)))
+        return drawn[-1][2]
+    monkeypatch.setattr(provider_scheduler.random, "uniform", recording_uniform)
+    scheduler = ProviderScheduler(backoff_base_seconds=0.1)
+    sent = []
+    async def run(client):
+        create = _recording(client, sent)
+        async def flaky(**kwargs):
+            # Two 503s, then the provider recovers
+            if len(sent) == 2:
+                fake_provider.options.error_rate = 0.0
+            return await create("answer")(**kwargs)
+        return await scheduler.call(flaky, messages=MESSAGES, max_tokens=50)
+    response = asyncio.run(_with_client(provider, run))
+    assert response.choices[0].message.content.startswith("This is a canned answer")
+    assert scheduler.retries == 2
+    # Full jitter: each delay is drawn from [0, base * 2^attempt], and the retry waited it out
+    assert [(low, high) for low, high, _ in drawn] == [(0, 0.1), (0, 0.2)]
+    for (_, previous), (_, retried), (_, _, delay) in zip(sent, sent[1:], drawn):
+        assert retried - previous >= delay
+def test_answers_go_out_before_followups_and_batch_calls(provider):
+    fake_provider.options.latency = 0.2
+    scheduler = ProviderScheduler(max_concurrency=1)
+    sent = []
+    async def run(client):
+        create = _recording(client, sent)
+        def call(tag, priority):
+            return asyncio.create_task(scheduler.call(create(tag), priority, messages=MESSAGES, max_tokens=50))
+        calls = [call("summary", PRIORITY_BACKGROUND)]
+        while not scheduler.in_flight:
+            await asyncio.sleep(0.01)
+        # Queued while the summary holds the only slot, lowest priority first
+        calls += [call("batch", PRIORITY_BACKGROUND), call("followup", PRIORITY_FOLLOWUP), call("answer", PRIORITY_ANSWER)]
+        await asyncio.gather(*calls)
+    asyncio.run(_with_client(provider, run))
+    assert [tag for tag, _ in sent] == ["summary", "answer", "followup", "batch"]
@@ -0,0 +1,23 @@
+import time
+from langchain.schema import Document
+from services.summaries import SummaryService
+def _with_cached_summary(service: SummaryService, documents, summary: str):
+    digest = service._content_hash(documents)
+    service._db.execute("INSERT INTO summaries (content_hash, summary, created_at) VALUES (?, ?, ?)", (digest, summary, time.time()))
+    service._db.commit()
+def test_same_document_id_in_two_collections(tmp_path):
+    service = SummaryService(str(tmp_path / "summaries.sqlite"))
+    first = [Document(page_content="Volcanoes erupt lava and ash. " * 5)]
+    second = [Document(page_content="Glaciers carve valleys slowly. " * 5)]
+    _with_cached_summary(service, first, "About volcanoes.")
+    _with_cached_summary(service, second, "About glaciers.")
+    assert service.schedule("geology", "doc-1", first) == "About volcanoes."
+    assert service.schedule("ice", "doc-1", second) == "About glaciers."
+    assert service.get("geology", "doc-1")["summary"] == "About volcanoes."
+    assert service.get("ice", "doc-1")["summary"] == "About glaciers."
+    assert service.get("default", "doc-1")["status"] == "missing"
+    service.remove_collection("ice")
+    assert service.get("ice", "doc-1")["status"] == "missing"
+    assert service.get("geology", "doc-1")["status"] == "ready"
+    service.remove_document("geology", "doc-1")
+    assert service.get("geology", "doc-1")["status"] == "missing"
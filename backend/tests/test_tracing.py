@@ -0,0 +1,39 @@
+import asyncio
+from services.tracing import Tracer
+def test_render_prometheus_writes_cumulative_buckets_per_stage():
+    tracer = Tracer(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.5, 2.0):
+        tracer.observe("llm_answer", seconds)
+    tracer.observe("embed_query", 0.01)
+    assert tracer.render_prometheus() == "\n".join([
+        "# HELP rag_stage_duration_seconds Time spent in each stage of query answering and document ingestion",
+        "# TYPE rag_stage_duration_seconds histogram",
+        'rag_stage_duration_seconds_bucket{stage="embed_query",le="0.1"} 1',
+        'rag_stage_duration_seconds_bucket{stage="embed_query",le="1"} 1',
+        'rag_stage_duration_seconds_bucket{stage="embed_query",le="+Inf"} 1',
+        'rag_stage_duration_seconds_sum{stage="embed_query"} 0.010000',
+        'rag_stage_duration_seconds_count{stage="embed_query"} 1',
+        'rag_stage_duration_seconds_bucket{stage="llm_answer",le="0.1"} 1',
+        'rag_stage_duration_seconds_bucket{stage="llm_answer",le="1"} 3',
+        'rag_stage_duration_seconds_bucket{stage="llm_answer",le="+Inf"} 4',
+        'rag_stage_duration_seconds_sum{stage="llm_answer"} 3.050000',
+        'rag_stage_duration_seconds_count{stage="llm_answer"} 4',
+    ]) + "\n"
+def test_render_prometheus_without_observations_has_only_the_header():
+    assert Tracer().render_prometheus().splitlines() == [
+        "# HELP rag_stage_duration_seconds Time spent in each stage of query answering and document ingestion",
+        "# TYPE rag_stage_duration_seconds histogram"
+    ]
+def test_request_breakdown_follows_tasks_and_adds_up_repeated_stages():
+    tracer = Tracer()
+    async def embed():
+        tracer.observe("embed", 0.002)
+    async def run():
+        timings = tracer.start_request()
+        tracer.observe("embed", 0.001)
+        await asyncio.gather(asyncio.create_task(embed()))
+        return timings
+    assert asyncio.run(run()) == {"embed": 3.0}
+    # Outside that request nothing is collected, but the histogram still counts
+    tracer.observe("embed", 0.001)
+    assert tracer.get_stats()["embed"]["count"] == 3
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+from typing import List
+import numpy as np
+import pytest
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from services.vector_store import VectorStoreService
+class KeywordEmbeddings(Embeddings):
+    """Texts containing "volcano" point one way and everything else the opposite way"""
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(8, dtype=np.float32)
+        vector[0] = 1.0 if "volcano" in text else -1.0
+        return vector.tolist()
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+def test_fuse_scores_lexical_only_hit_by_bm25():
+    store = VectorStoreService.__new__(VectorStoreService)
+    dense = [(0, 0.9), (1, 0.05)]
+    lexical = [(2, 8.0), (1, 4.0)]
+    fused = dict(store._fuse(dense, lexical, k=3, min_threshold=0.1))
+    assert fused[0] == 0.9
+    # Lexical-only: normalized BM25 score
+    assert fused[2] == 1.0
+    # Dense score below the threshold: the BM25 score wins
+    assert fused[1] == 0.5
+def test_fuse_orders_by_reciprocal_rank(monkeypatch):
+    monkeypatch.setattr("services.vector_store.settings.RRF_K", 60)
+    store = VectorStoreService.__new__(VectorStoreService)
+    dense = [(0, 0.9), (1, 0.8), (2, 0.7)]
+    lexical = [(2, 6.0), (3, 5.0)]
+    # 2: 1/63 + 1/61, 0: 1/61, 1: 1/62, 3: 1/62 (ties keep dense first)
+    assert [position for position, _ in store._fuse(dense, lexical, k=4, min_threshold=0.1)] == [2, 0, 1, 3]
+    assert [position for position, _ in store._fuse(dense, lexical, k=2, min_threshold=0.1)] == [2, 0]
+def test_fuse_clamps_negative_dense_scores():
+    store = VectorStoreService.__new__(VectorStoreService)
+    fused = store._fuse([(0, -0.414)], [(0, 0.0)], k=1, min_threshold=0.1)
+    assert fused == [(0, 0.0)]
+def test_search_scores_stay_in_unit_range_for_bm25_matches(tmp_path):
+    store = VectorStoreService(str(tmp_path / "store"), KeywordEmbeddings())
+    store.add_documents([
+        Document(page_content="The volcano erupted with hot lava flows.", metadata={"source": "a"}),
+        Document(page_content="Xylophone lessons are held every Tuesday.", metadata={"source": "b"}),
+    ], replace_existing=False, document_id="doc")
+    query = "volcano xylophone"
+    hits = store.search_hits([query], [store.embeddings.embed_query(query)], 5)[0]
+    sources = {hit.document.metadata["source"]: hit.score for hit in hits}
+    # The xylophone chunk points away from the query vector but matches in BM25
+    assert "b" in sources
+    assert all(0.0 <= score <= 1.0 for score in sources.values())
+    store.close()
+def _store_with_deleted_chunks(tmp_path) -> VectorStoreService:
+    store = VectorStoreService(str(tmp_path / "store"), KeywordEmbeddings())
+    store.add_documents([Document(page_content=f"volcano note {i}", metadata={"source": "a"}) for i in range(3)], False, "a")
+    store.add_documents([Document(page_content=f"other note {i}", metadata={"source": "b"}) for i in range(3)], False, "b")
+    store.delete_document("a")
+    return store
+def _search_sources(store: VectorStoreService, query: str) -> list:
+    hits = store.search_hits([query], [store.embeddings.embed_query(query)], 5)[0]
+    return sorted(hit.document.page_content for hit in hits)
+def test_failed_compaction_keeps_current_generation(tmp_path, monkeypatch):
+    store = _store_with_deleted_chunks(tmp_path)
+    before = _search_sources(store, "other note")
+    files_before = sorted(os.listdir(store.path))
+    def fail(directory, keep):
+        raise OSError("disk full")
+    monkeypatch.setattr(store.lexical_index, "write", fail)
+    with pytest.raises(OSError):
+        store._compact()
+    assert sorted(os.listdir(store.path)) == files_before
+    assert store._meta.get("generation", 0) == 0
+    assert _search_sources(store, "other note") == before
+    monkeypatch.undo()
+    store._compact()
+    assert store._meta["generation"] == 1
+    assert _search_sources(store, "other note") == before
+    store.close()
+def test_failed_renumber_rolls_back(tmp_path):
+    store = _store_with_deleted_chunks(tmp_path)
+    positions = store.chunks.live_positions().tolist()
+    # Make the renumbering script fail part-way, after it has begun its transaction
+    store.chunks._db.execute("CREATE TABLE chunks_renumbered (x INTEGER)")
+    store.chunks._db.commit()
+    with pytest.raises(sqlite3.OperationalError):
+        store._compact()
+    assert store.chunks.live_positions().tolist() == positions
+    assert store.chunks.get_meta().get("generation", 0) == 0
+    store.close()
+def _failing_batches(texts: List[str]):
+    yield [Document(page_content=texts[0], metadata={"source": "new"})]
+    raise ValueError("page 2 could not be parsed")
+def test_failed_stream_keeps_previous_version(tmp_path):
+    store = VectorStoreService(str(tmp_path / "store"), KeywordEmbeddings())
+    store.add_documents([Document(page_content=f"volcano note {i}", metadata={"source": "old"}) for i in range(2)], False, "doc")
+    version = store.corpus_version
+    with pytest.raises(ValueError):
+        store.add_document_stream(_failing_batches(["volcano rewrite"]), document_id="doc")
+    assert store.list_documents() == {"doc": 2}
+    assert _search_sources(store, "volcano") == ["volcano note 0", "volcano note 1"]
+    assert store.corpus_version > version
+    store.close()
+def test_stream_replaces_previous_version_when_complete(tmp_path):
+    store = VectorStoreService(str(tmp_path / "store"), KeywordEmbeddings())
+    store.add_documents([Document(page_content=f"volcano note {i}", metadata={"source": "old"}) for i in range(2)], False, "doc")
+    batches = [[Document(page_content="volcano rewrite", metadata={"source": "new"})]]
+    assert store.add_document_stream(batches, document_id="doc") == 1
+    assert store.list_documents() == {"doc": 1}
+    assert _search_sources(store, "volcano") == ["volcano rewrite"]
+    store.close()
+class NumberEmbeddings(Embeddings):
+    """ "chunk N" maps to the N-th unit vector, so each chunk is its own nearest neighbour"""
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(64, dtype=np.float32)
+        vector[int(text.split()[-1])] = 1.0
+        return vector.tolist()
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+def _nearest_text(store: VectorStoreService, number: int) -> str:
+    query = f"chunk {number}"
+    return store.search_hits([query], [store.embeddings.embed_query(query)], 1)[0][0].document.page_content
+def _add_chunk(store: VectorStoreService, number: int):
+    store.add_documents([Document(page_content=f"chunk {number}", metadata={})], False, f"doc-{number}")
+def test_store_sees_chunks_added_by_another_process(tmp_path):
+    path = str(tmp_path / "store")
+    writer = VectorStoreService(path, NumberEmbeddings())
+    _add_chunk(writer, 0)
+    reader = VectorStoreService(path, NumberEmbeddings())
+    version = reader.corpus_version
+    _add_chunk(writer, 1)
+    assert reader.corpus_version > version
+    assert reader.list_documents() == {"doc-0": 1, "doc-1": 1}
+    assert _nearest_text(reader, 1) == "chunk 1"
+    writer.delete_document("doc-1")
+    assert reader.get_document_count() == 1
+    assert _nearest_text(reader, 1) == "chunk 0"
+    writer.close()
+    reader.close()
+def test_interleaved_appends_from_two_processes_keep_their_positions(tmp_path):
+    path = str(tmp_path / "store")
+    first = VectorStoreService(path, NumberEmbeddings())
+    _add_chunk(first, 0)
+    second = VectorStoreService(path, NumberEmbeddings())
+    for number in range(1, 9):
+        _add_chunk(first if number % 2 else second, number)
+    for store in (first, second):
+        assert [_nearest_text(store, number) for number in range(9)] == [f"chunk {number}" for number in range(9)]
+    first.close()
+    second.close()
+def test_compaction_elsewhere_is_picked_up_before_reading_hits(tmp_path):
+    path = str(tmp_path / "store")
+    writer = VectorStoreService(path, NumberEmbeddings())
+    for number in range(6):
+        _add_chunk(writer, number)
+    reader = VectorStoreService(path, NumberEmbeddings())
+    assert _nearest_text(reader, 5) == "chunk 5"
+    old_generation = reader.get_index_stats()["generation"]
+    writer.delete_document("doc-0")
+    writer.delete_document("doc-1")
+    with writer._lock, writer._write_lock:
+        writer._compact()
+    # Positions were renumbered; the stale generation's snapshot read is refused
+    assert reader.chunks.get([5], old_generation) is None
+    assert [_nearest_text(reader, number) for number in range(2, 6)] == [f"chunk {number}" for number in range(2, 6)]
+    assert reader.get_index_stats()["generation"] == old_generation + 1
+    writer.close()
+    reader.close()
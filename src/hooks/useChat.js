@@ -42,6 +42,48 @@ export function useChat() {
         }
     };
 
+    // Uploads are processed in the background; poll the job until it finishes
+    const waitForJob = async (data) => {
+        if (!data.job_id) {
+            return data;
+        }
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const response = await fetch(`${API_BASE_URL}/jobs/${data.job_id}`);
+            if (!response.ok) {
+                throw new Error(`Could not check upload progress (${response.status})`);
+            }
+            const job = await response.json();
+            if (job.status === 'completed') {
+                return job.result;
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Processing failed');
+            }
+        }
+    };
+
+    // Summaries are generated after ingestion; fill one in once it is ready
+    const pollSummary = async (documentId) => {
+        for (let attempt = 0; attempt < 30; attempt++) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            const response = await fetch(`${API_BASE_URL}/documents/${documentId}/summary`).catch(() => null);
+            if (!response || !response.ok) {
+                return;
+            }
+            const result = await response.json();
+            if (result.status === 'ready') {
+                setUploadStatus(prev => (
+                    prev && prev.document_id === documentId ? { ...prev, summary: result.summary } : prev
+                ));
+                return;
+            }
+            if (result.status !== 'pending') {
+                return;
+            }
+        }
+    };
+
     // Upload file with enhanced error handling and status tracking
     const uploadFile = async (file) => {
         setIsLoading(true);
@@ -61,7 +103,7 @@ export function useChat() {
                 throw new Error(errorData.detail || errorData.message || `Upload failed (${response.status})`);
             }
 
-            const data = await response.json();
+            const data = await waitForJob(await response.json());
             console.log('Document uploaded successfully:', data);
             
             // Log the upload
@@ -74,10 +116,13 @@ export function useChat() {
             setUploadStatus({
                 success: true,
                 document_id: data.document_id || 'uploaded',
-                summary: data.summary || 'Document uploaded successfully',
+                summary: data.summary || 'Generating summary...',
                 chunks_created: data.chunks_created || 1,
                 message: data.message
             });
+            if (!data.summary && data.document_id) {
+                pollSummary(data.document_id);
+            }
             
             return data;
         } catch (error) {
@@ -118,7 +163,7 @@ export function useChat() {
                 throw new Error(errorData.detail || errorData.message || `URL upload failed (${response.status})`);
             }
 
-            const data = await response.json();
+            const data = await waitForJob(await response.json());
             console.log('URL uploaded successfully:', data);
             
             // Log the upload
@@ -130,10 +175,13 @@ export function useChat() {
             setUploadStatus({
                 success: true,
                 document_id: data.document_id || 'uploaded',
-                summary: data.summary || 'URL content processed successfully',
+                summary: data.summary || 'Generating summary...',
                 chunks_created: data.chunks_created || 1,
                 message: data.message
             });
+            if (!data.summary && data.document_id) {
+                pollSummary(data.document_id);
+            }
             
             return data;
         } catch (error) {
@@ -173,7 +221,7 @@ export function useChat() {
                 throw new Error(errorData.detail || errorData.message || `Text upload failed (${response.status})`);
             }
 
-            const data = await response.json();
+            const data = await waitForJob(await response.json());
             console.log('Text uploaded successfully:', data);
             
             // Log the upload
@@ -185,10 +233,13 @@ export function useChat() {
             setUploadStatus({
                 success: true,
                 document_id: data.document_id || 'uploaded',
-                summary: data.summary || 'Text processed successfully',
+                summary: data.summary || 'Generating summary...',
                 chunks_created: data.chunks_created || 1,
                 message: data.message
             });
+            if (!data.summary && data.document_id) {
+                pollSummary(data.document_id);
+            }
             
             return data;
         } catch (error) {